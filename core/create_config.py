@@ -105,7 +105,8 @@ def generate_validator_config(dev: bool = False) -> dict[str, Any]:
         config["ORGANIC_SERVER_PORT"] = organic_server_port
 
     config["GPU_SERVER_ADDRESS"] = validate_input(
-        "Enter GPU server address: ", lambda x: x == "" or re.match(r"^https?://.+", x) is not None
+        "Enter GPU server address (comma separate several to score on all of them): ",
+        lambda x: x == "" or all(re.match(r"^https?://.+", address.strip()) is not None for address in x.split(",")),
     )
 
     config["SET_METAGRAPH_WEIGHTS_WITH_HIGH_UPDATED_TO_NOT_DEREG"] = (
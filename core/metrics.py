@@ -0,0 +1,222 @@
+"""
+A small metrics registry shared by the validator services and the miner, exposed in the
+Prometheus text format on /metrics.
+
+Counters, gauges and fixed bucket histograms only - updating one is a dict lookup and an add,
+so they're fine to use on the hot path. Label values are passed positionally, in the order of
+the metric's labelnames:
+
+    QUERY_SECONDS = metrics.Histogram("query_seconds", "Query latency", labelnames=("task",))
+    QUERY_SECONDS.observe(0.25, "chat-llama-3-1-8b")
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterator
+
+from fiber.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple[str, ...], label_values: tuple[str, ...], extra: str = "") -> str:
+    labels = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: "Registry | None" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _check_labels(self, label_values: tuple[str, ...]) -> None:
+        if len(label_values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {label_values}")
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: "Registry | None" = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        values = self._values
+        if label_values not in values:
+            self._check_labels(label_values)
+            values[label_values] = 0.0
+        values[label_values] += amount
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(value)}"
+            for label_values, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: "Registry | None" = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        if label_values not in self._values:
+            self._check_labels(label_values)
+        self._values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self.set(self._values.get(label_values, 0.0) + amount, *label_values)
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(value)}"
+            for label_values, value in self._values.items()
+        ]
+
+
+class _HistogramValues:
+    __slots__ = ("bucket_counts", "total", "count")
+
+    def __init__(self, number_of_buckets: int):
+        # One extra for +Inf
+        self.bucket_counts = [0] * (number_of_buckets + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        registry: "Registry | None" = None,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple[str, ...], _HistogramValues] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        values = self._values.get(label_values)
+        if values is None:
+            self._check_labels(label_values)
+            values = self._values[label_values] = _HistogramValues(len(self.buckets))
+        # Counts are stored per bucket and only made cumulative when rendering
+        values.bucket_counts[bisect_left(self.buckets, value)] += 1
+        values.total += value
+        values.count += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def _samples(self) -> list[str]:
+        samples = []
+        for label_values, values in self._values.items():
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), values.bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, label_values, extra=f'le="{_format_value(upper_bound)}"')
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, label_values)
+            samples.append(f"{self.name}_sum{labels} {_format_value(values.total)}")
+            samples.append(f"{self.name}_count{labels} {values.count}")
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def add_metrics_route(app, registry: Registry = REGISTRY) -> None:
+    """Adds GET /metrics to a FastAPI app"""
+    from fastapi.responses import Response
+
+    async def metrics() -> Response:
+        return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY) -> asyncio.AbstractServer:
+    """A tiny HTTP listener serving /metrics, for the services which don't run a web server"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain the headers, we don't care about any of them
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode(errors="replace").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving metrics on {host}:{port}/metrics")
+    return server
@@ -1,5 +1,8 @@
 import os
+import time
+from fastapi import Request
 from fiber.miner import server
+from core import metrics
 from core.models.config_models import TaskType
 from miner.endpoints.text import factory_router as text_factory_router
 from miner.endpoints.image import factory_router as image_factory_router
@@ -11,6 +14,24 @@ logger = get_logger(__name__)
 
 app = server.factory_app(debug=True)
 
+REQUEST_SECONDS = metrics.Histogram(
+    "miner_request_seconds", "Time until the response headers are sent", labelnames=("path", "status_code")
+)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    # Label by route rather than raw path, so random scanners can't blow up the number of series
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    REQUEST_SECONDS.observe(time.perf_counter() - start_time, path, str(response.status_code))
+    return response
+
+
+metrics.add_metrics_route(app)
+
 
 text_router = text_factory_router()
 image_router = image_factory_router()
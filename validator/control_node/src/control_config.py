@@ -1,5 +1,6 @@
 import os
 from dataclasses import dataclass
+from datetime import timedelta
 from redis.asyncio import Redis
 
 from fiber.logging_utils import get_logger
@@ -8,7 +9,9 @@ from fiber.chain import interface
 from fiber.chain import chain_utils
 
 
+from validator.control_node.src.cycle.weight_state import WeightState
 from validator.db.src.database import PSQLDB
+from validator.utils.database import database_constants as dcst
 
 import httpx
 
@@ -26,7 +29,9 @@ class Config:
     redis_db: Redis
     subtensor_network: str
     subtensor_address: str | None
-    gpu_server_address: str | None
+    gpu_server_addresses: list[str]
+    scoring_tasks_per_server: int
+    retention_periods: dict[str, timedelta]
     netuid: int
     replace_with_localhost: bool
     replace_with_docker_localhost: bool
@@ -35,6 +40,10 @@ class Config:
     httpx_client: httpx.AsyncClient
     scoring_period_time_multiplier: float
     set_metagraph_weights_with_high_updated_to_not_dereg: bool
+    node_refresh_concurrency: int
+    symmetric_key_ttl: timedelta
+    weight_state: WeightState
+    verify_weight_state: bool
     testnet: bool = os.getenv("SUBTENSOR_NETWORK", "").lower() == "test"
     debug: bool = os.getenv("ENV", "prod").lower() != "prod"
 
@@ -42,13 +51,14 @@ class Config:
 def load_config() -> Config:
     subtensor_network = os.getenv("SUBTENSOR_NETWORK")
     subtensor_address = os.getenv("SUBTENSOR_ADDRESS") or None
-    gpu_server_address = os.getenv("GPU_SERVER_ADDRESS", None)
+    # Comma separated, to score on several checking servers at once
+    gpu_server_addresses = [address.strip() for address in os.getenv("GPU_SERVER_ADDRESS", "").split(",") if address.strip()]
     dev_env = os.getenv("ENV", "prod").lower() != "prod"
-    if not gpu_server_address:
+    if not gpu_server_addresses:
         if not dev_env:
             logger.error("GPU_SERVER_ADDRESS IT NOT SET - Please make sure env is Dev if you want to run without a GPU server")
             raise ValueError("GPU_SERVER_ADDRESS must be set if env is prod")
-        gpu_server_address = None
+    scoring_tasks_per_server = int(os.getenv("SCORING_TASKS_PER_SERVER", 1))
 
     wallet_name = os.getenv("WALLET_NAME", "default")
     hotkey_name = os.getenv("HOTKEY_NAME", "default")
@@ -83,10 +93,28 @@ def load_config() -> Config:
 
     scoring_period_time_multiplier = float(os.getenv("SCORING_PERIOD_TIME_MULTIPLIER", 1.0))
 
+    # How long to keep rows in each table the retention job cleans up
+    retention_periods = {
+        dcst.TABLE_REWARD_DATA: timedelta(hours=float(os.getenv("REWARD_DATA_RETENTION_HOURS", 24 * 7))),
+        dcst.CONTENDERS_HISTORY_TABLE: timedelta(hours=float(os.getenv("CONTENDERS_HISTORY_RETENTION_HOURS", 24 * 3))),
+        dcst.NODES_HISTORY_TABLE: timedelta(hours=float(os.getenv("NODES_HISTORY_RETENTION_HOURS", 24 * 7))),
+        dcst.TABLE_TASKS: timedelta(hours=float(os.getenv("TASKS_RETENTION_HOURS", 5))),
+    }
+
     set_metagraph_weights_with_high_updated_to_not_dereg = bool(
         os.getenv("SET_METAGRAPH_WEIGHTS_WITH_HIGH_UPDATED_TO_NOT_DEREG", "false").lower() == "true"
     )
 
+    # How many nodes to handshake with & fetch capacities from at once, each cycle
+    node_refresh_concurrency = int(os.getenv("NODE_REFRESH_CONCURRENCY", 100))
+
+    # How long to reuse the symmetric key from a handshake for. Miners forget keys after a while (5 hours by default),
+    # and ones they've forgotten are rejected - which also gets us a new handshake
+    symmetric_key_ttl = timedelta(hours=float(os.getenv("SYMMETRIC_KEY_TTL_HOURS", 4)))
+
+    # Also calculate the weights from the database each run, and check the incremental weight state against them
+    verify_weight_state = bool(os.getenv("VERIFY_WEIGHT_STATE", "false").lower() == "true")
+
     return Config(
         substrate=substrate,  # type: ignore
         keypair=keypair,
@@ -100,8 +128,14 @@ def load_config() -> Config:
         refresh_nodes=refresh_nodes,
         capacity_to_score_multiplier=capacity_to_score_multiplier,
         httpx_client=httpx_client,
-        gpu_server_address=gpu_server_address,
+        gpu_server_addresses=gpu_server_addresses,
+        scoring_tasks_per_server=scoring_tasks_per_server,
+        retention_periods=retention_periods,
         debug=dev_env,
         scoring_period_time_multiplier=scoring_period_time_multiplier,
         set_metagraph_weights_with_high_updated_to_not_dereg=set_metagraph_weights_with_high_updated_to_not_dereg,
+        node_refresh_concurrency=node_refresh_concurrency,
+        symmetric_key_ttl=symmetric_key_ttl,
+        weight_state=WeightState(),
+        verify_weight_state=verify_weight_state,
     )
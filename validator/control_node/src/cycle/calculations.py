@@ -5,23 +5,34 @@ from core.task_config import get_task_configs
 from core import constants as ccst
 from validator.db.src import functions as db_functions
 from validator.db.src.database import PSQLDB
-from validator.db.src.sql.contenders import fetch_hotkey_scores_for_task
+from validator.db.src.sql.contenders import fetch_hotkey_scores_for_task, select_latest_period_scores
 from validator.db.src.sql.weights import insert_scoring_stats, insert_weights, delete_weights_info_older_than, delete_miner_weights_older_than
 from validator.db.src.sql.nodes import get_vali_ss58_address
 from validator.utils.post.nineteen import DataTypeToPost, post_to_nineteen_ai, ContenderWeightsInfoPostObject, MinerWeightsPostObject
 from validator.control_node.src.control_config import Config
+from validator.control_node.src.cycle import weight_engine
+from validator.control_node.src.cycle.weight_engine import (
+    METRIC_PERCENTILE,
+    PERIOD_SCORE_LOOKBACK,
+    PERIOD_SCORE_TIME_DECAYING_FACTOR,
+    SPEED_BONUS_MAX,
+)
 from validator.db.src.sql.nodes import get_nodes
 from validator.models import Contender, PeriodScore
 from validator.models import RewardData
+from validator.utils.database import database_constants as dcst
 from datetime import datetime, timezone, timedelta
 from fiber.logging_utils import get_logger
+from asyncpg import Record
+import numpy as np
 
 
 logger = get_logger(__name__)
 
-PERIOD_SCORE_TIME_DECAYING_FACTOR = 0.5
-METRIC_PERCENTILE = 0.3
-SPEED_BONUS_MAX = 0.5
+# How far the weights from the incremental weight state can be from the weights from the database, when verifying it
+WEIGHT_STATE_TOLERANCE = 1e-9
+
+# The per hotkey functions below are the reference weight_engine is tested against
 
 
 def _get_metric_score(metrics: list[float]) -> float:
@@ -50,12 +61,10 @@ async def _get_reward_datas(psql_db: PSQLDB, task: str, netuid: int) -> list[Rew
 
     all_nodes = await get_nodes(psql_db, netuid=netuid)
     all_hotkeys = [node.hotkey for node in all_nodes]
-    reward_datas = []
     async with await psql_db.connection() as connection:
-        for hotkey in all_hotkeys:
-            reward_data = await db_functions.fetch_recent_most_rewards(connection, task, hotkey, quality_tasks_to_fetch=50)
-            reward_datas.extend(reward_data)
-    return reward_datas
+        return await db_functions.fetch_recent_most_rewards_for_hotkeys(
+            connection, task, all_hotkeys, quality_tasks_to_fetch=50
+        )
 
 
 async def _get_period_scores(psql_db: PSQLDB, task: str, node_hotkey: str) -> list[PeriodScore]:
@@ -64,6 +73,21 @@ async def _get_period_scores(psql_db: PSQLDB, task: str, node_hotkey: str) -> li
     return period_scores
 
 
+async def _get_latest_period_scores(psql_db: PSQLDB, contenders: list[Contender]) -> dict[str, list[Record]]:
+    """The latest PERIOD_SCORE_LOOKBACK period scores of every contender, by task - older ones make no difference"""
+    async with await psql_db.connection() as connection:
+        rows = await select_latest_period_scores(
+            connection,
+            [contender.task for contender in contenders],
+            [contender.node_hotkey for contender in contenders],
+            PERIOD_SCORE_LOOKBACK,
+        )
+    histories_by_task: dict[str, list[Record]] = {}
+    for row in rows:
+        histories_by_task.setdefault(row[dcst.TASK], []).append(row)
+    return histories_by_task
+
+
 async def _calculate_metrics_and_quality_score(psql_db: PSQLDB, task: str, netuid: int) -> tuple[dict[str, float], dict[str, float]]:
     reward_datas: list[RewardData] = await _get_reward_datas(psql_db, task, netuid)
 
@@ -176,6 +200,108 @@ async def _normalise_effective_volumes_for_task(effective_volumes: dict[str, flo
     normalised_scores_for_task = _normalise_volumes_for_task(effective_volumes_after_non_linear_transformation)
     return normalised_scores_for_task
 
+def _task_inputs(
+    task: str,
+    task_weight: float,
+    reward_datas: list[RewardData],
+    contenders: list[Contender],
+    period_score_histories: list[Record],
+) -> weight_engine.TaskInputs:
+    quality_scores = np.array([reward_data.quality_score for reward_data in reward_datas], dtype=np.float64)
+    # None becomes nan
+    metrics = np.array([reward_data.metric for reward_data in reward_datas], dtype=np.float64)
+    missing = np.isnan(quality_scores) | np.isnan(metrics)
+    for i in np.flatnonzero(missing).tolist():
+        logger.warning(
+            f"Skipping reward data for task: {task} as metric or quality score is None"
+            f" Metric: {reward_datas[i].metric}, quality_score: {reward_datas[i].quality_score}"
+        )
+    sample_hotkeys = [reward_data.node_hotkey for reward_data, is_missing in zip(reward_datas, missing.tolist()) if not is_missing]
+    hotkey_codes = {hotkey: code for code, hotkey in enumerate(dict.fromkeys(sample_hotkeys))}
+    sample_codes = np.fromiter(map(hotkey_codes.__getitem__, sample_hotkeys), dtype=np.int64, count=len(sample_hotkeys))
+
+    task_contenders = [contender for contender in contenders if contender.task == task]
+    period_score_matrix, consumed_capacity_matrix = weight_engine.period_score_matrices(
+        [contender.node_hotkey for contender in task_contenders],
+        [history["hotkey"] for history in period_score_histories],
+        [history["period_scores"] for history in period_score_histories],
+        [history["consumed_capacities"] for history in period_score_histories],
+    )
+
+    return weight_engine.TaskInputs(
+        task=task,
+        weight=task_weight,
+        hotkeys=np.array(list(hotkey_codes), dtype=str),
+        sample_codes=sample_codes,
+        sample_quality_scores=quality_scores[~missing],
+        sample_metrics=metrics[~missing],
+        contender_codes=np.array(
+            [hotkey_codes.get(contender.node_hotkey, -1) for contender in task_contenders], dtype=np.int64
+        ),
+        contender_capacities=np.array([contender.capacity for contender in task_contenders], dtype=np.float64),
+        period_scores=period_score_matrix,
+        consumed_capacities=consumed_capacity_matrix,
+    )
+
+
+async def _calculate_task_scores_from_db(
+    psql_db: PSQLDB, netuid: int, task_weights: dict[str, float], contenders: list[Contender]
+) -> list[weight_engine.TaskScores]:
+    enabled_contenders = [contender for contender in contenders if contender.task in task_weights]
+    period_score_histories = await _get_latest_period_scores(psql_db, enabled_contenders)
+
+    all_task_scores = []
+    for task, task_weight in task_weights.items():
+        reward_datas = await _get_reward_datas(psql_db, task, netuid)
+        all_task_scores.append(
+            weight_engine.calculate_task_scores(
+                _task_inputs(task, task_weight, reward_datas, contenders, period_score_histories.get(task, []))
+            )
+        )
+    return all_task_scores
+
+
+async def _calculate_task_scores_from_state(
+    config: Config, task_weights: dict[str, float], contenders: list[Contender]
+) -> list[weight_engine.TaskScores]:
+    await config.weight_state.refresh(config.psql_db, config.redis_db)
+    node_hotkeys = [node.hotkey for node in await get_nodes(config.psql_db, netuid=config.netuid)]
+    return [
+        config.weight_state.task_scores(task, task_weight, node_hotkeys, contenders)
+        for task, task_weight in task_weights.items()
+    ]
+
+
+def _max_weight_difference(task_scores: list[weight_engine.TaskScores], other: list[weight_engine.TaskScores]) -> float:
+    hotkeys, weights = weight_engine.calculate_weights(task_scores)
+    other_hotkeys, other_weights = weight_engine.calculate_weights(other)
+    if hotkeys != other_hotkeys:
+        return float("inf")
+    return float(np.max(np.abs(np.subtract(weights, other_weights)), initial=0.0))
+
+
+async def _calculate_task_scores(
+    config: Config, task_weights: dict[str, float], contenders: list[Contender]
+) -> list[weight_engine.TaskScores]:
+    """From the incremental weight state, falling back to the database if it can't be brought up to date"""
+    try:
+        task_scores = await _calculate_task_scores_from_state(config, task_weights, contenders)
+    except Exception as e:
+        logger.error(f"Failed to calculate scores from the weight state, calculating them from the database: {e}")
+        config.weight_state.invalidate()
+        return await _calculate_task_scores_from_db(config.psql_db, config.netuid, task_weights, contenders)
+
+    if config.verify_weight_state:
+        db_task_scores = await _calculate_task_scores_from_db(config.psql_db, config.netuid, task_weights, contenders)
+        difference = _max_weight_difference(task_scores, db_task_scores)
+        logger.info(f"Weight state max weight difference from the database: {difference}")
+        if difference > WEIGHT_STATE_TOLERANCE:
+            logger.warning("Weight state doesn't match the database - using the database's scores, and rebuilding it")
+            config.weight_state.invalidate()
+            return db_task_scores
+    return task_scores
+
+
 async def calculate_scores_for_settings_weights(
     config_main: Config,
     contenders: list[Contender]
@@ -189,61 +315,60 @@ async def calculate_scores_for_settings_weights(
     contender_weights_info_objects: list[ContenderWeightsInfoPostObject] = []
     miner_weights_objects: list[MinerWeightsPostObject] = []
 
-    total_hotkey_scores: dict[str, float] = {}
-
-    task_configs = get_task_configs()
-    for task, config in task_configs.items():
+    task_weights = {}
+    for task, config in get_task_configs().items():
         if not config.enabled:
             logger.debug(f"Skipping task: {task} as it is not enabled")
             continue
-        task_weight = config.weight
-        logger.debug(f"Processing task: {task}, weight: {task_weight}\n")
-
-        combined_quality_scores, average_quality_scores, metric_bonuses = await _process_quality_scores(psql_db, task, netuid)
-        effective_volumes, normalised_period_scores, period_score_multipliers = await _calculate_effective_volumes_for_task(psql_db, contenders, task, combined_quality_scores)
-    
-        normalised_scores_for_task = await _normalise_effective_volumes_for_task(effective_volumes)
-
-        for hotkey, score in normalised_scores_for_task.items():
-            total_hotkey_scores[hotkey] = total_hotkey_scores.get(hotkey, 0) + score * task_weight
-            
-            contender = next((c for c in contenders if c.node_hotkey == hotkey and c.task == task), None)
-            
-            if contender:
-                scores_info_object = ContenderWeightsInfoPostObject(
-                    version_key = ccst.VERSION_KEY,
-                    netuid = netuid,
-                    validator_hotkey=ss58_address,
-                    created_at = datetime.now(timezone.utc),
-                    miner_hotkey=hotkey,
-                    task=task,
-                    average_quality_score=average_quality_scores.get(hotkey, 0),
-                    metric_bonus=metric_bonuses.get(hotkey, 0),
-                    combined_quality_score=combined_quality_scores.get(hotkey, 0),
-                    period_score_multiplier=period_score_multipliers.get(hotkey, 0),
-                    normalised_period_score=normalised_period_scores.get(hotkey, 0),
-                    contender_capacity=contender.capacity,
-                    normalised_net_score=score
-                )
-                contender_weights_info_objects.append(scores_info_object)
+        task_weights[task] = config.weight
+
+    all_task_scores = await _calculate_task_scores(config_main, task_weights, contenders)
+    for task_scores in all_task_scores:
+        task = task_scores.task
+        logger.debug(f"Processing task: {task}, weight: {task_scores.weight}\n")
+
+        for hotkey, capacity, average_quality_score, metric_bonus, combined_quality_score, multiplier, period_score, score in zip(
+            task_scores.hotkeys.tolist(),
+            task_scores.capacities.tolist(),
+            task_scores.average_quality_scores.tolist(),
+            task_scores.metric_bonuses.tolist(),
+            task_scores.combined_quality_scores.tolist(),
+            task_scores.period_score_multipliers.tolist(),
+            task_scores.normalised_period_scores.tolist(),
+            task_scores.normalised_net_scores.tolist(),
+        ):
+            scores_info_object = ContenderWeightsInfoPostObject(
+                version_key = ccst.VERSION_KEY,
+                netuid = netuid,
+                validator_hotkey=ss58_address,
+                created_at = datetime.now(timezone.utc),
+                miner_hotkey=hotkey,
+                task=task,
+                average_quality_score=average_quality_score,
+                metric_bonus=metric_bonus,
+                combined_quality_score=combined_quality_score,
+                period_score_multiplier=multiplier,
+                normalised_period_score=period_score,
+                contender_capacity=capacity,
+                normalised_net_score=score
+            )
+            contender_weights_info_objects.append(scores_info_object)
         logger.debug(f"Completed processing task: {task}")
 
     logger.debug("Completed calculation of scores for settings weights")
 
     hotkey_to_uid = {contender.node_hotkey: contender.node_id for contender in contenders}
-    total_score = sum(total_hotkey_scores.values())
+    hotkeys, node_weights = weight_engine.calculate_weights(all_task_scores)
+    node_ids = [hotkey_to_uid[hotkey] for hotkey in hotkeys]
 
-    node_ids, node_weights = [], []
-    for hotkey, score in total_hotkey_scores.items():
-        node_ids.append(hotkey_to_uid[hotkey])
-        node_weights.append(score / total_score)
+    for hotkey, node_weight in zip(hotkeys, node_weights):
         miner_weight_object = MinerWeightsPostObject(
             version_key = ccst.VERSION_KEY,
             netuid = netuid,
             validator_hotkey=ss58_address,
             created_at = datetime.now(timezone.utc),
             miner_hotkey=hotkey,
-            node_weight=score / total_score
+            node_weight=node_weight
         )
         miner_weights_objects.append(miner_weight_object)
 
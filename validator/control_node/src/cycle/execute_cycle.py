@@ -1,8 +1,7 @@
 """
 A cycle consists of
 - Refreshing metagraph to get nodes (if not refreshed for X time in the case of restarts)
-- Handshaking with the nodes
-- Gathering the contenders from the nodes by querying for capacities
+- Handshaking with the nodes and gathering the contenders from them by querying for capacities, node by node
 - Deciding what % of each contender should be queried
 - Scheduling synthetics according the the amount of volume I need to query
 - Getting the contender_scores from the 429's, 500's and successful queries
@@ -55,11 +54,7 @@ async def get_nodes_and_contenders(config: Config) -> list[Contender] | None:
 
     await _post_vali_stats(config)
 
-    logger.info("Got nodes! Performing handshakes now...")
-
-    nodes = await refresh_nodes.perform_handshakes(nodes, config)
-
-    logger.info("Got handshakes! Getting the contenders from the nodes...")
+    logger.info("Got nodes! Handshaking with them & getting the contenders from them...")
 
     contenders = await refresh_contenders.get_and_store_contenders(config, nodes)
 
@@ -1,16 +1,18 @@
 """
 Calculates period scores for contenders
-Converts NODEs to contenders by querying them for their tasks. (NODE + Task = Contender)
+Converts NODEs to contenders by handshaking with them, then querying them for their tasks. (NODE + Task = Contender)
 Migrates old contenders and adds the new contenders to the db
 """
 
 import asyncio
 import random
+from dataclasses import dataclass
 from typing import List
 
 
 from validator.db.src.sql.contenders import (
     fetch_all_contenders,
+    fetch_contenders_to_rank,
     migrate_contenders_to_contender_history,
     insert_contenders,
     update_contenders_period_scores,
@@ -19,9 +21,11 @@ from validator.models import Contender
 from fiber.networking.models import NodeWithFernet as Node
 from core import task_config as tcfg
 from validator.control_node.src.control_config import Config
+from validator.control_node.src.cycle import refresh_nodes, weight_state
 from fiber.logging_utils import get_logger
 from core import constants as cst
 from fiber.validator import client
+from validator.utils.contender import contender_utils as putils
 
 from validator.utils.post.nineteen import (
     ContenderPayload,
@@ -33,6 +37,15 @@ from validator.utils.post.nineteen import (
 
 logger = get_logger(__name__)
 
+# On top of the request timeout, as a bound on the whole capacity fetch
+CAPACITY_TIMEOUT_SECONDS = 15
+# What miners answer with when they don't know the symmetric key we used - e.g. it's expired, or they restarted
+KEY_REJECTED_STATUS_CODES = {400, 401, 403}
+
+
+class SymmetricKeyRejectedError(Exception):
+    pass
+
 
 def _get_capacity_to_score(capacity: float, capacity_to_score_multiplier: float) -> float:
     if random.random() < 0.5:
@@ -50,10 +63,16 @@ def _get_capacity_to_score(capacity: float, capacity_to_score_multiplier: float)
 async def _store_and_migrate_old_contenders(config: Config, new_contenders: List[Contender]):
     logger.info("Calculating period scores & refreshing contenders")
     async with await config.psql_db.connection() as connection:
-        await update_contenders_period_scores(connection, config.netuid)
+        period_scores = await update_contenders_period_scores(connection, config.netuid)
         await migrate_contenders_to_contender_history(connection)
         await insert_contenders(connection, new_contenders, config.keypair.ss58_address)
 
+    try:
+        await weight_state.publish_period_scores(config.redis_db, period_scores)
+    except Exception as e:
+        # The weight state picks them up from the database when it next rebuilds
+        logger.error(f"Failed to publish {len(period_scores)} period scores to the weight state: {e}")
+
 
 async def _fetch_node_capacity(config: Config, node: Node) -> dict[str, float] | None:
     server_address = client.construct_server_address(
@@ -81,6 +100,8 @@ async def _fetch_node_capacity(config: Config, node: Node) -> dict[str, float] |
         logger.error(f"Failed to fetch capacity from node {node.node_id}: {e}")
         return None
 
+    if response.status_code in KEY_REJECTED_STATUS_CODES:
+        raise SymmetricKeyRejectedError(f"Node {node.node_id} rejected our symmetric key: {response.status_code}")
     if response.status_code != 200:
         logger.warning(f"Failed to fetch capacity from node {node.node_id}")
         return None
@@ -88,78 +109,115 @@ async def _fetch_node_capacity(config: Config, node: Node) -> dict[str, float] |
     return response.json()
 
 
-async def _fetch_node_capacities(config: Config, nodes: list[Node]) -> list[dict[str, float] | None]:
-    async def _fetch_or_none(node: Node):
-        if node.fernet is None or node.symmetric_key_uuid is None:
-            return None
-        return await _fetch_node_capacity(config, node)
+@dataclass
+class _RefreshedNode:
+    node: Node
+    # Whether we got a new symmetric key for it
+    handshaken: bool
+    capacities: dict[str, float] | None
+    key_rejected: bool = False
 
-    capacity_tasks = []
-    capacities = []
-    for node in nodes:
-        capacity_tasks.append(_fetch_or_none(node))
-        if len(capacity_tasks) > 50:
-            capacities.extend(await asyncio.gather(*capacity_tasks))
-            capacity_tasks = []
 
-    if capacity_tasks:
-        capacities.extend(await asyncio.gather(*capacity_tasks))
+async def _handshake_and_fetch_capacity(config: Config, node: Node) -> _RefreshedNode:
+    refreshed = await refresh_nodes.handshake_with_node(config, node)
+    handshaken = refreshed is not node and refreshed.fernet is not None and refreshed.symmetric_key_uuid is not None
+    if refreshed.fernet is None or refreshed.symmetric_key_uuid is None:
+        return _RefreshedNode(refreshed, handshaken, None)
+    try:
+        capacities = await asyncio.wait_for(_fetch_node_capacity(config, refreshed), CAPACITY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Fetching capacity from node {node.node_id} timed out after {CAPACITY_TIMEOUT_SECONDS}s")
+        capacities = None
+    except SymmetricKeyRejectedError as e:
+        logger.info(str(e))
+        return _RefreshedNode(refreshed, handshaken, None, key_rejected=True)
+    return _RefreshedNode(refreshed, handshaken, capacities)
+
+
+async def _refresh_node(config: Config, node: Node, semaphore: asyncio.Semaphore) -> _RefreshedNode:
+    """
+    Handshakes with a node if we don't have a key for it, then fetches its capacities - as one unit, so a slow node
+    only holds up itself. If it rejects the key we had stored for it, we handshake again
+    """
+    async with semaphore:
+        refreshed = await _handshake_and_fetch_capacity(config, node)
+        if refreshed.key_rejected and not refreshed.handshaken:
+            refreshed = await _handshake_and_fetch_capacity(
+                config, node.model_copy(update={"fernet": None, "symmetric_key_uuid": None})
+            )
+        return refreshed
+
 
-    return capacities
+def _contenders_for_node(
+    config: Config, node: Node, raw_node_capacities: dict[str, float], task_configs: dict
+) -> tuple[str | None, list[Contender]]:
+    """The node's miner type, and a contender for each enabled task of that type it declared a capacity for"""
+    if cst.MINER_TYPE not in raw_node_capacities:
+        logger.warning(f"Node {node.node_id} did not return a miner type")
+        return None, []
+
+    miner_type = raw_node_capacities[cst.MINER_TYPE]
+    del raw_node_capacities[cst.MINER_TYPE]
+
+    contenders = []
+    for task, declared_capacity in raw_node_capacities.items():
+        if task not in task_configs:
+            logger.debug(f"Task {task} is not a valid task")
+            continue
+
+        task_config = tcfg.get_enabled_task_config(task)
+        if task_config is None or task_config.task_type.value != miner_type:
+            continue
+        # NOTE: Change here. No longer use validator stake proportion. Let miners decide their own capacity.
+        capacity = min(max(declared_capacity, 0), task_config.max_capacity)
+        capacity_to_score = _get_capacity_to_score(capacity, config.capacity_to_score_multiplier)
+
+        contenders.append(
+            Contender(
+                node_hotkey=node.hotkey,
+                node_id=node.node_id,
+                netuid=node.netuid,
+                task=task,
+                raw_capacity=declared_capacity,
+                capacity=capacity,
+                capacity_to_score=capacity_to_score,
+                consumed_capacity=0,
+                total_requests_made=0,
+                requests_429=0,
+                requests_500=0,
+                period_score=None,
+            )
+        )
+    return miner_type, contenders
 
 
 async def _get_contenders_from_nodes(config: Config, nodes: list[Node]) -> List[Contender]:
-    raw_capacities = await _fetch_node_capacities(config, nodes)
+    """
+    Handshakes with & fetches the capacities of up to config.node_refresh_concurrency nodes at a time,
+    building contenders from each node's capacities as soon as they arrive
+    """
+    semaphore = asyncio.Semaphore(config.node_refresh_concurrency)
     task_configs = tcfg.get_task_configs()
-    logger.info(f"Got capacities for {len([i for i in raw_capacities if i is not None])} nodes")
 
     miner_types = {}
-
     contenders = []
-    for node, raw_node_capacities in zip(nodes, raw_capacities):
-        if raw_node_capacities is None:
+    handshaken_nodes = []
+    nodes_with_capacities = 0
+    for next_refreshed in asyncio.as_completed([_refresh_node(config, node, semaphore) for node in nodes]):
+        refreshed = await next_refreshed
+        if refreshed.handshaken:
+            handshaken_nodes.append(refreshed.node)
+        if refreshed.capacities is None:
             continue
-        node_hotkey = node.hotkey
-        node_id = node.node_id
-        netuid = node.netuid
-
-        if cst.MINER_TYPE not in raw_node_capacities:
-            logger.warning(f"Node {node_id} did not return a miner type")
+        nodes_with_capacities += 1
+        miner_type, node_contenders = _contenders_for_node(config, refreshed.node, refreshed.capacities, task_configs)
+        if miner_type is None:
             continue
+        miner_types[refreshed.node.hotkey] = miner_type
+        contenders.extend(node_contenders)
 
-        miner_type = raw_node_capacities[cst.MINER_TYPE]
-        del raw_node_capacities[cst.MINER_TYPE]
-
-        miner_types[node_hotkey] = miner_type
-
-        for task, declared_capacity in raw_node_capacities.items():
-            if task not in task_configs:
-                logger.debug(f"Task {task} is not a valid task")
-                continue
-
-            task_config = tcfg.get_enabled_task_config(task)
-            if task_config is None or task_config.task_type.value != miner_type:
-                continue
-            # NOTE: Change here. No longer use validator stake proportion. Let miners decide their own capacity.
-            capacity = min(max(declared_capacity, 0), task_config.max_capacity)
-            capacity_to_score = _get_capacity_to_score(capacity, config.capacity_to_score_multiplier)
-
-            contenders.append(
-                Contender(
-                    node_hotkey=node_hotkey,
-                    node_id=node_id,
-                    netuid=netuid,
-                    task=task,
-                    raw_capacity=declared_capacity,
-                    capacity=capacity,
-                    capacity_to_score=capacity_to_score,
-                    consumed_capacity=0,
-                    total_requests_made=0,
-                    requests_429=0,
-                    requests_500=0,
-                    period_score=None,
-                )
-            )
+    logger.info(f"Got capacities for {nodes_with_capacities} nodes")
+    await refresh_nodes.store_symmetric_keys(config, handshaken_nodes)
 
     # Post miner types to nineteen
     miner_types_payload = [
@@ -218,6 +276,9 @@ async def get_and_store_contenders(config: Config, nodes: list[Node]) -> list[Co
 
     contenders = await _get_contenders_from_nodes(config, nodes)
     await _store_and_migrate_old_contenders(config, contenders)
+    async with await config.psql_db.connection() as connection:
+        contenders_to_rank = await fetch_contenders_to_rank(connection, config.netuid)
+    await putils.store_contender_rankings(config.redis_db, contenders_to_rank, list(tcfg.get_task_configs().keys()))
 
     await _post_contender_stats_to_nineteen(config)
     # NOTE: Could also add a feature here which deletes everything from
@@ -8,11 +8,19 @@ import traceback
 
 
 from fiber.networking.models import NodeWithFernet as Node
-from validator.db.src.sql.nodes import get_nodes, migrate_nodes_to_history, insert_nodes, get_last_updated_time_for_nodes
+from validator.db.src.sql.nodes import (
+    get_nodes,
+    migrate_nodes_to_history,
+    insert_nodes,
+    get_last_updated_time_for_nodes,
+    get_unexpired_symmetric_keys,
+    restore_symmetric_keys,
+)
 from fiber.logging_utils import get_logger
 from fiber.chain import fetch_nodes
 from validator.control_node.src.control_config import Config
 from validator.db.src.sql.nodes import insert_symmetric_keys_for_nodes, update_our_vali_node_in_db
+from validator.utils.redis import redis_constants as rcst
 from fiber.validator import handshake, client
 import httpx
 from datetime import datetime, timedelta
@@ -20,6 +28,9 @@ from cryptography.fernet import Fernet
 
 logger = get_logger(__name__)
 
+# A handshake is two round trips - fetching the node's public key, then sending it our symmetric key
+HANDSHAKE_TIMEOUT_SECONDS = 20
+
 def _format_exception(e: Exception) -> str:
     """Format an exception with its traceback for logging."""
     return f"Exception Type: {type(e).__name__}\nException Message: {str(e)}\nTraceback:\n{''.join(traceback.format_tb(e.__traceback__))}"
@@ -39,7 +50,8 @@ async def get_and_store_nodes(config: Config) -> list[Node]:
     await update_our_validator_node(config)
 
     logger.info(f"Stored {len(nodes)} nodes.")
-    return nodes
+    # With the symmetric keys we kept
+    return await get_nodes(config.psql_db, config.netuid)
 
 
 async def is_recent_update(connection, netuid: int) -> bool:
@@ -58,10 +70,19 @@ async def fetch_nodes_from_substrate(config: Config) -> list[Node]:
     return await asyncio.to_thread(fetch_nodes.get_nodes_for_netuid, config.substrate, config.netuid)
 
 
+async def _bump_nodes_generation(config: Config) -> None:
+    """Tells the query nodes their cached nodes (and fernets) are stale"""
+    await config.redis_db.incr(rcst.NODES_GENERATION_KEY)
+
+
 async def store_nodes(config: Config, nodes: list[Node]):
+    """Replaces the nodes, keeping the symmetric keys of those which haven't moved so we don't handshake with them again"""
     async with await config.psql_db.connection() as connection:
+        symmetric_keys = await get_unexpired_symmetric_keys(connection, config.netuid)
         await migrate_nodes_to_history(connection)
         await insert_nodes(connection, nodes, config.subtensor_network)
+        await restore_symmetric_keys(connection, symmetric_keys)
+    await _bump_nodes_generation(config)
 
 
 async def update_our_validator_node(config: Config):
@@ -97,28 +118,26 @@ async def _handshake(config: Config, node: Node, async_client: httpx.AsyncClient
     return node_copy
 
 
-async def perform_handshakes(nodes: list[Node], config: Config) -> list[Node]:
-    tasks = []
-    shaked_nodes: list[Node] = []
-    for node in nodes:
-        if node.fernet is None or node.symmetric_key_uuid is None:
-            tasks.append(_handshake(config, node, config.httpx_client))
-        if len(tasks) > 50:
-            shaked_nodes.extend(await asyncio.gather(*tasks))
-            tasks = []
+async def handshake_with_node(config: Config, node: Node) -> Node:
+    """Handshakes with the node if we don't have a symmetric key for it yet. If that fails, it's returned without one"""
+    if node.fernet is not None and node.symmetric_key_uuid is not None:
+        return node
+    try:
+        return await asyncio.wait_for(_handshake(config, node, config.httpx_client), HANDSHAKE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.debug(f"Handshake with node {node.node_id} timed out after {HANDSHAKE_TIMEOUT_SECONDS}s")
+        return node
 
-    if tasks:
-        shaked_nodes.extend(await asyncio.gather(*tasks))
 
+async def store_symmetric_keys(config: Config, handshaken_nodes: list[Node]) -> None:
     nodes_where_handshake_worked = [
-        node for node in shaked_nodes if node.fernet is not None and node.symmetric_key_uuid is not None
+        node for node in handshaken_nodes if node.fernet is not None and node.symmetric_key_uuid is not None
     ]
     if len(nodes_where_handshake_worked) == 0:
-        logger.info("❌ Failed to perform handshakes with any nodes!")
-        return []
+        logger.info("No new handshakes to store")
+        return
     logger.info(f"✅ performed handshakes successfully with {len(nodes_where_handshake_worked)} nodes!")
 
     async with await config.psql_db.connection() as connection:
-        await insert_symmetric_keys_for_nodes(connection, nodes_where_handshake_worked)
-
-    return shaked_nodes
+        await insert_symmetric_keys_for_nodes(connection, nodes_where_handshake_worked, config.symmetric_key_ttl)
+    await _bump_nodes_generation(config)
@@ -1,6 +1,5 @@
 import asyncio
 from dataclasses import dataclass
-import json
 import random
 import time
 from typing import Dict, List
@@ -12,8 +11,7 @@ from validator.control_node.src.control_config import Config
 from validator.models import Contender
 from core import task_config as tcfg
 from validator.utils.contender import contender_utils as putils
-from validator.utils.generic import generic_constants as gcst
-from validator.utils.redis import redis_constants as rcst
+from validator.utils.redis import query_queue
 from core import constants as ccst
 from fiber.logging_utils import get_logger
 
@@ -96,15 +94,8 @@ async def _schedule_synthetic_query(redis_db: Redis, task: str, max_len: int):
 
 
 async def _clear_old_synthetic_queries(redis_db: Redis):
-    all_items = await redis_db.lrange(rcst.QUERY_QUEUE_KEY, 0, -1)  # type: ignore
-
-    non_synthetic_items = [item for item in all_items if json.loads(item).get("query_type") != gcst.SYNTHETIC]
-    await redis_db.delete(rcst.QUERY_QUEUE_KEY)
-
-    if non_synthetic_items:
-        await redis_db.rpush(rcst.QUERY_QUEUE_KEY, *non_synthetic_items)  # type: ignore
-
-    logger.info(f"Cleared {len(all_items) - len(non_synthetic_items)} synthetic queries from the queue")
+    cleared = await query_queue.get_query_queue(redis_db).clear_synthetic_queries()
+    logger.info(f"Cleared {cleared} synthetic queries from the queue")
 
 
 async def schedule_synthetics_until_done(config: Config):
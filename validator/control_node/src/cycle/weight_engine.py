@@ -0,0 +1,241 @@
+"""
+Vectorised weight calculation.
+
+Takes everything a weight run needs, loaded in bulk - each task's reward data samples, its contenders and their
+period score histories - and works out every hotkey's scores per task, then the weights, with array operations
+instead of hotkey by hotkey.
+
+The results are the same as the per hotkey calculation in calculations.py: the sums it did one value at a time
+are done in the same order here (bincount, cumsum and add.at all accumulate in order, unlike np.sum),
+and powers use python's pow.
+"""
+
+import math
+from dataclasses import dataclass
+from itertools import chain, repeat
+
+import numpy as np
+
+PERIOD_SCORE_TIME_DECAYING_FACTOR = 0.5
+METRIC_PERCENTILE = 0.3
+SPEED_BONUS_MAX = 0.5
+# Period scores are time weighted by (1 - PERIOD_SCORE_TIME_DECAYING_FACTOR) ** i, so only the latest
+# PERIOD_SCORE_LOOKBACK of them move a normalised period score by more than about PERIOD_SCORE_PRECISION.
+# It needs to be more than 8 too, as that's how many it takes to get the full period score multiplier
+PERIOD_SCORE_PRECISION = 1e-6
+PERIOD_SCORE_LOOKBACK = max(math.ceil(math.log(PERIOD_SCORE_PRECISION, 1 - PERIOD_SCORE_TIME_DECAYING_FACTOR)), 9)
+
+
+@dataclass
+class TaskInputs:
+    task: str
+    weight: float
+    # The hotkeys with reward data, in the order of their first sample
+    hotkeys: np.ndarray
+    # One entry per reward data sample, in the order they were fetched. Codes index into hotkeys
+    sample_codes: np.ndarray
+    sample_quality_scores: np.ndarray
+    sample_metrics: np.ndarray
+    # One entry per contender for the task. Codes index into hotkeys, or are -1 if the contender has no reward data
+    contender_codes: np.ndarray
+    contender_capacities: np.ndarray
+    # One row per contender, newest first; see `period_score_matrices`
+    period_scores: np.ndarray
+    consumed_capacities: np.ndarray
+
+
+@dataclass
+class TaskScores:
+    """Scores for each contender of a task which got a score, in contender order"""
+
+    task: str
+    weight: float
+    hotkeys: np.ndarray
+    capacities: np.ndarray
+    average_quality_scores: np.ndarray
+    metric_bonuses: np.ndarray
+    combined_quality_scores: np.ndarray
+    normalised_period_scores: np.ndarray
+    period_score_multipliers: np.ndarray
+    normalised_net_scores: np.ndarray
+
+
+def _codes_in_order_of_appearance(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Like np.unique with return_inverse, but the uniques are in the order they first appear"""
+    uniques, first_index, inverse = np.unique(values, return_index=True, return_inverse=True)
+    order = np.argsort(first_index)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return uniques[order], rank[inverse.reshape(-1)]
+
+
+def _sequential_sum(values: np.ndarray, axis: int = -1) -> np.ndarray:
+    """Sums in order (np.sum sums pairwise, so can differ in the last bit from summing one value at a time)"""
+    if values.shape[axis] == 0:
+        return np.zeros(np.delete(values.shape, axis))
+    return np.take(np.cumsum(values, axis=axis), -1, axis=axis)
+
+
+def _power(values: np.ndarray, exponent: float) -> np.ndarray:
+    """values ** exponent with python's pow - numpy's vectorised pow can differ from it in the last bit"""
+    return np.fromiter(map(pow, values.tolist(), repeat(exponent)), dtype=np.float64, count=len(values))
+
+
+def period_score_matrices(
+    contender_hotkeys: list[str],
+    history_hotkeys: list[str],
+    period_scores: list[list[float]],
+    consumed_capacities: list[list[float]],
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lays each contender's period score history out as a row of a matrix. There's one history per hotkey,
+    newest first, with missing period scores left out. Rows are padded with nan period scores and 0 consumed capacity.
+    """
+    contender_index = {hotkey: i for i, hotkey in enumerate(contender_hotkeys)}
+    rows = np.array([contender_index.get(hotkey, -1) for hotkey in history_hotkeys], dtype=np.int64)
+    lengths = np.array([len(scores) for scores in period_scores], dtype=np.int64)
+    total_length = int(lengths.sum())
+    flat_period_scores = np.fromiter(chain.from_iterable(period_scores), dtype=np.float64, count=total_length)
+    flat_consumed_capacities = np.fromiter(chain.from_iterable(consumed_capacities), dtype=np.float64, count=total_length)
+
+    history_index = np.repeat(rows, lengths)
+    positions = np.arange(total_length) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    keep = history_index >= 0
+    width = int(lengths[rows >= 0].max(initial=0))
+
+    score_matrix = np.full((len(contender_hotkeys), width), np.nan)
+    capacity_matrix = np.zeros((len(contender_hotkeys), width))
+    score_matrix[history_index[keep], positions[keep]] = flat_period_scores[keep]
+    capacity_matrix[history_index[keep], positions[keep]] = flat_consumed_capacities[keep]
+    return score_matrix, capacity_matrix
+
+
+def _metric_bonuses(metric_scores: np.ndarray) -> np.ndarray:
+    number_of_hotkeys = len(metric_scores)
+    ranks = np.empty(number_of_hotkeys, dtype=np.int64)
+    # Stable, so equal scores keep the order the hotkeys came in - as sorted(..., reverse=True) does
+    ranks[np.argsort(-metric_scores, kind="stable")] = np.arange(number_of_hotkeys)
+    if number_of_hotkeys <= 1:
+        return ranks.astype(np.float64)
+    return SPEED_BONUS_MAX * (0.5 - ranks / (number_of_hotkeys - 1))
+
+
+def _normalised_period_scores(period_scores: np.ndarray, consumed_capacities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    valid = ~np.isnan(period_scores)
+    lengths = valid.sum(axis=1)
+    # Requires an abundance of data before handing out top scores
+    multipliers = np.where(lengths > 8, 1.0, 0.25)
+
+    time_weights = (1 - PERIOD_SCORE_TIME_DECAYING_FACTOR) ** np.arange(period_scores.shape[1], dtype=np.float64)
+    sum_of_volumes = _sequential_sum(consumed_capacities)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        combined_weights = np.where(valid, (consumed_capacities / sum_of_volumes[:, None]) * time_weights, 0.0)
+        total_scores = _sequential_sum(np.where(valid, period_scores * combined_weights, 0.0))
+        total_weights = _sequential_sum(combined_weights)
+        normalised = multipliers * total_scores / total_weights
+    normalised = np.where((lengths == 0) | (sum_of_volumes == 0) | (total_weights == 0), 0.0, normalised)
+    return normalised, multipliers
+
+
+def _normalise(values: np.ndarray) -> np.ndarray | None:
+    total = _sequential_sum(values)
+    if total == 0:
+        return None
+    return values / total
+
+
+def calculate_task_scores(inputs: TaskInputs) -> TaskScores:
+    hotkeys, codes = inputs.hotkeys, inputs.sample_codes
+    number_of_hotkeys = len(hotkeys)
+
+    # Quality
+    counts = np.bincount(codes, minlength=number_of_hotkeys)
+    quality_sums = np.bincount(codes, weights=_power(inputs.sample_quality_scores, 1.5), minlength=number_of_hotkeys)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average_quality_scores = quality_sums / counts
+
+    # The METRIC_PERCENTILEth percentile of each hotkey's metrics
+    # Sorted by hotkey, then metric (two stable sorts are quicker than np.lexsort)
+    order = np.argsort(inputs.sample_metrics, kind="stable")
+    sorted_metrics = inputs.sample_metrics[order[np.argsort(codes[order], kind="stable")]]
+    starts = np.cumsum(counts) - counts
+    metric_scores = sorted_metrics[starts + (counts * METRIC_PERCENTILE).astype(np.int64)]
+
+    normalised_period_scores, period_score_multipliers = _normalised_period_scores(
+        inputs.period_scores, inputs.consumed_capacities
+    )
+    return score_task(
+        inputs.task,
+        inputs.weight,
+        hotkeys,
+        average_quality_scores,
+        metric_scores,
+        inputs.contender_codes,
+        inputs.contender_capacities,
+        normalised_period_scores,
+        period_score_multipliers,
+    )
+
+
+def score_task(
+    task: str,
+    weight: float,
+    hotkeys: np.ndarray,
+    average_quality_scores: np.ndarray,
+    metric_scores: np.ndarray,
+    contender_codes: np.ndarray,
+    contender_capacities: np.ndarray,
+    normalised_period_scores: np.ndarray,
+    period_score_multipliers: np.ndarray,
+) -> TaskScores:
+    """
+    Scores a task from each hotkey's average quality score & metric score, and each contender's normalised period score.
+    Contender codes index into hotkeys, or are -1 if the contender has no reward data
+    """
+    metric_bonuses = _metric_bonuses(metric_scores)
+    combined_quality_scores = average_quality_scores * (1 + metric_bonuses)
+
+    # Only contenders with reward data get a score
+    scored = contender_codes >= 0
+    contender_codes = contender_codes[scored]
+    capacities = contender_capacities[scored]
+    normalised_period_scores = normalised_period_scores[scored]
+    period_score_multipliers = period_score_multipliers[scored]
+
+    effective_volumes = combined_quality_scores[contender_codes] * normalised_period_scores * capacities
+
+    normalised_volumes = _normalise(effective_volumes)
+    normalised_net_scores = None if normalised_volumes is None else _normalise(_power(normalised_volumes, 3))
+    # If there's nothing to share out, nobody gets a score for the task
+    keep = np.full(len(contender_codes), normalised_net_scores is not None)
+    contender_codes = contender_codes[keep]
+
+    return TaskScores(
+        task=task,
+        weight=weight,
+        hotkeys=hotkeys[contender_codes],
+        capacities=capacities[keep],
+        average_quality_scores=average_quality_scores[contender_codes],
+        metric_bonuses=metric_bonuses[contender_codes],
+        combined_quality_scores=combined_quality_scores[contender_codes],
+        normalised_period_scores=normalised_period_scores[keep],
+        period_score_multipliers=period_score_multipliers[keep],
+        normalised_net_scores=normalised_net_scores if normalised_net_scores is not None else np.zeros(0),
+    )
+
+
+def calculate_weights(task_scores: list[TaskScores]) -> tuple[list[str], list[float]]:
+    """Weights per hotkey, from each task's scores weighted by the task weight. Hotkeys are in order of first appearance"""
+    all_hotkeys = np.concatenate([scores.hotkeys for scores in task_scores] or [np.zeros(0, dtype=str)])
+    if len(all_hotkeys) == 0:
+        return [], []
+    contributions = np.concatenate([scores.normalised_net_scores * scores.weight for scores in task_scores])
+
+    hotkeys, codes = _codes_in_order_of_appearance(all_hotkeys)
+    totals = np.zeros(len(hotkeys))
+    np.add.at(totals, codes, contributions)
+    total_score = _sequential_sum(totals)
+    if total_score == 0:
+        return [], []
+
+    return hotkeys.tolist(), (totals / total_score).tolist()
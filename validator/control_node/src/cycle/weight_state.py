@@ -0,0 +1,340 @@
+"""
+Incremental weight state.
+
+Rather than re-reading the reward data window and the period score history for every weight run, the control node
+publishes each reward datum it stores, and each period score it closes, to a redis stream (weights are set from
+another process). WeightState follows that stream and keeps, per hotkey and task:
+- the reward data in the window, with a running sum of quality_score ** 1.5 and the metrics kept sorted, so the
+  METRIC_PERCENTILEth percentile is a lookup
+- the latest PERIOD_SCORE_LOOKBACK period scores, folded into time decayed sums
+
+so a weight run only has to catch up on the stream, then score each task with weight_engine.score_task.
+
+`rebuild` loads the state from the database from scratch. It's done every REBUILD_INTERVAL, which also puts
+a bound on rounding drift in the running sums, and can be compared against weight_engine's results from the database.
+"""
+
+import bisect
+import heapq
+import json
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from typing import Any
+
+import numpy as np
+from fiber.logging_utils import get_logger
+from redis.asyncio import Redis
+
+from validator.control_node.src.cycle import weight_engine
+from validator.control_node.src.cycle.weight_engine import (
+    METRIC_PERCENTILE,
+    PERIOD_SCORE_LOOKBACK,
+    PERIOD_SCORE_TIME_DECAYING_FACTOR,
+)
+from validator.db.src.database import PSQLDB
+from validator.db.src.functions import RECENT_REWARD_DATA_WINDOW
+from validator.db.src.sql.contenders import select_period_score_history
+from validator.db.src.sql.rewards_and_scores import select_reward_data_since
+from validator.models import Contender, PeriodScore, RewardData
+from validator.utils.database import database_constants as dcst
+from validator.utils.redis import redis_constants as rcst
+
+logger = get_logger(__name__)
+
+REWARD_DATA_EVENT = "reward_data"
+PERIOD_SCORE_EVENT = "period_score"
+STREAM_FIELD = b"message"
+STREAM_READ_COUNT = 10_000
+# A hotkey with fewer samples than this for a task is made up to it with its latest samples for any task,
+# as _get_reward_datas does
+REWARD_SAMPLES_PER_HOTKEY = 50
+REBUILD_INTERVAL = timedelta(hours=6)
+
+
+def _reward_data_id(value: Any) -> str:
+    """Reward data ids are uuid hex strings when stored, but come back from postgres as UUIDs"""
+    return uuid.UUID(str(value)).hex
+
+
+def _stream_min_id() -> str:
+    """Events older than the reward data window are trimmed - any reader further behind than that rebuilds anyway"""
+    return f"{int((time.time() - RECENT_REWARD_DATA_WINDOW.total_seconds()) * 1000)}-0"
+
+
+async def publish_reward_data(redis_db: Redis, reward_data: RewardData, stored_at: datetime) -> None:
+    event = {
+        "type": REWARD_DATA_EVENT,
+        "id": reward_data.id,
+        "task": reward_data.task,
+        "hotkey": reward_data.node_hotkey,
+        "quality_score": reward_data.quality_score,
+        "metric": reward_data.metric,
+        "created_at": stored_at.isoformat(),
+    }
+    await redis_db.xadd(
+        rcst.WEIGHT_STATE_EVENTS_KEY, {STREAM_FIELD: json.dumps(event)}, minid=_stream_min_id(), approximate=True
+    )
+
+
+async def publish_period_scores(redis_db: Redis, period_scores: list[PeriodScore]) -> None:
+    if not period_scores:
+        return
+    async with redis_db.pipeline(transaction=False) as pipe:
+        for period_score in period_scores:
+            event = {"type": PERIOD_SCORE_EVENT, **period_score.model_dump(mode="json")}
+            pipe.xadd(rcst.WEIGHT_STATE_EVENTS_KEY, {STREAM_FIELD: json.dumps(event)})
+        pipe.xtrim(rcst.WEIGHT_STATE_EVENTS_KEY, minid=_stream_min_id(), approximate=True)
+        await pipe.execute()
+
+
+@dataclass(frozen=True)
+class _Sample:
+    created_at: datetime
+    id: str
+    quality_score: float | None
+    metric: float | None
+
+    @property
+    def scored(self) -> bool:
+        return self.quality_score is not None and self.metric is not None
+
+
+def _created_at(sample: _Sample) -> datetime:
+    return sample.created_at
+
+
+class _RewardWindow:
+    """One hotkey's reward data for one task, oldest first"""
+
+    def __init__(self) -> None:
+        self.samples: list[_Sample] = []
+        # Over the samples with both a quality score and a metric - the others are skipped when scoring
+        self.quality_sum = 0.0
+        self.sorted_metrics: list[float] = []
+
+    def add(self, sample: _Sample) -> None:
+        bisect.insort(self.samples, sample, key=_created_at)
+        if sample.scored:
+            self.quality_sum += sample.quality_score**1.5
+            bisect.insort(self.sorted_metrics, sample.metric)
+
+    def expire(self, cutoff: datetime) -> list[_Sample]:
+        expired_count = bisect.bisect_right(self.samples, cutoff, key=_created_at)
+        expired, self.samples = self.samples[:expired_count], self.samples[expired_count:]
+        for sample in expired:
+            if sample.scored:
+                self.quality_sum -= sample.quality_score**1.5
+                del self.sorted_metrics[bisect.bisect_left(self.sorted_metrics, sample.metric)]
+        if not self.sorted_metrics:
+            self.quality_sum = 0.0
+        return expired
+
+
+class _PeriodScores:
+    """A contender's latest PERIOD_SCORE_LOOKBACK period scores, oldest first, folded into time decayed sums"""
+
+    def __init__(self) -> None:
+        self.entries: deque[PeriodScore] = deque()
+        # Sums over the entries of period_score * consumed_capacity * decay ** age, and consumed_capacity * decay ** age,
+        # where the newest has age 0. Their ratio is the normalised period score
+        self.weighted_scores = 0.0
+        self.weights = 0.0
+
+    def add(self, period_score: PeriodScore) -> None:
+        if self.entries and period_score.created_at <= self.entries[-1].created_at:
+            # Already have it, from the database
+            return
+        self.entries.append(period_score)
+        if len(self.entries) > PERIOD_SCORE_LOOKBACK:
+            self.entries.popleft()
+            self._refold()
+        else:
+            self._fold(period_score)
+
+    def _fold(self, period_score: PeriodScore) -> None:
+        decay = 1 - PERIOD_SCORE_TIME_DECAYING_FACTOR
+        self.weighted_scores = period_score.period_score * period_score.consumed_capacity + decay * self.weighted_scores
+        self.weights = period_score.consumed_capacity + decay * self.weights
+
+    def _refold(self) -> None:
+        self.weighted_scores, self.weights = 0.0, 0.0
+        for period_score in self.entries:
+            self._fold(period_score)
+
+    def normalised(self) -> tuple[float, float]:
+        """The normalised period score and its multiplier"""
+        # Requires an abundance of data before handing out top scores
+        multiplier = 1.0 if len(self.entries) > 8 else 0.25
+        if self.weights == 0:
+            return 0.0, multiplier
+        return multiplier * self.weighted_scores / self.weights, multiplier
+
+
+class WeightState:
+    def __init__(self) -> None:
+        self._clear()
+        self._last_event_id: bytes | str = "0-0"
+        self._rebuilt_at: datetime | None = None
+
+    def _clear(self) -> None:
+        # hotkey -> task -> window
+        self._reward_windows: dict[str, dict[str, _RewardWindow]] = {}
+        self._reward_data_ids: set[str] = set()
+        self._period_scores: dict[tuple[str, str], _PeriodScores] = {}
+
+    def add_reward_data(
+        self, id: str, task: str, hotkey: str, quality_score: float | None, metric: float | None, created_at: datetime
+    ) -> None:
+        if id in self._reward_data_ids:
+            return
+        self._reward_data_ids.add(id)
+        windows = self._reward_windows.setdefault(hotkey, {})
+        windows.setdefault(task, _RewardWindow()).add(_Sample(created_at, id, quality_score, metric))
+
+    def add_period_score(self, period_score: PeriodScore) -> None:
+        if period_score.period_score is None:
+            return
+        self._period_scores.setdefault((period_score.task, period_score.hotkey), _PeriodScores()).add(period_score)
+
+    def expire(self, now: datetime) -> None:
+        """Drops the reward data which has fallen out of the window"""
+        cutoff = now - RECENT_REWARD_DATA_WINDOW
+        for hotkey, windows in list(self._reward_windows.items()):
+            for task, window in list(windows.items()):
+                self._reward_data_ids.difference_update(sample.id for sample in window.expire(cutoff))
+                if not window.samples:
+                    del windows[task]
+            if not windows:
+                del self._reward_windows[hotkey]
+
+    def _apply(self, event: dict[str, Any]) -> None:
+        if event["type"] == REWARD_DATA_EVENT:
+            self.add_reward_data(
+                event["id"],
+                event["task"],
+                event["hotkey"],
+                event["quality_score"],
+                event["metric"],
+                datetime.fromisoformat(event["created_at"]),
+            )
+        elif event["type"] == PERIOD_SCORE_EVENT:
+            self.add_period_score(PeriodScore(**{key: value for key, value in event.items() if key != "type"}))
+        else:
+            logger.warning(f"Unknown weight state event type: {event['type']}")
+
+    async def sync(self, redis_db: Redis) -> int:
+        """Applies the events published since the last sync. Returns how many there were"""
+        applied = 0
+        while True:
+            response = await redis_db.xread({rcst.WEIGHT_STATE_EVENTS_KEY: self._last_event_id}, count=STREAM_READ_COUNT)
+            if not response:
+                return applied
+            _, events = response[0]
+            for event_id, fields in events:
+                self._apply(json.loads(fields[STREAM_FIELD]))
+                self._last_event_id = event_id
+            applied += len(events)
+            if len(events) < STREAM_READ_COUNT:
+                return applied
+
+    async def rebuild(self, psql_db: PSQLDB, redis_db: Redis, now: datetime | None = None) -> None:
+        """Loads the state from the database from scratch, then catches up on the stream"""
+        now = now or datetime.now()
+        # Events published from here on might not be in what we load, so are applied after. Anything in both is
+        # only counted once - reward data by id, and period scores by created_at
+        latest_events = await redis_db.xrevrange(rcst.WEIGHT_STATE_EVENTS_KEY, count=1)
+        async with await psql_db.connection() as connection:
+            reward_datas = await select_reward_data_since(connection, now - RECENT_REWARD_DATA_WINDOW)
+            period_scores = await select_period_score_history(connection, PERIOD_SCORE_LOOKBACK)
+
+        self._clear()
+        for row in reward_datas:
+            self.add_reward_data(
+                _reward_data_id(row[dcst.COLUMN_ID]),
+                row[dcst.COLUMN_TASK],
+                row[dcst.COLUMN_MINER_HOTKEY],
+                row[dcst.COLUMN_QUALITY_SCORE],
+                row[dcst.COLUMN_METRIC],
+                row[dcst.COLUMN_CREATED_AT],
+            )
+        for period_score in period_scores:
+            self.add_period_score(period_score)
+        self._last_event_id = latest_events[0][0] if latest_events else "0-0"
+        self._rebuilt_at = now
+        applied = await self.sync(redis_db)
+        logger.info(
+            f"Rebuilt the weight state from {len(reward_datas)} reward data and {len(period_scores)} period scores,"
+            f" then {applied} events"
+        )
+
+    def invalidate(self) -> None:
+        """Makes the next refresh rebuild"""
+        self._rebuilt_at = None
+
+    async def refresh(self, psql_db: PSQLDB, redis_db: Redis, now: datetime | None = None) -> None:
+        """Brings the state up to date - catching up on the stream, or rebuilding every REBUILD_INTERVAL"""
+        now = now or datetime.now()
+        if self._rebuilt_at is None or now - self._rebuilt_at > REBUILD_INTERVAL:
+            await self.rebuild(psql_db, redis_db, now)
+        else:
+            await self.sync(redis_db)
+        self.expire(now)
+
+    def _quality_and_metric_scores(self, hotkey: str, task: str) -> tuple[float, float] | None:
+        """A hotkey's average weighted quality score and metric score for a task, or None if it has no reward data"""
+        windows = self._reward_windows.get(hotkey, {})
+        window = windows.get(task)
+        task_samples = window.samples if window is not None else []
+        if len(task_samples) >= REWARD_SAMPLES_PER_HOTKEY:
+            if not window.sorted_metrics:
+                return None
+            scored_count = len(window.sorted_metrics)
+            return window.quality_sum / scored_count, window.sorted_metrics[int(scored_count * METRIC_PERCENTILE)]
+
+        # Few enough samples to score from scratch
+        latest_samples = heapq.merge(*(reversed(w.samples) for w in windows.values()), key=_created_at, reverse=True)
+        samples = [
+            sample
+            for sample in chain(task_samples, islice(latest_samples, REWARD_SAMPLES_PER_HOTKEY - len(task_samples)))
+            if sample.scored
+        ]
+        if not samples:
+            return None
+        metrics = sorted(sample.metric for sample in samples)
+        average_quality_score = sum(sample.quality_score**1.5 for sample in samples) / len(samples)
+        return average_quality_score, metrics[int(len(metrics) * METRIC_PERCENTILE)]
+
+    def task_scores(
+        self, task: str, task_weight: float, node_hotkeys: list[str], contenders: list[Contender]
+    ) -> weight_engine.TaskScores:
+        """A task's scores, as weight_engine.calculate_task_scores would give from the database"""
+        hotkeys, average_quality_scores, metric_scores = [], [], []
+        for hotkey in dict.fromkeys(node_hotkeys):
+            scores = self._quality_and_metric_scores(hotkey, task)
+            if scores is not None:
+                hotkeys.append(hotkey)
+                average_quality_scores.append(scores[0])
+                metric_scores.append(scores[1])
+        hotkey_codes = {hotkey: code for code, hotkey in enumerate(hotkeys)}
+
+        task_contenders = [contender for contender in contenders if contender.task == task]
+        no_period_scores = _PeriodScores()
+        normalised_period_scores = [
+            self._period_scores.get((task, contender.node_hotkey), no_period_scores).normalised() for contender in task_contenders
+        ]
+
+        return weight_engine.score_task(
+            task,
+            task_weight,
+            np.array(hotkeys, dtype=str),
+            np.array(average_quality_scores, dtype=np.float64),
+            np.array(metric_scores, dtype=np.float64),
+            np.array([hotkey_codes.get(contender.node_hotkey, -1) for contender in task_contenders], dtype=np.int64),
+            np.array([contender.capacity for contender in task_contenders], dtype=np.float64),
+            np.array([score for score, _ in normalised_period_scores], dtype=np.float64),
+            np.array([multiplier for _, multiplier in normalised_period_scores], dtype=np.float64),
+        )
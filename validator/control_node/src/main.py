@@ -10,7 +10,10 @@ import asyncio
 
 from fiber.logging_utils import get_logger
 
+from core import metrics
+
 from validator.control_node.src.score_results import score_results
+from validator.control_node.src.retention import retention
 from validator.control_node.src.control_config import load_config
 from validator.control_node.src.synthetics import refresh_synthetic_data  # noqa
 from validator.control_node.src.cycle import execute_cycle  # noqa
@@ -18,16 +21,20 @@ from validator.control_node.src.cycle import execute_cycle  # noqa
 
 logger = get_logger(__name__)
 
+DEFAULT_METRICS_PORT = 9102
+
 
 async def main() -> None:
     config = load_config()
     await config.psql_db.connect()
+    await metrics.start_metrics_server(int(os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT)))
 
     # NOTE: We could make separate threads if you wanted to be fancy
     await asyncio.gather(
         score_results.main(config),
         refresh_synthetic_data.main(config),
         execute_cycle.main(config),
+        retention.main(config),
     )
 
 
@@ -0,0 +1,156 @@
+"""
+Deletes old rows from the tables which grow with every query we score.
+
+Runs on a timer, separately from scoring, so storing a score is only ever an insert. How long rows
+are kept is configurable per table (see `Config.retention_periods`).
+
+The big tables are range partitioned by created_at (see PARTITIONED_TABLES), so retention is dropping
+the partitions which have entirely expired - a partition's rows are kept for up to one partition
+interval longer than the retention period. We also create each table's partitions ahead of time here;
+rows which arrive before their partition exists go into the table's DEFAULT partition, and are moved out
+once it's created.
+Once reward_data is cleaned up, the task_scoring_counts used to pick what to score next are rebuilt
+from it, so they cover the same window.
+Any other table is cleaned in batches of BATCH_SIZE rows, one short statement per batch, so we never
+hold locks for long or block the inserts.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from fiber.logging_utils import get_logger
+
+from core import metrics
+from validator.control_node.src.control_config import Config
+from validator.db.src.sql import partitions
+from validator.db.src.sql.rewards_and_scores import delete_batch_older_than, rebuild_task_scoring_counts
+from validator.utils.database import database_constants as dcst
+
+logger = get_logger(__name__)
+
+RETENTION_INTERVAL = 60 * 5
+BATCH_SIZE = 5_000
+# Give the other writers a look in between batches
+PAUSE_BETWEEN_BATCHES = 0.05
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    interval: timedelta
+    name_format: str
+    # How far ahead to create partitions, so inserts still have somewhere to go if we're down for a while
+    create_ahead: timedelta
+
+
+DAILY = PartitionSpec(interval=timedelta(days=1), name_format="%Y%m%d", create_ahead=timedelta(days=7))
+HOURLY = PartitionSpec(interval=timedelta(hours=1), name_format="%Y%m%d%H", create_ahead=timedelta(days=2))
+
+PARTITIONED_TABLES = {
+    dcst.TABLE_REWARD_DATA: DAILY,
+    dcst.CONTENDERS_HISTORY_TABLE: DAILY,
+    dcst.NODES_HISTORY_TABLE: DAILY,
+    dcst.TABLE_TASKS: HOURLY,
+}
+
+RETENTION_ROWS_DELETED_TOTAL = metrics.Counter(
+    "control_node_retention_rows_deleted_total", "Rows deleted by the retention job", labelnames=("table",)
+)
+RETENTION_PARTITIONS_DROPPED_TOTAL = metrics.Counter(
+    "control_node_retention_partitions_dropped_total", "Expired partitions dropped by the retention job", labelnames=("table",)
+)
+RETENTION_SECONDS = metrics.Histogram(
+    "control_node_retention_seconds", "Time taken to clean up each table", labelnames=("table",)
+)
+
+
+def _floor(moment: datetime, interval: timedelta) -> datetime:
+    return datetime.min + ((moment - datetime.min) // interval) * interval
+
+
+async def delete_expired_rows(config: Config, table: str, cutoff: datetime, batch_size: int = BATCH_SIZE) -> int:
+    rows_deleted = 0
+    while True:
+        async with await config.psql_db.connection() as connection:
+            deleted = await delete_batch_older_than(connection, table, cutoff, batch_size)
+        rows_deleted += deleted
+        RETENTION_ROWS_DELETED_TOTAL.inc(table, amount=deleted)
+        if deleted < batch_size:
+            return rows_deleted
+        await asyncio.sleep(PAUSE_BETWEEN_BATCHES)
+
+
+async def maintain_partitions(config: Config, table: str, spec: PartitionSpec, cutoff: datetime) -> tuple[int, int]:
+    """Creates the partitions we'll need soon and drops the ones which have expired. Returns (created, dropped)"""
+    now = datetime.now()
+    created = dropped = moved = 0
+    async with await config.psql_db.connection() as connection:
+        existing = set(await partitions.select_partition_names(connection, table))
+
+        # Anything in the default partition was inserted while we were too far behind to have created its partition;
+        # creating the partitions for it moves it out, and the expired ones are dropped below as usual
+        oldest_misplaced = await partitions.select_oldest_in_default_partition(connection, table)
+        start = _floor(now if oldest_misplaced is None else min(oldest_misplaced, now), spec.interval)
+        while start <= now + spec.create_ahead:
+            name = partitions.partition_name(table, start, spec.name_format)
+            if name not in existing:
+                moved += await partitions.create_partition(connection, table, name, start, start + spec.interval)
+                existing.add(name)
+                created += 1
+            start += spec.interval
+
+        if moved:
+            logger.warning(
+                f"Moved {moved} rows of {table} out of its default partition - the retention job fell behind creating "
+                f"partitions (it creates them {spec.create_ahead} ahead)"
+            )
+
+        for name in existing:
+            partition_start = partitions.partition_start(table, name, spec.name_format)
+            if partition_start is not None and partition_start + spec.interval <= cutoff:
+                await partitions.drop_partition(connection, name)
+                dropped += 1
+
+    RETENTION_PARTITIONS_DROPPED_TOTAL.inc(table, amount=dropped)
+    return created, dropped
+
+
+async def refresh_task_scoring_counts(config: Config, cutoff: datetime) -> None:
+    start = time.perf_counter()
+    try:
+        async with await config.psql_db.connection() as connection:
+            counts = await rebuild_task_scoring_counts(connection, cutoff)
+    except Exception as e:
+        logger.error(f"Failed to rebuild {dcst.TABLE_TASK_SCORING_COUNTS}: {e}")
+        return
+    logger.info(f"Rebuilt {counts} {dcst.TABLE_TASK_SCORING_COUNTS} in {time.perf_counter() - start:.2f}s")
+
+
+async def run_retention(config: Config) -> None:
+    for table, retention_period in config.retention_periods.items():
+        start = time.perf_counter()
+        cutoff = datetime.now() - retention_period
+        try:
+            spec = PARTITIONED_TABLES.get(table)
+            if spec is not None:
+                created, dropped = await maintain_partitions(config, table, spec, cutoff)
+                result = f"Created {created} and dropped {dropped} partitions of {table}"
+            else:
+                rows_deleted = await delete_expired_rows(config, table, cutoff)
+                result = f"Deleted {rows_deleted} rows from {table}"
+        except Exception as e:
+            logger.error(f"Failed to clean up old rows from {table}: {e}")
+            continue
+        time_taken = time.perf_counter() - start
+        RETENTION_SECONDS.observe(time_taken, table)
+        logger.info(f"{result} (keeping {retention_period}) in {time_taken:.2f}s")
+
+    if dcst.TABLE_REWARD_DATA in config.retention_periods:
+        await refresh_task_scoring_counts(config, datetime.now() - config.retention_periods[dcst.TABLE_REWARD_DATA])
+
+
+async def main(config: Config) -> None:
+    while True:
+        await run_retention(config)
+        await asyncio.sleep(RETENTION_INTERVAL)
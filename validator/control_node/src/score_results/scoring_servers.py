@@ -0,0 +1,162 @@
+"""
+A pool of checking (GPU) servers for scoring results.
+
+Each server takes up to max_in_flight check tasks at once. Servers which say they're Busy, or error,
+are backed off for a while and their work goes to another server. Polling for a check task's result
+starts quickly and backs off, with intervals tuned to how long that task type usually takes to check.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+from fiber.logging_utils import get_logger
+
+from core.models import config_models as cmodels
+
+logger = get_logger(__name__)
+
+CHECK_RESULT_TIMEOUT = 180
+BUSY_BACKOFF = 2.0
+MAX_BUSY_BACKOFF = 20.0
+# (first poll interval, max poll interval) in seconds
+POLL_INTERVALS = {
+    cmodels.TaskType.TEXT: (0.5, 3.0),
+    cmodels.TaskType.IMAGE: (2.0, 10.0),
+}
+POLL_BACKOFF_MULTIPLIER = 1.5
+# Give up on a check task which is still processing after this long
+MAX_POLL_TIME = 600
+
+
+class ServerBusyError(Exception):
+    """The checking server is at capacity - try again (possibly on another server) later"""
+
+
+class CheckFailedError(Exception):
+    """The checking server couldn't score this result"""
+
+
+@dataclass
+class ScoringServer:
+    address: str
+    max_in_flight: int
+    in_flight: int = 0
+    unavailable_until: float = 0.0
+    consecutive_errors: int = 0
+    busy_backoff: float = BUSY_BACKOFF
+
+    @property
+    def available(self) -> bool:
+        return self.in_flight < self.max_in_flight and time.time() >= self.unavailable_until
+
+    def mark_busy(self) -> None:
+        self.unavailable_until = time.time() + self.busy_backoff
+        self.busy_backoff = min(self.busy_backoff * 2, MAX_BUSY_BACKOFF)
+
+    def mark_error(self) -> None:
+        self.consecutive_errors += 1
+        # Same backoff as we've always used for a broken checking server
+        self.unavailable_until = time.time() + min(60 * (2 ** (self.consecutive_errors - 1)), 300)
+
+    def mark_success(self) -> None:
+        self.consecutive_errors = 0
+        self.busy_backoff = BUSY_BACKOFF
+
+
+class ScoringServerPool:
+    def __init__(self, addresses: list[str], max_in_flight_per_server: int = 1):
+        self.servers = [ScoringServer(address=address.rstrip("/"), max_in_flight=max_in_flight_per_server) for address in addresses]
+        self.client = httpx.AsyncClient(timeout=CHECK_RESULT_TIMEOUT)
+        self._slot_freed = asyncio.Condition()
+
+    @property
+    def total_slots(self) -> int:
+        return sum(server.max_in_flight for server in self.servers)
+
+    async def acquire(self) -> ScoringServer:
+        """Waits for a server with a free slot, preferring the least loaded one. Release it with `release`"""
+        async with self._slot_freed:
+            while True:
+                available = [server for server in self.servers if server.available]
+                if available:
+                    server = min(available, key=lambda s: s.in_flight)
+                    server.in_flight += 1
+                    return server
+                next_available = min(
+                    (server.unavailable_until for server in self.servers if server.in_flight < server.max_in_flight),
+                    default=None,
+                )
+                timeout = max(next_available - time.time(), 0.1) if next_available is not None else None
+                try:
+                    await asyncio.wait_for(self._slot_freed.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, server: ScoringServer) -> None:
+        async with self._slot_freed:
+            server.in_flight -= 1
+            self._slot_freed.notify_all()
+
+    async def wait_until_reachable(self) -> None:
+        sleep_duration = 5.0
+        while True:
+            for server in self.servers:
+                try:
+                    response = await self.client.get(server.address, timeout=10)
+                    response.raise_for_status()
+                    logger.info(f"Connected to the external scoring server {server.address}")
+                    return
+                except httpx.HTTPError as e:
+                    logger.error(f"Failed to connect to the external scoring server {server.address}: {e}")
+            logger.warning(f"Failed to connect to any external scoring server. Retrying in {sleep_duration} seconds...")
+            await asyncio.sleep(sleep_duration)
+            sleep_duration = min(sleep_duration + 0.5, 30)
+
+    async def check_result(self, server: ScoringServer, check_result_payload: dict, task_type: cmodels.TaskType) -> dict[str, Any]:
+        """Raises ServerBusyError if the server can't take the task right now, CheckFailedError if scoring failed"""
+        try:
+            response = await self.client.post(server.address + "/check-result", json=check_result_payload)
+            if response.status_code == 422:
+                logger.error(f"Request failed due to {response.status_code}: {response.json().get('detail')}")
+            response.raise_for_status()
+            task_id = response.json().get("task_id")
+
+            if task_id is None:
+                if response.json().get("status") == "Busy":
+                    server.mark_busy()
+                    raise ServerBusyError(server.address)
+                logger.error(f"Checking server {server.address} seems broke, please check!")
+                server.mark_error()
+                raise CheckFailedError(f"No task id from {server.address}")
+
+            poll_interval, max_poll_interval = POLL_INTERVALS.get(task_type, (1.0, 5.0))
+            deadline = time.time() + MAX_POLL_TIME
+            while True:
+                await asyncio.sleep(poll_interval)
+                poll_interval = min(poll_interval * POLL_BACKOFF_MULTIPLIER, max_poll_interval)
+                task_response = await self.client.get(server.address + f"/check-task/{task_id}")
+                task_response.raise_for_status()
+                task_response_json = task_response.json()
+
+                if task_response_json.get("status") != "Processing":
+                    break
+                if time.time() > deadline:
+                    server.mark_error()
+                    raise CheckFailedError(f"Task {task_id} on {server.address} still processing after {MAX_POLL_TIME}s")
+
+            if task_response_json.get("status") == "Failed":
+                logger.error(f"Task {task_id} failed: {task_response_json.get('error')}")
+                server.mark_error()
+                raise CheckFailedError(f"Task {task_id} failed on {server.address}")
+
+            logger.info(f"Task {task_id} is done: {task_response_json}")
+            server.mark_success()
+            return task_response_json.get("result", {})
+
+        except httpx.HTTPError as http_err:
+            logger.error(f"When scoring on {server.address}, HTTP error occurred: {http_err}")
+            server.mark_error()
+            raise CheckFailedError(str(http_err)) from http_err
@@ -0,0 +1,22 @@
+-- migrate:up
+-- How many samples we've taken off the tasks queue for scoring, per task & hotkey - so picking
+-- the least scored hotkey doesn't need to aggregate reward_data every time. Claims bump the counts;
+-- the control node's retention job rebuilds them from reward_data, so they cover the same window
+CREATE TABLE IF NOT EXISTS task_scoring_counts (
+    task TEXT NOT NULL,
+    node_hotkey TEXT NOT NULL,
+    scored_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (task, node_hotkey)
+);
+
+INSERT INTO task_scoring_counts (task, node_hotkey, scored_count)
+SELECT task, node_hotkey, COUNT(*)
+FROM reward_data
+GROUP BY task, node_hotkey
+ON CONFLICT (task, node_hotkey) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_tasks_task_name_node_hotkey ON tasks (task_name, node_hotkey, id);
+
+-- migrate:down
+DROP INDEX IF EXISTS idx_tasks_task_name_node_hotkey;
+DROP TABLE IF EXISTS task_scoring_counts;
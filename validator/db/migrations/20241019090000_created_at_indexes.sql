@@ -0,0 +1,10 @@
+-- migrate:up
+-- So the retention job can find expired rows without scanning the whole table
+CREATE INDEX IF NOT EXISTS idx_reward_data_created_at ON reward_data (created_at);
+CREATE INDEX IF NOT EXISTS idx_contenders_history_created_at ON contenders_history (created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+
+-- migrate:down
+DROP INDEX IF EXISTS idx_reward_data_created_at;
+DROP INDEX IF EXISTS idx_contenders_history_created_at;
+DROP INDEX IF EXISTS idx_tasks_created_at;
@@ -0,0 +1,273 @@
+-- migrate:up
+-- Range partition the append-only tables by created_at, so retention drops whole partitions instead of
+-- deleting rows. Daily partitions, apart from tasks which are hourly. The control node's retention job
+-- creates partitions ahead of time and drops the expired ones; this creates the initial set.
+-- Each table gets a DEFAULT partition too, so inserts don't fail if the job falls behind creating partitions.
+-- All rows are carried over, into partitions going back to the oldest one - whatever is past the configured
+-- retention periods is dropped by the retention job on its first pass.
+
+CREATE OR REPLACE FUNCTION create_time_partitions(parent TEXT, step INTERVAL, name_format TEXT, from_ts TIMESTAMP, to_ts TIMESTAMP)
+RETURNS VOID AS $$
+DECLARE
+    partition_start TIMESTAMP;
+BEGIN
+    FOR partition_start IN
+        SELECT generate_series(date_trunc(CASE WHEN step < INTERVAL '1 day' THEN 'hour' ELSE 'day' END, from_ts), to_ts, step)
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+            parent || '_p' || to_char(partition_start, name_format), parent, partition_start, partition_start + step
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- reward_data
+ALTER TABLE reward_data RENAME TO reward_data_unpartitioned;
+
+CREATE TABLE reward_data (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    task TEXT NOT NULL,
+    node_id INTEGER NOT NULL,
+    quality_score FLOAT NOT NULL,
+    validator_hotkey TEXT NOT NULL,
+    node_hotkey TEXT NOT NULL,
+    synthetic_query BOOLEAN NOT NULL,
+    response_time FLOAT,
+    volume FLOAT,
+    metric FLOAT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE reward_data_default PARTITION OF reward_data DEFAULT;
+SELECT create_time_partitions(
+    'reward_data', INTERVAL '1 day', 'YYYYMMDD',
+    LEAST((SELECT MIN(created_at) FROM reward_data_unpartitioned), LOCALTIMESTAMP), LOCALTIMESTAMP + INTERVAL '7 days'
+);
+
+INSERT INTO reward_data (id, task, node_id, quality_score, validator_hotkey, node_hotkey, synthetic_query, response_time, volume, metric, created_at)
+SELECT id, task, node_id, quality_score, validator_hotkey, node_hotkey, synthetic_query, response_time, volume, metric, created_at
+FROM reward_data_unpartitioned
+-- created_at was nullable; undated rows were never in any window, nor ever deleted by retention
+WHERE created_at IS NOT NULL;
+
+DROP TABLE reward_data_unpartitioned;
+ALTER TABLE reward_data ADD PRIMARY KEY (id, created_at);
+
+-- contenders_history
+ALTER SEQUENCE contenders_history_id_seq OWNED BY NONE;
+ALTER TABLE contenders_history RENAME TO contenders_history_unpartitioned;
+
+CREATE TABLE contenders_history (
+    id INTEGER NOT NULL DEFAULT nextval('contenders_history_id_seq'),
+    contender_id TEXT NOT NULL,
+    node_hotkey TEXT NOT NULL,
+    node_id INTEGER NOT NULL,
+    netuid INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    validator_hotkey TEXT NOT NULL,
+    raw_capacity FLOAT NOT NULL,
+    capacity FLOAT NOT NULL,
+    capacity_to_score FLOAT NOT NULL,
+    consumed_capacity FLOAT NOT NULL,
+    total_requests_made INTEGER NOT NULL DEFAULT 0,
+    requests_429 INTEGER NOT NULL DEFAULT 0,
+    requests_500 INTEGER NOT NULL DEFAULT 0,
+    period_score FLOAT,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    expired_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'UTC')
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE contenders_history_id_seq OWNED BY contenders_history.id;
+
+CREATE TABLE contenders_history_default PARTITION OF contenders_history DEFAULT;
+SELECT create_time_partitions(
+    'contenders_history', INTERVAL '1 day', 'YYYYMMDD',
+    LEAST((SELECT MIN(created_at) FROM contenders_history_unpartitioned), LOCALTIMESTAMP), LOCALTIMESTAMP + INTERVAL '7 days'
+);
+
+INSERT INTO contenders_history
+SELECT * FROM contenders_history_unpartitioned;
+
+DROP TABLE contenders_history_unpartitioned;
+ALTER TABLE contenders_history ADD PRIMARY KEY (id, created_at);
+
+-- nodes_history
+ALTER SEQUENCE nodes_history_id_seq OWNED BY NONE;
+ALTER TABLE nodes_history RENAME TO nodes_history_unpartitioned;
+
+CREATE TABLE nodes_history (
+    id INTEGER NOT NULL DEFAULT nextval('nodes_history_id_seq'),
+    hotkey TEXT NOT NULL,
+    coldkey TEXT NOT NULL,
+    node_id INTEGER NOT NULL,
+    incentive FLOAT NOT NULL,
+    netuid INTEGER NOT NULL,
+    stake FLOAT NOT NULL,
+    trust FLOAT NOT NULL,
+    vtrust FLOAT NOT NULL,
+    last_updated FLOAT,
+    ip TEXT NOT NULL,
+    ip_type INTEGER NOT NULL,
+    port INTEGER NOT NULL,
+    protocol INTEGER NOT NULL DEFAULT 4,
+    network TEXT NOT NULL,
+    our_validator BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    expired_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'UTC')
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE nodes_history_id_seq OWNED BY nodes_history.id;
+
+CREATE TABLE nodes_history_default PARTITION OF nodes_history DEFAULT;
+SELECT create_time_partitions(
+    'nodes_history', INTERVAL '1 day', 'YYYYMMDD',
+    LEAST((SELECT MIN(created_at) FROM nodes_history_unpartitioned), LOCALTIMESTAMP), LOCALTIMESTAMP + INTERVAL '7 days'
+);
+
+INSERT INTO nodes_history
+SELECT * FROM nodes_history_unpartitioned;
+
+DROP TABLE nodes_history_unpartitioned;
+ALTER TABLE nodes_history ADD PRIMARY KEY (id, created_at);
+
+-- tasks
+ALTER SEQUENCE tasks_id_seq OWNED BY NONE;
+ALTER TABLE tasks RENAME TO tasks_unpartitioned;
+
+CREATE TABLE tasks (
+    id INTEGER NOT NULL DEFAULT nextval('tasks_id_seq'),
+    task_name TEXT NOT NULL,
+    checking_data TEXT NOT NULL,
+    node_hotkey TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id;
+
+CREATE TABLE tasks_default PARTITION OF tasks DEFAULT;
+SELECT create_time_partitions(
+    'tasks', INTERVAL '1 hour', 'YYYYMMDDHH24',
+    LEAST((SELECT MIN(created_at) FROM tasks_unpartitioned), LOCALTIMESTAMP), LOCALTIMESTAMP + INTERVAL '2 days'
+);
+
+INSERT INTO tasks (id, task_name, checking_data, node_hotkey, created_at)
+SELECT id, task_name, checking_data, node_hotkey, created_at
+FROM tasks_unpartitioned
+-- created_at was nullable; undated rows were never in any window, nor ever deleted by retention
+WHERE created_at IS NOT NULL;
+
+DROP TABLE tasks_unpartitioned;
+ALTER TABLE tasks ADD PRIMARY KEY (id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_task_name_node_hotkey ON tasks (task_name, node_hotkey, id);
+
+DROP FUNCTION create_time_partitions(TEXT, INTERVAL, TEXT, TIMESTAMP, TIMESTAMP);
+
+-- migrate:down
+-- reward_data
+ALTER TABLE reward_data RENAME TO reward_data_partitioned;
+
+CREATE TABLE reward_data (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    task TEXT NOT NULL,
+    node_id INTEGER NOT NULL,
+    quality_score FLOAT NOT NULL,
+    validator_hotkey TEXT NOT NULL,
+    node_hotkey TEXT NOT NULL,
+    synthetic_query BOOLEAN NOT NULL,
+    response_time FLOAT,
+    volume FLOAT,
+    metric FLOAT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO reward_data (id, task, node_id, quality_score, validator_hotkey, node_hotkey, synthetic_query, response_time, volume, metric, created_at)
+SELECT id, task, node_id, quality_score, validator_hotkey, node_hotkey, synthetic_query, response_time, volume, metric, created_at
+FROM reward_data_partitioned;
+
+DROP TABLE reward_data_partitioned;
+ALTER TABLE reward_data ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_reward_data_created_at ON reward_data (created_at);
+
+-- contenders_history
+ALTER SEQUENCE contenders_history_id_seq OWNED BY NONE;
+ALTER TABLE contenders_history RENAME TO contenders_history_partitioned;
+
+CREATE TABLE contenders_history (
+    id INTEGER NOT NULL DEFAULT nextval('contenders_history_id_seq'),
+    contender_id TEXT NOT NULL,
+    node_hotkey TEXT NOT NULL,
+    node_id INTEGER NOT NULL,
+    netuid INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    validator_hotkey TEXT NOT NULL,
+    raw_capacity FLOAT NOT NULL,
+    capacity FLOAT NOT NULL,
+    capacity_to_score FLOAT NOT NULL,
+    consumed_capacity FLOAT NOT NULL,
+    total_requests_made INTEGER NOT NULL DEFAULT 0,
+    requests_429 INTEGER NOT NULL DEFAULT 0,
+    requests_500 INTEGER NOT NULL DEFAULT 0,
+    period_score FLOAT,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    expired_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'UTC')
+);
+ALTER SEQUENCE contenders_history_id_seq OWNED BY contenders_history.id;
+
+INSERT INTO contenders_history SELECT * FROM contenders_history_partitioned;
+
+DROP TABLE contenders_history_partitioned;
+ALTER TABLE contenders_history ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_contenders_history_created_at ON contenders_history (created_at);
+
+-- nodes_history
+ALTER SEQUENCE nodes_history_id_seq OWNED BY NONE;
+ALTER TABLE nodes_history RENAME TO nodes_history_partitioned;
+
+CREATE TABLE nodes_history (
+    id INTEGER NOT NULL DEFAULT nextval('nodes_history_id_seq'),
+    hotkey TEXT NOT NULL,
+    coldkey TEXT NOT NULL,
+    node_id INTEGER NOT NULL,
+    incentive FLOAT NOT NULL,
+    netuid INTEGER NOT NULL,
+    stake FLOAT NOT NULL,
+    trust FLOAT NOT NULL,
+    vtrust FLOAT NOT NULL,
+    last_updated FLOAT,
+    ip TEXT NOT NULL,
+    ip_type INTEGER NOT NULL,
+    port INTEGER NOT NULL,
+    protocol INTEGER NOT NULL DEFAULT 4,
+    network TEXT NOT NULL,
+    our_validator BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    expired_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'UTC')
+);
+ALTER SEQUENCE nodes_history_id_seq OWNED BY nodes_history.id;
+
+INSERT INTO nodes_history SELECT * FROM nodes_history_partitioned;
+
+DROP TABLE nodes_history_partitioned;
+ALTER TABLE nodes_history ADD PRIMARY KEY (id);
+
+-- tasks
+ALTER SEQUENCE tasks_id_seq OWNED BY NONE;
+ALTER TABLE tasks RENAME TO tasks_partitioned;
+
+CREATE TABLE tasks (
+    id INTEGER NOT NULL DEFAULT nextval('tasks_id_seq'),
+    task_name TEXT NOT NULL,
+    checking_data TEXT NOT NULL,
+    node_hotkey TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id;
+
+INSERT INTO tasks (id, task_name, checking_data, node_hotkey, created_at)
+SELECT id, task_name, checking_data, node_hotkey, created_at
+FROM tasks_partitioned;
+
+DROP TABLE tasks_partitioned;
+ALTER TABLE tasks ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_tasks_task_name_node_hotkey ON tasks (task_name, node_hotkey, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
@@ -0,0 +1,20 @@
+-- migrate:up
+-- Indexes for the queries we run on every query / scoring pass.
+-- Indexes on the partitioned tables are created on every partition, including the ones created later.
+
+-- get_contenders_for_task: filter on task & capacity > 0, ordered by total_requests_made
+CREATE INDEX IF NOT EXISTS idx_contenders_task_total_requests_made ON contenders (task, total_requests_made) WHERE capacity > 0;
+
+-- select_recent_reward_data_for_a_task, with & without a hotkey
+CREATE INDEX IF NOT EXISTS idx_reward_data_task_created_at ON reward_data (task, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_reward_data_task_node_hotkey_created_at ON reward_data (task, node_hotkey, created_at DESC);
+
+-- fetch_hotkey_scores_for_task
+CREATE INDEX IF NOT EXISTS idx_contenders_history_task_node_hotkey_created_at
+    ON contenders_history (task, node_hotkey, created_at DESC);
+
+-- migrate:down
+DROP INDEX IF EXISTS idx_contenders_task_total_requests_made;
+DROP INDEX IF EXISTS idx_reward_data_task_created_at;
+DROP INDEX IF EXISTS idx_reward_data_task_node_hotkey_created_at;
+DROP INDEX IF EXISTS idx_contenders_history_task_node_hotkey_created_at;
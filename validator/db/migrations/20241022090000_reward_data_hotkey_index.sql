@@ -0,0 +1,6 @@
+-- migrate:up
+-- Topping up a hotkey's reward data from its other tasks, in select_recent_reward_data_for_hotkeys
+CREATE INDEX IF NOT EXISTS idx_reward_data_node_hotkey_created_at ON reward_data (node_hotkey, created_at DESC);
+
+-- migrate:down
+DROP INDEX IF EXISTS idx_reward_data_node_hotkey_created_at;
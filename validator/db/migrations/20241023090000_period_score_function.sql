@@ -0,0 +1,38 @@
+-- migrate:up
+-- calculate_period_score from validator/models.py, so update_contenders_period_scores can score every contender in
+-- one UPDATE. The two need to stay in step; validator/tests/db/test_period_score_function.py checks they agree.
+
+CREATE OR REPLACE FUNCTION calculate_period_score(
+    total_requests_made DOUBLE PRECISION,
+    capacity DOUBLE PRECISION,
+    consumed_capacity DOUBLE PRECISION,
+    requests_429 DOUBLE PRECISION,
+    requests_500 DOUBLE PRECISION
+)
+RETURNS DOUBLE PRECISION AS $$
+DECLARE
+    volume_unqueried DOUBLE PRECISION;
+    percentage_of_volume_unqueried DOUBLE PRECISION;
+    rate_limit_punishment_factor DOUBLE PRECISION;
+    server_error_punishment_factor DOUBLE PRECISION;
+    percentage_of_good_requests DOUBLE PRECISION;
+BEGIN
+    IF total_requests_made = 0 OR capacity = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    capacity := GREATEST(capacity, 1);
+    volume_unqueried := GREATEST(capacity - consumed_capacity, 0);
+
+    percentage_of_volume_unqueried := volume_unqueried / capacity;
+    percentage_of_good_requests := (total_requests_made - requests_429 - requests_500) / total_requests_made;
+
+    rate_limit_punishment_factor := (requests_429 / total_requests_made) * percentage_of_volume_unqueried;
+    server_error_punishment_factor := (requests_500 / total_requests_made) * percentage_of_volume_unqueried;
+
+    RETURN GREATEST(percentage_of_good_requests * (1 - rate_limit_punishment_factor) * (1 - server_error_punishment_factor), 0);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- migrate:down
+DROP FUNCTION IF EXISTS calculate_period_score(DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION);
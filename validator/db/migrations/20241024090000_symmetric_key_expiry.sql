@@ -0,0 +1,7 @@
+-- migrate:up
+-- Symmetric keys from handshakes are reused across cycles until they expire. Keys stored before this have no expiry,
+-- so count as expired
+ALTER TABLE nodes ADD COLUMN IF NOT EXISTS symmetric_key_expires_at TIMESTAMP WITHOUT TIME ZONE;
+
+-- migrate:down
+ALTER TABLE nodes DROP COLUMN IF EXISTS symmetric_key_expires_at;
@@ -4,11 +4,22 @@ from typing import Any
 import asyncpg
 from asyncpg import Pool
 
+from core import metrics
 from validator.utils.database import database_utils as dutils
 from fiber.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+POSTGRES_QUERY_SECONDS = metrics.Histogram("postgres_query_seconds", "Time taken by postgres queries", labelnames=("outcome",))
+
+
+def _observe_query(record: asyncpg.connection.LoggedQuery) -> None:
+    POSTGRES_QUERY_SECONDS.observe(record.elapsed, "error" if record.exception is not None else "ok")
+
+
+async def _init_connection(connection: asyncpg.Connection) -> None:
+    connection.add_query_logger(_observe_query)
+
 
 class PSQLDB:
     def __init__(self, from_env: bool = True, connection_string: str | None = None):
@@ -23,7 +34,7 @@ class PSQLDB:
         logger.debug(f"Connecting to {self.connection_string}....")
         if self.pool is None:
             try:
-                self.pool = await asyncpg.create_pool(self.connection_string)
+                self.pool = await asyncpg.create_pool(self.connection_string, init=_init_connection)
                 if self.pool is None:
                     raise ConnectionError("Failed to create connection pool")
                 else:
@@ -5,74 +5,78 @@ from typing import List, Any
 
 
 from core.models import utility_models
-from core import task_config as tcfg
 
 from validator.db.src.database import PSQLDB
 from validator.db.src.sql.rewards_and_scores import (
-    insert_task,
-    select_count_of_rows_in_tasks,
-    delete_oldest_rows_from_tasks,
-    select_count_rows_of_task_stored_for_scoring,
-    select_task_for_deletion,
+    insert_tasks,
+    claim_task_for_scoring,
     select_recent_reward_data_for_a_task,
     select_recent_reward_data,
-    delete_specific_task,
+    select_recent_reward_data_for_hotkeys,
 )
 from asyncpg import Connection
 
 from validator.models import RewardData
+from core import metrics
 
 
 MAX_TASKS_IN_DB_STORE = 1000
+# How far back the reward data used for the weights goes
+RECENT_REWARD_DATA_WINDOW = timedelta(hours=72)
+
+SCORING_SAMPLES_TOTAL = metrics.Counter(
+    "scoring_samples_total", "Query results offered for scoring, by whether they were stored", labelnames=("task", "outcome")
+)
 db_lock = asyncio.Lock()
 
 
-async def insert_task_results(
-    connection: Connection, task: str, result: utility_models.QueryResult, synthetic_query: bool, payload: dict
-) -> None:
-    row_count = await select_count_of_rows_in_tasks(connection)
-
-    if row_count >= MAX_TASKS_IN_DB_STORE + 10:
-        await delete_oldest_rows_from_tasks(connection, limit=10)
-
-    data_to_store = {
-        "query_result": result.model_dump(mode="json"),
-        "payload": json.dumps(payload),
-        "synthetic_query": synthetic_query,
-    }
-    hotkey = result.node_hotkey
-    if hotkey is None:
-        return None
-    data = json.dumps(data_to_store)
-    await insert_task(connection, task, data, hotkey)
-
-
-async def potentially_store_result_in_db(
-    psql_db: PSQLDB, result: utility_models.QueryResult, task: str, synthetic_query: bool, payload: dict
-) -> None:
-    task_config = tcfg.get_enabled_task_config(task)
-    if task_config is None:
-        return
-    target_percentage = task_config.weight
-    target_number_of_tasks_to_store = int(MAX_TASKS_IN_DB_STORE * target_percentage)
+def _dump_query_result(result: utility_models.QueryResult) -> dict[str, Any]:
+    query_result = result.model_dump(mode="json")
+    # Streamed responses are kept as a raw json string until we know they're being stored
+    if isinstance(query_result.get("formatted_response"), str):
+        query_result["formatted_response"] = json.loads(query_result["formatted_response"])
+    return query_result
+
+
+async def store_results_for_scoring(
+    psql_db: PSQLDB, results: list[tuple[utility_models.QueryResult, bool, dict]]
+) -> dict[str, int]:
+    """
+    Stores results which have already been chosen for scoring (see the query node's scoring_sampler.py)
+    in one insert. Returns how many were stored per task.
+    """
+    rows_to_insert = []
+    stored_per_task: dict[str, int] = {}
+    for result, synthetic_query, payload in results:
+        if result.node_hotkey is None:
+            continue
+        data_to_store = {
+            "query_result": _dump_query_result(result),
+            "payload": json.dumps(payload),
+            "synthetic_query": synthetic_query,
+        }
+        rows_to_insert.append((result.task, json.dumps(data_to_store), result.node_hotkey))
+        stored_per_task[result.task] = stored_per_task.get(result.task, 0) + 1
+
+    if not rows_to_insert:
+        return {}
+
     async with await psql_db.connection() as connection:
-        number_of_these_tasks_already_stored = await select_count_rows_of_task_stored_for_scoring(connection, task)
-        if number_of_these_tasks_already_stored <= target_number_of_tasks_to_store:
-            await insert_task_results(
-                connection=connection, task=task, result=result, payload=payload, synthetic_query=synthetic_query
-            )
+        await insert_tasks(connection, rows_to_insert)
+
+    for task, stored in stored_per_task.items():
+        SCORING_SAMPLES_TOTAL.inc(task, "stored", amount=stored)
+    return stored_per_task
 
 
 async def select_and_delete_task_result(psql_db: PSQLDB, task: str) -> tuple[list[dict[str, Any]], str] | None:
     async with await psql_db.connection() as connection:
-        row = await select_task_for_deletion(connection, task)
+        row = await claim_task_for_scoring(connection, task)
         if row is None:
             return None
         checking_data, node_hotkey = row
         checking_data_loaded = json.loads(checking_data)
 
-        await delete_specific_task(connection, task, checking_data)
-
     return checking_data_loaded, node_hotkey
 
 
@@ -88,10 +92,26 @@ async def delete_data_older_than_date(connection: Connection, minutes: int) -> N
     ...
 
 
+def _reward_data_from_row(row: Any) -> RewardData:
+    return RewardData(
+        id=str(row[0]),
+        task=row[1],
+        node_id=row[2],
+        quality_score=row[3],
+        validator_hotkey=row[4],
+        node_hotkey=row[5],
+        synthetic_query=row[6],
+        metric=row[7],
+        response_time=row[8],
+        volume=row[9],
+        created_at=row[10],
+    )
+
+
 async def fetch_recent_most_rewards(
     connection: Connection, task: str, node_hotkey: str | None = None, quality_tasks_to_fetch: int = 50
 ) -> List[RewardData]:
-    date = datetime.now() - timedelta(hours=72)
+    date = datetime.now() - RECENT_REWARD_DATA_WINDOW
     priority_results = await select_recent_reward_data_for_a_task(connection, task, date, node_hotkey) or []
 
     y = len(priority_results or [])
@@ -100,21 +120,13 @@ async def fetch_recent_most_rewards(
     else:
         fill_results = []
 
-    reward_data_list = [
-        RewardData(
-            id=str(row[0]),
-            task=row[1],
-            node_id=row[2],
-            quality_score=row[3],
-            validator_hotkey=row[4],
-            node_hotkey=row[5],
-            synthetic_query=row[6],
-            metric=row[7],
-            response_time=row[8],
-            volume=row[9],
-            created_at=row[10],
-        )
-        for row in priority_results + fill_results
-    ]
-
-    return reward_data_list
+    return [_reward_data_from_row(row) for row in priority_results + fill_results]
+
+
+async def fetch_recent_most_rewards_for_hotkeys(
+    connection: Connection, task: str, node_hotkeys: list[str], quality_tasks_to_fetch: int = 50
+) -> List[RewardData]:
+    """fetch_recent_most_rewards for many hotkeys at once, in one query"""
+    date = datetime.now() - RECENT_REWARD_DATA_WINDOW
+    rows = await select_recent_reward_data_for_hotkeys(connection, task, date, node_hotkeys, quality_tasks_to_fetch)
+    return [_reward_data_from_row(row) for row in rows]
@@ -1,8 +1,8 @@
 from fiber.logging_utils import get_logger
 
-from asyncpg import Connection
+from asyncpg import Connection, Record
 from validator.db.src.database import PSQLDB
-from validator.models import Contender, PeriodScore, calculate_period_score
+from validator.models import Contender, PeriodScore
 from validator.utils.database import database_constants as dcst
 
 logger = get_logger(__name__)
@@ -192,6 +192,40 @@ async def update_contender_500_count(psql_db: PSQLDB, contender: Contender) -> N
         )
 
 
+async def update_contenders_counters(
+    connection: Connection, counter_deltas: list[tuple[str, float, int, int, int]]
+) -> None:
+    """
+    Applies (contender_id, consumed_capacity, total_requests_made, requests_429, requests_500) deltas
+    to many contenders in one statement
+    """
+    if not counter_deltas:
+        return
+    contender_ids, consumed_capacities, total_requests_made, requests_429, requests_500 = map(list, zip(*counter_deltas))
+    await connection.execute(
+        f"""
+        UPDATE {dcst.CONTENDERS_TABLE} c
+        SET {dcst.CONSUMED_CAPACITY} = c.{dcst.CONSUMED_CAPACITY} + d.{dcst.CONSUMED_CAPACITY},
+            {dcst.TOTAL_REQUESTS_MADE} = c.{dcst.TOTAL_REQUESTS_MADE} + d.{dcst.TOTAL_REQUESTS_MADE},
+            {dcst.REQUESTS_429} = c.{dcst.REQUESTS_429} + d.{dcst.REQUESTS_429},
+            {dcst.REQUESTS_500} = c.{dcst.REQUESTS_500} + d.{dcst.REQUESTS_500}
+        FROM unnest($1::text[], $2::float8[], $3::int[], $4::int[], $5::int[]) AS d(
+            {dcst.CONTENDER_ID},
+            {dcst.CONSUMED_CAPACITY},
+            {dcst.TOTAL_REQUESTS_MADE},
+            {dcst.REQUESTS_429},
+            {dcst.REQUESTS_500}
+        )
+        WHERE c.{dcst.CONTENDER_ID} = d.{dcst.CONTENDER_ID}
+        """,
+        contender_ids,
+        consumed_capacities,
+        total_requests_made,
+        requests_429,
+        requests_500,
+    )
+
+
 async def fetch_contender(connection: Connection, contender_id: str) -> Contender | None:
     row = await connection.fetchrow(
         f"""
@@ -226,6 +260,26 @@ async def fetch_all_contenders(connection: Connection, netuid: int | None = None
     return [Contender(**row) for row in rows]
 
 
+async def fetch_contenders_to_rank(connection: Connection, netuid: int) -> list[Contender]:
+    """The contenders which can be queried: they have capacity, and we've got a symmetric key for their node"""
+    rows = await connection.fetch(
+        f"""
+        SELECT
+            c.{dcst.CONTENDER_ID}, c.{dcst.NODE_HOTKEY}, c.{dcst.NODE_ID}, c.{dcst.NETUID}, c.{dcst.TASK},
+            c.{dcst.RAW_CAPACITY}, c.{dcst.CAPACITY_TO_SCORE}, c.{dcst.CONSUMED_CAPACITY},
+            c.{dcst.TOTAL_REQUESTS_MADE}, c.{dcst.REQUESTS_429}, c.{dcst.REQUESTS_500},
+            c.{dcst.CAPACITY}, c.{dcst.PERIOD_SCORE}
+        FROM {dcst.CONTENDERS_TABLE} c
+        JOIN {dcst.NODES_TABLE} n ON c.{dcst.NODE_ID} = n.{dcst.NODE_ID} AND c.{dcst.NETUID} = n.{dcst.NETUID}
+        WHERE c.{dcst.NETUID} = $1
+        AND c.{dcst.CAPACITY} > 0
+        AND n.{dcst.SYMMETRIC_KEY_UUID} IS NOT NULL
+        """,
+        netuid,
+    )
+    return [Contender(**row) for row in rows]
+
+
 async def fetch_hotkey_scores_for_task(connection: Connection, task: str, node_hotkey: str) -> list[PeriodScore]:
     rows = await connection.fetch(
         f"""
@@ -246,46 +300,105 @@ async def fetch_hotkey_scores_for_task(connection: Connection, task: str, node_h
     return [PeriodScore(**row) for row in rows]
 
 
-async def update_contenders_period_scores(connection: Connection, netuid: int) -> None:
-    rows = await connection.fetch(
+async def select_latest_period_scores(
+    connection: Connection, tasks: list[str], node_hotkeys: list[str], lookback: int
+) -> list[Record]:
+    """
+    The latest `lookback` period scores of each (task, node hotkey) pair: one row per pair which has any, with its
+    period_scores and consumed_capacities newest first. Missing period scores are left out
+    """
+    return await connection.fetch(
         f"""
-        SELECT 
-            {dcst.CONTENDER_ID},
-            {dcst.TOTAL_REQUESTS_MADE},
-            {dcst.CAPACITY},
-            {dcst.CONSUMED_CAPACITY},
-            {dcst.REQUESTS_429},
-            {dcst.REQUESTS_500}
-        FROM {dcst.CONTENDERS_TABLE}
-        WHERE {dcst.NETUID} = $1
-    """,
-        netuid,
+        SELECT
+            c.{dcst.TASK},
+            c.hotkey,
+            h.period_scores,
+            h.consumed_capacities
+        FROM unnest($1::text[], $2::text[]) AS c({dcst.TASK}, hotkey)
+        CROSS JOIN LATERAL (
+            SELECT
+                array_agg(latest.{dcst.PERIOD_SCORE} ORDER BY latest.{dcst.CREATED_AT} DESC) AS period_scores,
+                array_agg(latest.{dcst.CONSUMED_CAPACITY} ORDER BY latest.{dcst.CREATED_AT} DESC) AS consumed_capacities
+            FROM (
+                SELECT {dcst.PERIOD_SCORE}, {dcst.CONSUMED_CAPACITY}, {dcst.CREATED_AT}
+                FROM {dcst.CONTENDERS_HISTORY_TABLE}
+                WHERE {dcst.TASK} = c.{dcst.TASK}
+                AND {dcst.NODE_HOTKEY} = c.hotkey
+                AND {dcst.PERIOD_SCORE} IS NOT NULL
+                ORDER BY {dcst.CREATED_AT} DESC
+                LIMIT $3
+            ) latest
+        ) h
+        WHERE h.period_scores IS NOT NULL
+        """,
+        tasks,
+        node_hotkeys,
+        lookback,
     )
 
-    updates = []
-    for row in rows:
-        score = calculate_period_score(
-            float(row[dcst.TOTAL_REQUESTS_MADE]),
-            float(row[dcst.CAPACITY]),
-            float(row[dcst.CONSUMED_CAPACITY]),
-            float(row[dcst.REQUESTS_429]),
-            float(row[dcst.REQUESTS_500]),
-        )
-        if score is not None:
-            updates.append((score, row[dcst.CONTENDER_ID]))
 
-    logger.info(f"Updating {len(updates)} contenders with new period scores")
+async def select_period_score_history(connection: Connection, lookback: int) -> list[PeriodScore]:
+    """The latest `lookback` period scores of every (task, node hotkey) pair, oldest first. Missing period scores are left out"""
+    rows = await connection.fetch(
+        f"""
+        SELECT hotkey, {dcst.TASK}, {dcst.PERIOD_SCORE}, {dcst.CONSUMED_CAPACITY}, {dcst.CREATED_AT}
+        FROM (
+            SELECT
+                {dcst.NODE_HOTKEY} AS hotkey,
+                {dcst.TASK},
+                {dcst.PERIOD_SCORE},
+                {dcst.CONSUMED_CAPACITY},
+                {dcst.CREATED_AT},
+                ROW_NUMBER() OVER (
+                    PARTITION BY {dcst.TASK}, {dcst.NODE_HOTKEY} ORDER BY {dcst.CREATED_AT} DESC
+                ) AS recency
+            FROM {dcst.CONTENDERS_HISTORY_TABLE}
+            WHERE {dcst.PERIOD_SCORE} IS NOT NULL
+        ) history
+        WHERE recency <= $1
+        ORDER BY {dcst.CREATED_AT}
+        """,
+        lookback,
+    )
+    return [PeriodScore(**row) for row in rows]
+
 
-    await connection.executemany(
+async def update_contenders_period_scores(connection: Connection, netuid: int) -> list[PeriodScore]:
+    """
+    Scores every contender in one statement, with the calculate_period_score SQL function (see its migration).
+    Returns the period scores set, as they'll be in the history once the contenders are migrated to it
+    """
+    rows = await connection.fetch(
         f"""
-        UPDATE {dcst.CONTENDERS_TABLE}
-        SET {dcst.PERIOD_SCORE} = $1,
+        UPDATE {dcst.CONTENDERS_TABLE} c
+        SET {dcst.PERIOD_SCORE} = scored.{dcst.PERIOD_SCORE},
             {dcst.UPDATED_AT} = NOW() AT TIME ZONE 'UTC'
-        WHERE {dcst.CONTENDER_ID} = $2
+        FROM (
+            SELECT
+                {dcst.CONTENDER_ID},
+                calculate_period_score(
+                    {dcst.TOTAL_REQUESTS_MADE},
+                    {dcst.CAPACITY},
+                    {dcst.CONSUMED_CAPACITY},
+                    {dcst.REQUESTS_429},
+                    {dcst.REQUESTS_500}
+                ) AS {dcst.PERIOD_SCORE}
+            FROM {dcst.CONTENDERS_TABLE}
+            WHERE {dcst.NETUID} = $1
+        ) scored
+        WHERE c.{dcst.CONTENDER_ID} = scored.{dcst.CONTENDER_ID}
+        AND scored.{dcst.PERIOD_SCORE} IS NOT NULL
+        RETURNING
+            c.{dcst.NODE_HOTKEY} AS hotkey,
+            c.{dcst.TASK},
+            c.{dcst.PERIOD_SCORE},
+            c.{dcst.CONSUMED_CAPACITY},
+            c.{dcst.CREATED_AT}
     """,
-        updates,
+        netuid,
     )
-    logger.info(f"Updated {len(updates)} contenders with new period scores")
+    logger.info(f"Updated {len(rows)} contenders with new period scores")
+    return [PeriodScore(**row) for row in rows]
 
 
 async def get_and_decrement_synthetic_request_count(connection: Connection, contender_id: str) -> int | None:
@@ -4,7 +4,7 @@ from validator.db.src.database import PSQLDB
 from fiber.networking.models import NodeWithFernet as Node
 from fiber.logging_utils import get_logger
 
-from asyncpg import Connection
+from asyncpg import Connection, Record
 from validator.utils.database import database_constants as dcst
 from fiber import utils as futils
 from cryptography.fernet import Fernet
@@ -114,23 +114,85 @@ async def get_last_updated_time_for_nodes(connection: Connection, netuid: int) -
     return await connection.fetchval(query, netuid)
 
 
-async def insert_symmetric_keys_for_nodes(connection: Connection, nodes: list[Node]) -> None:
+async def insert_symmetric_keys_for_nodes(connection: Connection, nodes: list[Node], ttl: datetime.timedelta) -> None:
+    """Stores the symmetric keys from handshakes, to be reused until they're `ttl` old"""
     logger.info(f"Inserting {len([node for node in nodes if node.fernet is not None])} nodes into {dcst.NODES_TABLE}...")
     await connection.executemany(
         f"""
         UPDATE {dcst.NODES_TABLE}
-        SET {dcst.SYMMETRIC_KEY} = $1, {dcst.SYMMETRIC_KEY_UUID} = $2
+        SET {dcst.SYMMETRIC_KEY} = $1,
+            {dcst.SYMMETRIC_KEY_UUID} = $2,
+            {dcst.SYMMETRIC_KEY_EXPIRES_AT} = (NOW() AT TIME ZONE 'UTC') + $5::interval
         WHERE {dcst.HOTKEY} = $3 and {dcst.NETUID} = $4
         """,
         [
-            (futils.fernet_to_symmetric_key(node.fernet), node.symmetric_key_uuid, node.hotkey, node.netuid)
+            (futils.fernet_to_symmetric_key(node.fernet), node.symmetric_key_uuid, node.hotkey, node.netuid, ttl)
             for node in nodes
             if node.fernet is not None
         ],
     )
 
 
+async def get_unexpired_symmetric_keys(connection: Connection, netuid: int) -> list[Record]:
+    """The symmetric keys we can still use, with the address of the node they were agreed with"""
+    return await connection.fetch(
+        f"""
+        SELECT
+            {dcst.HOTKEY},
+            {dcst.NETUID},
+            {dcst.IP},
+            {dcst.PORT},
+            {dcst.SYMMETRIC_KEY},
+            {dcst.SYMMETRIC_KEY_UUID},
+            {dcst.SYMMETRIC_KEY_EXPIRES_AT}
+        FROM {dcst.NODES_TABLE}
+        WHERE {dcst.NETUID} = $1
+        AND {dcst.SYMMETRIC_KEY} IS NOT NULL
+        AND {dcst.SYMMETRIC_KEY_UUID} IS NOT NULL
+        AND {dcst.SYMMETRIC_KEY_EXPIRES_AT} > NOW() AT TIME ZONE 'UTC'
+        """,
+        netuid,
+    )
+
+
+async def restore_symmetric_keys(connection: Connection, symmetric_keys: list[Record]) -> None:
+    """
+    Puts symmetric keys from get_unexpired_symmetric_keys back, after the nodes have been refreshed.
+    Only onto nodes with the same hotkey, ip & port - a node which has moved needs a new handshake
+    """
+    await connection.executemany(
+        f"""
+        UPDATE {dcst.NODES_TABLE}
+        SET {dcst.SYMMETRIC_KEY} = $1, {dcst.SYMMETRIC_KEY_UUID} = $2, {dcst.SYMMETRIC_KEY_EXPIRES_AT} = $3
+        WHERE {dcst.HOTKEY} = $4 AND {dcst.NETUID} = $5 AND {dcst.IP} = $6 AND {dcst.PORT} = $7
+        """,
+        [
+            (
+                key[dcst.SYMMETRIC_KEY],
+                key[dcst.SYMMETRIC_KEY_UUID],
+                key[dcst.SYMMETRIC_KEY_EXPIRES_AT],
+                key[dcst.HOTKEY],
+                key[dcst.NETUID],
+                key[dcst.IP],
+                key[dcst.PORT],
+            )
+            for key in symmetric_keys
+        ],
+    )
+
+
+def _fernet_or_none(symmetric_key: str | None) -> Fernet | None:
+    if symmetric_key is None:
+        return None
+    try:
+        return Fernet(symmetric_key)
+    except Exception as e:
+        logger.error(f"Error creating fernet: {e}")
+        return None
+
+
 async def get_nodes(psql_db: PSQLDB, netuid: int) -> list[Node]:
+    """The nodes, with their symmetric keys if they haven't expired"""
     query = f"""
         SELECT 
             {dcst.HOTKEY},
@@ -145,13 +207,21 @@ async def get_nodes(psql_db: PSQLDB, netuid: int) -> list[Node]:
             {dcst.IP},
             {dcst.IP_TYPE},
             {dcst.PORT},
-            {dcst.PROTOCOL}
+            {dcst.PROTOCOL},
+            CASE WHEN {dcst.SYMMETRIC_KEY_EXPIRES_AT} > NOW() AT TIME ZONE 'UTC' THEN {dcst.SYMMETRIC_KEY} END
+                AS {dcst.SYMMETRIC_KEY},
+            CASE WHEN {dcst.SYMMETRIC_KEY_EXPIRES_AT} > NOW() AT TIME ZONE 'UTC' THEN {dcst.SYMMETRIC_KEY_UUID} END
+                AS {dcst.SYMMETRIC_KEY_UUID}
         FROM {dcst.NODES_TABLE}
         WHERE {dcst.NETUID} = $1
     """
 
     nodes = await psql_db.fetchall(query, netuid)
 
+    for node in nodes:
+        node["fernet"] = _fernet_or_none(node.pop(dcst.SYMMETRIC_KEY))
+        if node["fernet"] is None:
+            node[dcst.SYMMETRIC_KEY_UUID] = None
     return [Node(**node) for node in nodes]
 
 
@@ -170,6 +240,7 @@ async def get_node_stakes(psql_db: PSQLDB, netuid: int) -> dict[str, float]:
 
 
 async def get_node(psql_db: PSQLDB, node_id: int, netuid: int) -> Node | None:
+    """The node, or None if it doesn't have a symmetric key we can use - including one which has expired"""
     query = f"""
         SELECT 
             {dcst.HOTKEY},
@@ -185,8 +256,10 @@ async def get_node(psql_db: PSQLDB, node_id: int, netuid: int) -> Node | None:
             {dcst.IP_TYPE},
             {dcst.PORT},
             {dcst.PROTOCOL},
-            {dcst.SYMMETRIC_KEY},
-            {dcst.SYMMETRIC_KEY_UUID}
+            CASE WHEN {dcst.SYMMETRIC_KEY_EXPIRES_AT} > NOW() AT TIME ZONE 'UTC' THEN {dcst.SYMMETRIC_KEY} END
+                AS {dcst.SYMMETRIC_KEY},
+            CASE WHEN {dcst.SYMMETRIC_KEY_EXPIRES_AT} > NOW() AT TIME ZONE 'UTC' THEN {dcst.SYMMETRIC_KEY_UUID} END
+                AS {dcst.SYMMETRIC_KEY_UUID}
         FROM {dcst.NODES_TABLE}
         WHERE {dcst.NODE_ID} = $1 AND {dcst.NETUID} = $2
     """
@@ -197,11 +270,9 @@ async def get_node(psql_db: PSQLDB, node_id: int, netuid: int) -> Node | None:
         logger.error(f"No node found for node id {node_id} and netuid {netuid}")
         logger.error(f"all nodes: {await psql_db.fetchall(f'SELECT * FROM {dcst.NODES_TABLE} WHERE {dcst.NETUID} = $1', netuid)}")
         raise ValueError(f"No node found for node id {node_id} and netuid {netuid}")
-    try:
-        node["fernet"] = Fernet(node[dcst.SYMMETRIC_KEY])
-    except Exception as e:
-        logger.error(f"Error creating fernet: {e}")
-        logger.error(f"node: {node}")
+    node["fernet"] = _fernet_or_none(node[dcst.SYMMETRIC_KEY])
+    if node["fernet"] is None:
+        logger.debug(f"No usable symmetric key for node {node_id} on netuid {netuid}")
         return None
     return Node(**node)
 
@@ -0,0 +1,94 @@
+"""
+Creating & dropping the time range partitions of the tables partitioned by created_at.
+
+Partitions are named `<table>_p<start>`, with start formatted by the table's name format
+(e.g. reward_data_p20241020, or tasks_p2024102013 for hourly partitions).
+
+Each table also has a DEFAULT partition, `<table>_default`, so inserts still work if nothing has created the
+partition they belong in. create_partition moves any rows for its range out of it.
+"""
+
+from datetime import datetime
+
+from asyncpg import Connection
+
+from validator.utils.database import database_constants as dcst
+
+PARTITION_PREFIX = "_p"
+DEFAULT_PARTITION_SUFFIX = "_default"
+
+
+def partition_name(table: str, start: datetime, name_format: str) -> str:
+    return f"{table}{PARTITION_PREFIX}{start.strftime(name_format)}"
+
+
+def partition_start(table: str, name: str, name_format: str) -> datetime | None:
+    """The start of a partition's range, from its name - None if it isn't one of ours"""
+    try:
+        return datetime.strptime(name.removeprefix(f"{table}{PARTITION_PREFIX}"), name_format)
+    except ValueError:
+        return None
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}{DEFAULT_PARTITION_SUFFIX}"
+
+
+async def create_partition(connection: Connection, table: str, name: str, start: datetime, end: datetime) -> int:
+    """
+    Creates the partition for [start, end). Rows for that range which went into the default partition, because the
+    partition didn't exist yet, are moved into it - postgres won't create it while they're there.
+    Returns how many rows were moved.
+    """
+    default_partition = default_partition_name(table)
+    # DDL can't take bind parameters; the name and bounds here are generated by us, never user input
+    bounds = f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    async with connection.transaction():
+        # Stops inserts into the default partition (but no others) until we're done, so no new rows land in the range
+        await connection.execute(f"LOCK TABLE {default_partition} IN EXCLUSIVE MODE")
+        misplaced = await connection.fetchval(
+            f"SELECT EXISTS (SELECT 1 FROM {default_partition} WHERE {dcst.COLUMN_CREATED_AT} >= $1 AND {dcst.COLUMN_CREATED_AT} < $2)",
+            start,
+            end,
+        )
+        if not misplaced:
+            await connection.execute(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}")
+            return 0
+
+        await connection.execute(f"CREATE TABLE {name} (LIKE {table})")
+        status = await connection.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {default_partition}
+                WHERE {dcst.COLUMN_CREATED_AT} >= $1 AND {dcst.COLUMN_CREATED_AT} < $2
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            start,
+            end,
+        )
+        await connection.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}")
+    return int(status.split()[-1])
+
+
+async def select_oldest_in_default_partition(connection: Connection, table: str) -> datetime | None:
+    return await connection.fetchval(f"SELECT MIN({dcst.COLUMN_CREATED_AT}) FROM {default_partition_name(table)}")
+
+
+async def select_partition_names(connection: Connection, table: str) -> list[str]:
+    rows = await connection.fetch(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = $1
+        """,
+        table,
+    )
+    return [row["relname"] for row in rows]
+
+
+async def drop_partition(connection: Connection, name: str) -> None:
+    await connection.execute(f"DROP TABLE IF EXISTS {name}")
@@ -2,13 +2,14 @@ from datetime import datetime
 from validator.models import RewardData
 from validator.utils.database import database_constants as dcst
 from typing import List
-from asyncpg import Connection
+from asyncpg import Connection, Record
 
 ##### Insert
 
 
-async def sql_insert_reward_data(connection: Connection, data: RewardData) -> None:
-    await connection.execute(
+async def sql_insert_reward_data(connection: Connection, data: RewardData) -> datetime:
+    """Returns the created_at it was stored with - the time reward data is windowed by, not data.created_at"""
+    return await connection.fetchval(
         f"""
         INSERT INTO {dcst.TABLE_REWARD_DATA} (
             {dcst.COLUMN_ID}, {dcst.COLUMN_TASK}, {dcst.COLUMN_NODE_ID}, 
@@ -16,7 +17,7 @@ async def sql_insert_reward_data(connection: Connection, data: RewardData) -> No
             {dcst.COLUMN_MINER_HOTKEY}, {dcst.COLUMN_SYNTHETIC_QUERY}, 
             {dcst.COLUMN_METRIC}, {dcst.COLUMN_RESPONSE_TIME}, {dcst.COLUMN_VOLUME}
         ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-        RETURNING {dcst.COLUMN_ID}
+        RETURNING {dcst.COLUMN_CREATED_AT}
         """,
         data.id,
         data.task,
@@ -54,6 +55,17 @@ async def insert_task(connection: Connection, task_name: str, checking_data: str
     )
 
 
+async def insert_tasks(connection: Connection, tasks: list[tuple[str, str, str]]) -> None:
+    """Inserts many (task_name, checking_data, hotkey) rows at once"""
+    await connection.executemany(
+        f"""
+        INSERT INTO {dcst.TABLE_TASKS} ({dcst.COLUMN_TASK_NAME}, {dcst.COLUMN_CHECKING_DATA}, {dcst.COLUMN_MINER_HOTKEY})
+        VALUES ($1, $2, $3)
+        """,
+        tasks,
+    )
+
+
 ##### Delete stuff
 
 
@@ -120,6 +132,25 @@ async def delete_task_data_older_than_date(connection: Connection, date: datetim
     )
 
 
+async def delete_batch_older_than(connection: Connection, table: str, date: datetime, batch_size: int) -> int:
+    """
+    Deletes at most batch_size rows created before `date`, by ctid so each batch is a short statement
+    with short lived locks. Returns how many rows were deleted - less than batch_size means we're done.
+    Not for partitioned tables: a ctid is only unique within one partition.
+    """
+    status = await connection.execute(
+        f"""
+        DELETE FROM {table}
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM {table} WHERE {dcst.COLUMN_CREATED_AT} < $1 LIMIT $2
+        ))
+        """,
+        date,
+        batch_size,
+    )
+    return int(status.split()[-1])
+
+
 async def delete_oldest_rows_from_tasks(connection: Connection, limit: int = 10) -> None:
     await connection.execute(
         f"""
@@ -132,16 +163,6 @@ async def delete_oldest_rows_from_tasks(connection: Connection, limit: int = 10)
     )
 
 
-async def delete_specific_task(connection: Connection, task_name: str, checking_data: str) -> None:
-    await connection.execute(
-        f"""
-        DELETE FROM {dcst.TABLE_TASKS} WHERE {dcst.COLUMN_TASK_NAME} = $1 AND {dcst.COLUMN_CHECKING_DATA} = $2
-        """,
-        task_name,
-        checking_data,
-    )
-
-
 async def delete_all_of_specific_task(connection: Connection, task_name: str) -> None:
     await connection.execute(
         f"""
@@ -182,25 +203,78 @@ async def select_count_rows_of_task_stored_for_scoring(connection: Connection, t
     return result or 0
 
 
-async def select_task_for_deletion(connection: Connection, task_name: str) -> tuple | None:
+async def claim_task_for_scoring(connection: Connection, task_name: str) -> tuple | None:
+    """
+    Takes one row off the tasks queue, from the hotkey we've scored least for this task.
+    Rows locked by another scorer are skipped, and the row is deleted by id in the same statement.
+    The counts are only bumped here - rebuild_task_scoring_counts brings them back in line with reward_data.
+    """
     return await connection.fetchrow(
         f"""
-        SELECT t.{dcst.COLUMN_CHECKING_DATA}, t.{dcst.COLUMN_MINER_HOTKEY}
-        FROM {dcst.TABLE_TASKS} t
-        LEFT JOIN (
-            SELECT {dcst.COLUMN_MINER_HOTKEY}, COUNT(*) as reward_count
-            FROM {dcst.TABLE_REWARD_DATA}
-            WHERE {dcst.COLUMN_TASK} = $1
-            GROUP BY {dcst.COLUMN_MINER_HOTKEY}
-        ) r ON t.{dcst.COLUMN_MINER_HOTKEY} = r.{dcst.COLUMN_MINER_HOTKEY}
-        WHERE t.{dcst.COLUMN_TASK_NAME} = $1
-        ORDER BY COALESCE(r.reward_count, 0) ASC
-        LIMIT 1
+        WITH claimed AS (
+            SELECT t.{dcst.COLUMN_ID}, t.{dcst.COLUMN_CREATED_AT}
+            FROM {dcst.TABLE_TASKS} t
+            LEFT JOIN {dcst.TABLE_TASK_SCORING_COUNTS} c
+                ON c.{dcst.COLUMN_TASK} = t.{dcst.COLUMN_TASK_NAME} AND c.{dcst.COLUMN_MINER_HOTKEY} = t.{dcst.COLUMN_MINER_HOTKEY}
+            WHERE t.{dcst.COLUMN_TASK_NAME} = $1
+            ORDER BY COALESCE(c.{dcst.COLUMN_SCORED_COUNT}, 0) ASC, t.{dcst.COLUMN_ID} ASC
+            LIMIT 1
+            FOR UPDATE OF t SKIP LOCKED
+        ),
+        deleted AS (
+            DELETE FROM {dcst.TABLE_TASKS} t
+            USING claimed
+            WHERE t.{dcst.COLUMN_ID} = claimed.{dcst.COLUMN_ID}
+            AND t.{dcst.COLUMN_CREATED_AT} = claimed.{dcst.COLUMN_CREATED_AT}
+            RETURNING t.{dcst.COLUMN_CHECKING_DATA}, t.{dcst.COLUMN_MINER_HOTKEY}
+        ),
+        counted AS (
+            INSERT INTO {dcst.TABLE_TASK_SCORING_COUNTS} ({dcst.COLUMN_TASK}, {dcst.COLUMN_MINER_HOTKEY}, {dcst.COLUMN_SCORED_COUNT})
+            SELECT $1, {dcst.COLUMN_MINER_HOTKEY}, 1 FROM deleted
+            ON CONFLICT ({dcst.COLUMN_TASK}, {dcst.COLUMN_MINER_HOTKEY})
+            DO UPDATE SET {dcst.COLUMN_SCORED_COUNT} = {dcst.TABLE_TASK_SCORING_COUNTS}.{dcst.COLUMN_SCORED_COUNT} + 1
+        )
+        SELECT {dcst.COLUMN_CHECKING_DATA}, {dcst.COLUMN_MINER_HOTKEY} FROM deleted
         """,
         task_name,
     )
 
 
+async def rebuild_task_scoring_counts(connection: Connection, since: datetime) -> int:
+    """
+    Resets task_scoring_counts to the reward data stored since `since`, so the counts cover the same window
+    as reward_data: samples which fell out of it, or whose scoring failed, stop counting and hotkeys with no
+    recent reward data are removed. Returns how many (task, hotkey) counts are left.
+    """
+    return await connection.fetchval(
+        f"""
+        WITH counts AS (
+            SELECT {dcst.COLUMN_TASK}, {dcst.COLUMN_MINER_HOTKEY}, COUNT(*) AS {dcst.COLUMN_SCORED_COUNT}
+            FROM {dcst.TABLE_REWARD_DATA}
+            WHERE {dcst.COLUMN_CREATED_AT} >= $1
+            GROUP BY {dcst.COLUMN_TASK}, {dcst.COLUMN_MINER_HOTKEY}
+        ),
+        removed AS (
+            DELETE FROM {dcst.TABLE_TASK_SCORING_COUNTS} c
+            WHERE NOT EXISTS (
+                SELECT 1 FROM counts
+                WHERE counts.{dcst.COLUMN_TASK} = c.{dcst.COLUMN_TASK}
+                AND counts.{dcst.COLUMN_MINER_HOTKEY} = c.{dcst.COLUMN_MINER_HOTKEY}
+            )
+        ),
+        updated AS (
+            INSERT INTO {dcst.TABLE_TASK_SCORING_COUNTS} ({dcst.COLUMN_TASK}, {dcst.COLUMN_MINER_HOTKEY}, {dcst.COLUMN_SCORED_COUNT})
+            SELECT {dcst.COLUMN_TASK}, {dcst.COLUMN_MINER_HOTKEY}, {dcst.COLUMN_SCORED_COUNT} FROM counts
+            ON CONFLICT ({dcst.COLUMN_TASK}, {dcst.COLUMN_MINER_HOTKEY})
+            DO UPDATE SET {dcst.COLUMN_SCORED_COUNT} = EXCLUDED.{dcst.COLUMN_SCORED_COUNT}
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM updated
+        """,
+        since,
+    )
+
+
 async def select_recent_reward_data_for_a_task(
     connection: Connection, task: str, date: datetime, node_hotkey: str | None = None
 ) -> list[tuple] | None:
@@ -238,6 +312,87 @@ async def select_recent_reward_data_for_a_task(
     )
 
 
+async def select_recent_reward_data_for_hotkeys(
+    connection: Connection, task: str, date: datetime, node_hotkeys: list[str], samples_per_hotkey: int
+) -> list[tuple]:
+    """
+    For every hotkey: all of its reward data for the task since `date`, then - if that's fewer than samples_per_hotkey -
+    its most recent reward data for any task, to make up the difference.
+    Rows are grouped by hotkey in the order of node_hotkeys, with the task's own rows first.
+    """
+    columns = [
+        dcst.COLUMN_ID,
+        dcst.COLUMN_TASK,
+        dcst.COLUMN_NODE_ID,
+        dcst.COLUMN_QUALITY_SCORE,
+        dcst.COLUMN_VALIDATOR_HOTKEY,
+        dcst.COLUMN_MINER_HOTKEY,
+        dcst.COLUMN_SYNTHETIC_QUERY,
+        dcst.COLUMN_METRIC,
+        dcst.COLUMN_RESPONSE_TIME,
+        dcst.COLUMN_VOLUME,
+        dcst.COLUMN_CREATED_AT,
+    ]
+    return await connection.fetch(
+        f"""
+        WITH task_samples AS (
+            SELECT {", ".join(columns)}
+            FROM {dcst.TABLE_REWARD_DATA}
+            WHERE {dcst.COLUMN_TASK} = $1
+            AND {dcst.COLUMN_CREATED_AT} > $2
+            AND {dcst.COLUMN_MINER_HOTKEY} = ANY($3::text[])
+        ),
+        short_hotkeys AS (
+            SELECT hotkeys.{dcst.COLUMN_MINER_HOTKEY}, COUNT(task_samples.{dcst.COLUMN_ID}) AS task_count
+            FROM unnest($3::text[]) AS hotkeys({dcst.COLUMN_MINER_HOTKEY})
+            LEFT JOIN task_samples ON task_samples.{dcst.COLUMN_MINER_HOTKEY} = hotkeys.{dcst.COLUMN_MINER_HOTKEY}
+            GROUP BY hotkeys.{dcst.COLUMN_MINER_HOTKEY}
+            HAVING COUNT(task_samples.{dcst.COLUMN_ID}) < $4
+        ),
+        fill_samples AS (
+            SELECT
+                {", ".join(f"r.{column}" for column in columns)},
+                short_hotkeys.task_count,
+                ROW_NUMBER() OVER (
+                    PARTITION BY r.{dcst.COLUMN_MINER_HOTKEY} ORDER BY r.{dcst.COLUMN_CREATED_AT} DESC
+                ) AS fill_rank
+            FROM {dcst.TABLE_REWARD_DATA} r
+            JOIN short_hotkeys ON short_hotkeys.{dcst.COLUMN_MINER_HOTKEY} = r.{dcst.COLUMN_MINER_HOTKEY}
+            WHERE r.{dcst.COLUMN_CREATED_AT} > $2
+        )
+        SELECT * FROM (
+            SELECT {", ".join(columns)}, 0 AS is_fill FROM task_samples
+            UNION ALL
+            SELECT {", ".join(columns)}, 1 AS is_fill FROM fill_samples WHERE fill_rank <= $4 - task_count
+        ) samples
+        ORDER BY array_position($3::text[], {dcst.COLUMN_MINER_HOTKEY}), is_fill, {dcst.COLUMN_CREATED_AT} DESC
+        """,
+        task,
+        date,
+        node_hotkeys,
+        samples_per_hotkey,
+    )
+
+
+async def select_reward_data_since(connection: Connection, date: datetime) -> list[Record]:
+    """The fields the weights need from every reward datum since `date`, oldest first"""
+    return await connection.fetch(
+        f"""
+        SELECT
+            {dcst.COLUMN_ID},
+            {dcst.COLUMN_TASK},
+            {dcst.COLUMN_MINER_HOTKEY},
+            {dcst.COLUMN_QUALITY_SCORE},
+            {dcst.COLUMN_METRIC},
+            {dcst.COLUMN_CREATED_AT}
+        FROM {dcst.TABLE_REWARD_DATA}
+        WHERE {dcst.COLUMN_CREATED_AT} > $1
+        ORDER BY {dcst.COLUMN_CREATED_AT}
+        """,
+        date,
+    )
+
+
 async def select_recent_reward_data(
     connection: Connection, date: datetime, node_hotkey: str | None = None, limit: int = 50
 ) -> list[tuple] | None:
@@ -0,0 +1,90 @@
+"""
+Admission control for organic queries.
+
+Before queueing a query we estimate how long it would wait for a query node: the organic jobs already
+queued which can't go straight into a free slot, divided by how many jobs per second the query nodes
+are getting through. If that's more than max_queue_wait we reject with a 429 and a Retry-After,
+rather than queueing work which would time out waiting for an acknowledgement anyway.
+
+The load snapshot is cached for CACHE_SECONDS so this is at most a couple of redis calls per interval,
+not per request. If no query node is reporting its load we let everything through, as before.
+"""
+
+import math
+import time
+
+from fastapi import HTTPException
+from redis.asyncio import Redis
+from fiber.logging_utils import get_logger
+
+from core import metrics
+from validator.utils.query import load_reporting
+from validator.utils.redis import query_queue
+
+logger = get_logger(__name__)
+
+CACHE_SECONDS = 0.25
+# The entry node gives up waiting for an acknowledgement after 1s
+DEFAULT_MAX_QUEUE_WAIT = 1.0
+MAX_RETRY_AFTER = 30
+
+SHED_QUERIES_TOTAL = metrics.Counter(
+    "entry_node_shed_queries_total", "Organic queries rejected because the query nodes were saturated", labelnames=("task",)
+)
+
+
+class AdmissionController:
+    def __init__(self, max_queue_wait: float = DEFAULT_MAX_QUEUE_WAIT, cache_seconds: float = CACHE_SECONDS):
+        self.max_queue_wait = max_queue_wait
+        self.cache_seconds = cache_seconds
+        self._load: load_reporting.QueryNodeLoad | None = None
+        self._organic_depth = 0
+        # Count the queries we've let in since the snapshot too, so a burst can't all get in on one stale snapshot
+        self._admitted_since_refresh = 0
+        self._last_refresh = 0.0
+
+    async def _refresh(self, redis_db: Redis) -> None:
+        now = time.time()
+        if now - self._last_refresh < self.cache_seconds:
+            return
+        self._last_refresh = now
+        self._admitted_since_refresh = 0
+        try:
+            self._load = await load_reporting.get_query_node_load(redis_db)
+            self._organic_depth = await query_queue.get_query_queue(redis_db).organic_depth()
+        except Exception as e:
+            logger.error(f"Failed to refresh query node load, admitting everything for now: {e}")
+            self._load = None
+
+    def estimated_queue_wait(self) -> float | None:
+        """Seconds a new organic query would wait for a query node, or None if we don't know"""
+        if self._load is None or self._load.query_nodes == 0:
+            return None
+        jobs_ahead = self._organic_depth + self._admitted_since_refresh - self._load.free_slots
+        if jobs_ahead < 0:
+            return 0.0
+        if self._load.throughput == 0:
+            return math.inf
+        return (jobs_ahead + 1) / self._load.throughput
+
+    async def admit(self, redis_db: Redis, task: str) -> None:
+        """Raises a 429 with a Retry-After if the query nodes are saturated"""
+        await self._refresh(redis_db)
+        estimated_wait = self.estimated_queue_wait()
+        if estimated_wait is None or estimated_wait <= self.max_queue_wait:
+            self._admitted_since_refresh += 1
+            return
+
+        SHED_QUERIES_TOTAL.inc(task)
+        retry_after = min(max(math.ceil(estimated_wait), 1), MAX_RETRY_AFTER)
+        assert self._load is not None
+        logger.warning(
+            f"Shedding query for task {task}: estimated queue wait {estimated_wait:.2f}s; organic depth: {self._organic_depth}; "
+            f"in flight: {self._load.in_flight}/{self._load.slots}; throughput: {self._load.throughput:.1f}/s "
+            f"({self._load.throughput_by_task.get(task, 0.0):.1f}/s for {task})"
+        )
+        raise HTTPException(
+            status_code=429,
+            detail="Validator is at capacity, please try again shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
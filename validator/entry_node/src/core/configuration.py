@@ -7,6 +7,7 @@ from pydantic import BaseModel
 from redis.asyncio import Redis
 from aiocache import cached
 from validator.db.src.database import PSQLDB
+from validator.entry_node.src.core.admission import AdmissionController
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -21,6 +22,7 @@ class Config:
     psql_db: PSQLDB
     prod: bool
     httpx_client: httpx.AsyncClient
+    admission_controller: AdmissionController
 
 
 @cached(ttl=60 * 5)
@@ -37,10 +39,12 @@ async def factory_config() -> Config:
     redis_db = Redis(host=redis_host)
 
     prod = bool(os.getenv("ENV", "prod").lower() == "prod")
+    max_queue_wait = float(os.getenv("ENTRY_NODE_MAX_QUEUE_WAIT_SECONDS", 1.0))
 
     return Config(
         psql_db=psql_db,
         redis_db=redis_db,
         prod=prod,
         httpx_client=httpx.AsyncClient(),
+        admission_controller=AdmissionController(max_queue_wait=max_queue_wait),
     )
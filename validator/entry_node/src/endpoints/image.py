@@ -1,4 +1,5 @@
 import json
+import time
 from typing import Any
 import uuid
 from fastapi import Depends, HTTPException
@@ -8,9 +9,10 @@ from fastapi.routing import APIRouter
 from core.models import payload_models
 from core.task_config import get_enabled_task_config
 from validator.entry_node.src.core.configuration import Config
+from validator.entry_node.src.core.admission import AdmissionController
 from validator.entry_node.src.core.dependencies import get_config
 from validator.entry_node.src.core.middleware import verify_api_key_rate_limit
-from validator.utils.redis import redis_constants as rcst
+from validator.utils.redis import redis_constants as rcst, query_queue
 from validator.utils.generic import generic_constants as gcst
 from validator.entry_node.src.models import request_models
 import asyncio
@@ -23,7 +25,9 @@ logger = get_logger(__name__)
 
 
 def _construct_organic_message(payload: dict, job_id: str, task: str) -> str:
-    return json.dumps({"query_type": gcst.ORGANIC, "query_payload": payload, "task": task, "job_id": job_id})
+    return json.dumps(
+        {"query_type": gcst.ORGANIC, "query_payload": payload, "task": task, "job_id": job_id, "enqueued_at": time.time()}
+    )
 
 
 async def _wait_for_acknowledgement(pubsub: PubSub, job_id: str) -> bool:
@@ -58,14 +62,15 @@ async def _collect_single_result(pubsub: PubSub, job_id: str) -> GenericResponse
 
 
 async def make_non_stream_organic_query(
-    redis_db: Redis, payload: dict[str, Any], task: str, timeout: float
+    redis_db: Redis, payload: dict[str, Any], task: str, timeout: float, admission_controller: AdmissionController
 ) -> GenericResponse | None:
+    await admission_controller.admit(redis_db, task)
     job_id = uuid.uuid4().hex
     organic_message = _construct_organic_message(payload=payload, job_id=job_id, task=task)  # NOTE: tis grim
 
     pubsub = redis_db.pubsub()
     await pubsub.subscribe(f"{gcst.ACKNLOWEDGED}:{job_id}")
-    await redis_db.lpush(rcst.QUERY_QUEUE_KEY, organic_message)  # type: ignore
+    await query_queue.get_query_queue(redis_db).push_organic(organic_message)
 
     try:
         await asyncio.wait_for(_wait_for_acknowledgement(pubsub, job_id), timeout=1)
@@ -93,7 +98,11 @@ async def process_image_request(
         raise HTTPException(status_code=400, detail=f"Invalid model {task}")
 
     result = await make_non_stream_organic_query(
-        redis_db=config.redis_db, payload=payload.model_dump(), task=task, timeout=task_config.timeout
+        redis_db=config.redis_db,
+        payload=payload.model_dump(),
+        task=task,
+        timeout=task_config.timeout,
+        admission_controller=config.admission_controller,
     )
     if result is None or result.content is None:
         logger.error(f"No content received an image request for some reason. Task: {task}")
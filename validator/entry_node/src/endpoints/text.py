@@ -1,4 +1,5 @@
 import json
+import time
 from typing import Any, AsyncGenerator
 import uuid
 from fastapi import Depends, HTTPException
@@ -7,20 +8,28 @@ from redis.asyncio import Redis
 from fiber.logging_utils import get_logger
 from fastapi.routing import APIRouter
 from validator.entry_node.src.core.configuration import Config
+from validator.entry_node.src.core.admission import AdmissionController
 from validator.entry_node.src.core.dependencies import get_config
 from validator.entry_node.src.core.middleware import verify_api_key_rate_limit
-from validator.utils.redis import redis_constants as rcst
+from validator.utils.redis import redis_constants as rcst, query_queue
 from validator.utils.generic import generic_constants as gcst
 from validator.entry_node.src.models import request_models
 import asyncio
 from validator.utils.query.query_utils import load_sse_jsons
+from core import metrics
 from redis.asyncio.client import PubSub
 
 logger = get_logger(__name__)
 
+TIME_TO_FIRST_CHUNK_SECONDS = metrics.Histogram(
+    "entry_node_time_to_first_chunk_seconds", "Time from an organic query arriving to its first chunk", labelnames=("task",)
+)
+
 
 def _construct_organic_message(payload: dict, job_id: str, task: str) -> str:
-    return json.dumps({"query_type": gcst.ORGANIC, "query_payload": payload, "task": task, "job_id": job_id})
+    return json.dumps(
+        {"query_type": gcst.ORGANIC, "query_payload": payload, "task": task, "job_id": job_id, "enqueued_at": time.time()}
+    )
 
 
 async def _wait_for_acknowledgement(pubsub: PubSub, job_id: str) -> bool:
@@ -67,13 +76,16 @@ async def make_stream_organic_query(
     redis_db: Redis,
     payload: dict[str, Any],
     task: str,
+    admission_controller: AdmissionController,
 ) -> AsyncGenerator[str, str]:
+    await admission_controller.admit(redis_db, task)
+    start_time = time.time()
     job_id = uuid.uuid4().hex
     organic_message = _construct_organic_message(payload=payload, job_id=job_id, task=task)
 
     pubsub = redis_db.pubsub()
     await pubsub.subscribe(f"{gcst.ACKNLOWEDGED}:{job_id}")
-    await redis_db.lpush(rcst.QUERY_QUEUE_KEY, organic_message)  # type: ignore
+    await query_queue.get_query_queue(redis_db).push_organic(organic_message)
 
     first_chunk = None
     try:
@@ -96,6 +108,7 @@ async def make_stream_organic_query(
 
     if first_chunk is None:
         raise HTTPException(status_code=500, detail="Unable to process request")
+    TIME_TO_FIRST_CHUNK_SECONDS.observe(time.time() - start_time, task)
     return _stream_results(pubsub, job_id, first_chunk)
 
 
@@ -122,7 +135,10 @@ async def chat(
 
     try:
         text_generator = await make_stream_organic_query(
-            redis_db=config.redis_db, payload=payload.model_dump(), task=payload.model
+            redis_db=config.redis_db,
+            payload=payload.model_dump(),
+            task=payload.model,
+            admission_controller=config.admission_controller,
         )
         logger.info("Here returning a response!")
         if chat_request.stream:
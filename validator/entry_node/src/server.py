@@ -10,6 +10,7 @@ from validator.entry_node.src.core import configuration
 from fiber.logging_utils import get_logger
 from fiber.miner.middleware import configure_extra_logging_middleware  # noqa
 from scalar_fastapi import get_scalar_api_reference
+from core import metrics
 logger = get_logger(__name__)
 
 
@@ -31,6 +32,7 @@ def factory_app(debug: bool = False) -> FastAPI:
     )
 
     app.add_api_route("/scalar", scalar_html, methods=["GET"])
+    metrics.add_metrics_route(app)
 
     return app
 
@@ -0,0 +1,109 @@
+"""
+Write-behind bookkeeping for the query node.
+
+Finished queries only record what happened in memory; a background loop coalesces the
+per contender counter deltas and flushes them to postgres in one batched statement every FLUSH_INTERVAL
+seconds (and once more on shutdown). Scoring samples go through the ScoringSampler, which only
+touches postgres when it actually stores some.
+"""
+
+import asyncio
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from fiber.logging_utils import get_logger
+
+from core.models import utility_models
+from validator.db.src.database import PSQLDB
+from validator.db.src.sql.contenders import update_contenders_counters
+from validator.query_node.src.scoring_sampler import ScoringSampler
+
+logger = get_logger(__name__)
+
+FLUSH_INTERVAL = 0.25
+
+
+@dataclass
+class ContenderCounterDeltas:
+    consumed_capacity: float = 0.0
+    total_requests_made: int = 0
+    requests_429: int = 0
+    requests_500: int = 0
+
+
+class Bookkeeper:
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._counter_deltas: dict[str, ContenderCounterDeltas] = {}
+        self.scoring_sampler = ScoringSampler()
+        self._flush_lock = asyncio.Lock()
+
+    def _deltas_for(self, contender_id: str) -> ContenderCounterDeltas:
+        deltas = self._counter_deltas.get(contender_id)
+        if deltas is None:
+            deltas = self._counter_deltas[contender_id] = ContenderCounterDeltas()
+        return deltas
+
+    def record_success(self, contender_id: str, capacity_consumed: float) -> None:
+        deltas = self._deltas_for(contender_id)
+        deltas.consumed_capacity += capacity_consumed
+        deltas.total_requests_made += 1
+
+    def record_429(self, contender_id: str) -> None:
+        deltas = self._deltas_for(contender_id)
+        deltas.requests_429 += 1
+        deltas.total_requests_made += 1
+
+    def record_500(self, contender_id: str) -> None:
+        deltas = self._deltas_for(contender_id)
+        deltas.requests_500 += 1
+        deltas.total_requests_made += 1
+
+    def add_scoring_sample(self, result: utility_models.QueryResult, synthetic_query: bool, payload: dict) -> None:
+        self.scoring_sampler.offer(result, synthetic_query=synthetic_query, payload=payload)
+
+    def _requeue_counter_deltas(self, counter_deltas: dict[str, ContenderCounterDeltas]) -> None:
+        for contender_id, deltas in counter_deltas.items():
+            current = self._deltas_for(contender_id)
+            current.consumed_capacity += deltas.consumed_capacity
+            current.total_requests_made += deltas.total_requests_made
+            current.requests_429 += deltas.requests_429
+            current.requests_500 += deltas.requests_500
+
+    async def flush(self, psql_db: PSQLDB, redis_db: Redis, final: bool = False) -> None:
+        async with self._flush_lock:
+            counter_deltas, self._counter_deltas = self._counter_deltas, {}
+
+            if counter_deltas:
+                try:
+                    async with await psql_db.connection() as connection:
+                        await update_contenders_counters(
+                            connection,
+                            [
+                                (
+                                    contender_id,
+                                    deltas.consumed_capacity,
+                                    deltas.total_requests_made,
+                                    deltas.requests_429,
+                                    deltas.requests_500,
+                                )
+                                for contender_id, deltas in counter_deltas.items()
+                            ],
+                        )
+                except Exception as e:
+                    logger.error(f"Failed to flush counters for {len(counter_deltas)} contenders, will retry: {e}")
+                    self._requeue_counter_deltas(counter_deltas)
+
+            # Losing a few scoring samples is fine, so we don't retry these
+            try:
+                stored = await self.scoring_sampler.flush(psql_db, redis_db, force=final)
+                if stored:
+                    logger.debug(f"Stored {stored} results for scoring")
+            except Exception as e:
+                logger.error(f"Failed to store results for scoring: {e}")
+
+    async def run(self, psql_db: PSQLDB, redis_db: Redis) -> None:
+        """Flushes forever - callers should `flush` once more on shutdown, with final=True"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(psql_db, redis_db)
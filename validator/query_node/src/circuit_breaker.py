@@ -0,0 +1,176 @@
+"""
+Per contender circuit breakers for the query node, so we stop sending organic queries to miners
+which are known to be down.
+
+- closed: queries go through as normal. FAILURE_THRESHOLD failures (connection errors, timeouts, 5xx)
+  within FAILURE_WINDOW seconds, with no success in between, opens the breaker.
+- open: the contender is skipped during selection until the breaker has been open for open_seconds.
+- half open: one probe query is let through. Success closes the breaker, failure opens it again
+  for twice as long (up to MAX_OPEN_SECONDS). A probe which neither succeeds nor fails (e.g. a 429,
+  or we never got to send it) is released, so the next query can probe.
+
+Opened breakers are shared with the other query node replicas through a redis sorted set
+(contender id -> time it stays open until), which every replica reads at most once every SYNC_INTERVAL seconds.
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+
+from redis.asyncio import Redis
+from fiber.logging_utils import get_logger
+
+from validator.models import Contender
+from validator.utils.redis import redis_constants as rcst
+
+logger = get_logger(__name__)
+
+FAILURE_THRESHOLD = 5
+FAILURE_WINDOW = 30.0
+OPEN_SECONDS = 15.0
+MAX_OPEN_SECONDS = 300.0
+# If a probe never reports back (e.g. the query node task was cancelled), let another one through after this
+PROBE_TIMEOUT = 60.0
+SYNC_INTERVAL = 1.0
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class ContenderBreaker:
+    state: BreakerState = BreakerState.CLOSED
+    failure_times: deque[float] = field(default_factory=deque)
+    open_until: float = 0.0
+    open_seconds: float = OPEN_SECONDS
+    probe_started_at: float | None = None
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        failure_window: float = FAILURE_WINDOW,
+        open_seconds: float = OPEN_SECONDS,
+        max_open_seconds: float = MAX_OPEN_SECONDS,
+        sync_interval: float = SYNC_INTERVAL,
+    ):
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.sync_interval = sync_interval
+        self._breakers: dict[str, ContenderBreaker] = {}
+        self._last_sync = 0.0
+
+    def _breaker_for(self, contender_id: str) -> ContenderBreaker:
+        breaker = self._breakers.get(contender_id)
+        if breaker is None:
+            breaker = self._breakers[contender_id] = ContenderBreaker(open_seconds=self.open_seconds)
+        return breaker
+
+    def _refresh_state(self, breaker: ContenderBreaker, now: float) -> None:
+        if breaker.state == BreakerState.OPEN and now >= breaker.open_until:
+            breaker.state = BreakerState.HALF_OPEN
+            breaker.probe_started_at = None
+
+    async def _sync(self, redis_db: Redis) -> None:
+        now = time.time()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        try:
+            async with redis_db.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(rcst.CIRCUIT_BREAKER_OPEN_KEY, "-inf", now)
+                pipe.zrangebyscore(rcst.CIRCUIT_BREAKER_OPEN_KEY, now, "+inf", withscores=True)
+                _, open_contenders = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to sync circuit breakers from redis: {e}")
+            return
+
+        for raw_contender_id, open_until in open_contenders:
+            contender_id = raw_contender_id.decode() if isinstance(raw_contender_id, bytes) else raw_contender_id
+            breaker = self._breaker_for(contender_id)
+            if open_until > breaker.open_until:
+                breaker.state = BreakerState.OPEN
+                breaker.open_until = open_until
+
+    def is_available(self, contender_id: str) -> bool:
+        """Whether we'd currently let a query through to this contender - doesn't claim a half open probe"""
+        breaker = self._breakers.get(contender_id)
+        if breaker is None:
+            return True
+        now = time.time()
+        self._refresh_state(breaker, now)
+        if breaker.state == BreakerState.OPEN:
+            return False
+        if breaker.state == BreakerState.HALF_OPEN and breaker.probe_started_at is not None:
+            return now - breaker.probe_started_at >= PROBE_TIMEOUT
+        return True
+
+    async def filter_available(self, redis_db: Redis, contenders: list[Contender]) -> list[Contender]:
+        await self._sync(redis_db)
+        available = [contender for contender in contenders if self.is_available(contender.id)]
+        if len(available) < len(contenders):
+            logger.debug(f"Skipping {len(contenders) - len(available)} contenders with open circuit breakers")
+        return available
+
+    def allow_request(self, contender_id: str) -> bool:
+        """Call right before querying a contender; claims the probe if the breaker is half open"""
+        if not self.is_available(contender_id):
+            return False
+        breaker = self._breakers.get(contender_id)
+        if breaker is not None and breaker.state == BreakerState.HALF_OPEN:
+            breaker.probe_started_at = time.time()
+        return True
+
+    def release_probe(self, contender_id: str) -> None:
+        """Call if a query claimed by allow_request ended without telling us whether the contender is up"""
+        breaker = self._breakers.get(contender_id)
+        if breaker is not None and breaker.state == BreakerState.HALF_OPEN:
+            breaker.probe_started_at = None
+
+    async def record_success(self, redis_db: Redis, contender_id: str) -> None:
+        breaker = self._breakers.get(contender_id)
+        if breaker is None:
+            return
+        was_tripped = breaker.state != BreakerState.CLOSED
+        del self._breakers[contender_id]
+        if was_tripped:
+            logger.info(f"Closing circuit breaker for contender {contender_id}")
+            try:
+                await redis_db.zrem(rcst.CIRCUIT_BREAKER_OPEN_KEY, contender_id)
+            except Exception as e:
+                logger.error(f"Failed to clear circuit breaker for contender {contender_id} in redis: {e}")
+
+    async def record_failure(self, redis_db: Redis, contender_id: str) -> None:
+        now = time.time()
+        breaker = self._breaker_for(contender_id)
+        self._refresh_state(breaker, now)
+
+        if breaker.state == BreakerState.HALF_OPEN:
+            breaker.open_seconds = min(breaker.open_seconds * 2, self.max_open_seconds)
+        elif breaker.state == BreakerState.CLOSED:
+            breaker.failure_times.append(now)
+            while breaker.failure_times and now - breaker.failure_times[0] > self.failure_window:
+                breaker.failure_times.popleft()
+            if len(breaker.failure_times) < self.failure_threshold:
+                return
+        else:
+            # Already open, e.g. a query which was in flight when the breaker opened
+            return
+
+        breaker.state = BreakerState.OPEN
+        breaker.open_until = now + breaker.open_seconds
+        breaker.probe_started_at = None
+        breaker.failure_times.clear()
+        logger.warning(f"Opening circuit breaker for contender {contender_id} for {breaker.open_seconds:.0f}s")
+        try:
+            await redis_db.zadd(rcst.CIRCUIT_BREAKER_OPEN_KEY, {contender_id: breaker.open_until}, gt=True)
+        except Exception as e:
+            logger.error(f"Failed to share circuit breaker for contender {contender_id} in redis: {e}")
@@ -0,0 +1,88 @@
+"""
+Counters for the query node's queue consumer, so we can size query nodes from data:
+- how long jobs sat in the queue before we picked them up
+- how many of our concurrency slots were busy, on average
+"""
+
+import time
+from dataclasses import dataclass, field
+
+from fiber.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ConsumerStats:
+    max_concurrent_tasks: int
+    in_flight: int = 0
+    jobs_started: int = 0
+    jobs_finished: int = 0
+    # Not reset with the rest, so the supervisor can see a worker is making progress
+    jobs_finished_total: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    queue_wait_samples: int = 0
+    busy_slot_seconds: float = 0.0
+    window_start: float = field(default_factory=time.time)
+    _last_change: float = field(default_factory=time.time)
+    # Drained by the load reporter, not by log_and_reset
+    _completions_by_task: dict[str, int] = field(default_factory=dict)
+
+    def _accumulate_busy_time(self) -> None:
+        now = time.time()
+        self.busy_slot_seconds += self.in_flight * (now - self._last_change)
+        self._last_change = now
+
+    def job_started(self, enqueued_at: float | None) -> None:
+        self._accumulate_busy_time()
+        self.in_flight += 1
+        self.jobs_started += 1
+        if enqueued_at is not None:
+            queue_wait = max(time.time() - enqueued_at, 0)
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.queue_wait_samples += 1
+
+    def job_finished(self) -> None:
+        self._accumulate_busy_time()
+        self.in_flight -= 1
+        self.jobs_finished += 1
+        self.jobs_finished_total += 1
+
+    def record_completion(self, task: str) -> None:
+        self._completions_by_task[task] = self._completions_by_task.get(task, 0) + 1
+
+    def take_completions(self) -> dict[str, int]:
+        completions, self._completions_by_task = self._completions_by_task, {}
+        return completions
+
+    @property
+    def slot_utilisation(self) -> float:
+        self._accumulate_busy_time()
+        window = time.time() - self.window_start
+        if window <= 0 or self.max_concurrent_tasks == 0:
+            return 0.0
+        return self.busy_slot_seconds / (window * self.max_concurrent_tasks)
+
+    @property
+    def average_queue_wait(self) -> float:
+        if self.queue_wait_samples == 0:
+            return 0.0
+        return self.queue_wait_total / self.queue_wait_samples
+
+    def log_and_reset(self) -> None:
+        logger.info(
+            f"Queue consumer stats: in flight: {self.in_flight}/{self.max_concurrent_tasks}; "
+            f"slot utilisation: {self.slot_utilisation:.1%}; started: {self.jobs_started}; finished: {self.jobs_finished}; "
+            f"queue wait avg: {self.average_queue_wait:.3f}s, max: {self.queue_wait_max:.3f}s"
+        )
+        now = time.time()
+        self.jobs_started = 0
+        self.jobs_finished = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.queue_wait_samples = 0
+        self.busy_slot_seconds = 0.0
+        self.window_start = now
+        self._last_change = now
@@ -5,20 +5,31 @@ import os
 load_dotenv(os.getenv("ENV_FILE", ".vali.env"))
 
 import asyncio
+import multiprocessing
+import signal
+import time
+import httpx
 from redis.asyncio import Redis
 
 from fiber.logging_utils import get_logger
 import json
 from validator.query_node.src.query_config import Config
-from validator.utils.redis import redis_constants as rcst, redis_dataclasses as rdc
+from validator.utils.redis import redis_dataclasses as rdc, query_queue
+from validator.utils.query import load_reporting
 from validator.query_node.src.process_queries import process_task
+from validator.query_node.src.consumer_stats import ConsumerStats
+from validator.query_node.src import supervisor, query_metrics
+from core import metrics
 from validator.db.src.sql.nodes import get_vali_ss58_address
 from validator.db.src.database import PSQLDB
 from fiber.chain import chain_utils
 
 logger = get_logger(__name__)
 
-MAX_CONCURRENT_TASKS = 100
+STATS_LOG_INTERVAL = 60
+LOAD_REPORT_INTERVAL = 1
+DEFAULT_METRICS_PORT = 9101
+SHUTDOWN_DRAIN_TIMEOUT = 30
 
 
 async def load_config() -> Config:
@@ -39,6 +50,9 @@ async def load_config() -> Config:
         redis_host = os.getenv("REDIS_HOST", "redis")
 
     replace_with_docker_localhost = bool(os.getenv("REPLACE_WITH_DOCKER_LOCALHOST", "false").lower() == "true")
+    max_concurrent_tasks = int(os.getenv("QUERY_NODE_MAX_CONCURRENT_TASKS", 100))
+    stream_publish_window = float(os.getenv("STREAM_PUBLISH_WINDOW_MS", 15)) / 1000
+    stream_publish_max_bytes = int(os.getenv("STREAM_PUBLISH_MAX_BYTES", 4096))
 
     psql_db = PSQLDB()
     await psql_db.connect()
@@ -49,9 +63,17 @@ async def load_config() -> Config:
         await asyncio.sleep(0.1)
 
     keypair = chain_utils.load_hotkey_keypair(wallet_name=wallet_name, hotkey_name=hotkey_name)
+    queue_redis_db = Redis(host=redis_host)
 
     return Config(
         redis_db=Redis(host=redis_host),
+        httpx_client=httpx.AsyncClient(),
+        # Separate client so the blocking pop never holds up publishes
+        queue_redis_db=queue_redis_db,
+        query_queue=query_queue.get_query_queue(queue_redis_db),
+        max_concurrent_tasks=max_concurrent_tasks,
+        stream_publish_window=stream_publish_window,
+        stream_publish_max_bytes=stream_publish_max_bytes,
         psql_db=psql_db,
         netuid=netuid,
         ss58_address=ss58_address,
@@ -61,38 +83,146 @@ async def load_config() -> Config:
     )
 
 
-async def listen_for_tasks(config: Config):
-    tasks: set[asyncio.Task] = set()
-
-    logger.info("Listening for tasks.")
+async def _log_stats_periodically(config: Config, stats: ConsumerStats) -> None:
     while True:
-        done = {t for t in tasks if t.done()}
-        tasks.difference_update(done)
-        for t in done:
-            await t
+        await asyncio.sleep(STATS_LOG_INTERVAL)
+        stats.log_and_reset()
+        try:
+            logger.info(f"Query queue lag stats: {await config.query_queue.get_lag_stats()}")
+        except Exception as e:
+            logger.warning(f"Failed to get query queue lag stats: {e}")
+
+
+async def _report_load(config: Config, stats: ConsumerStats) -> None:
+    """So the entry node can turn queries away when we're saturated, see entry_node/src/core/admission.py"""
+    name = load_reporting.reporter_name()
+    try:
+        while True:
+            completions = stats.take_completions()
+            query_metrics.IN_FLIGHT.set(stats.in_flight)
+            try:
+                await load_reporting.publish_query_node_load(
+                    config.redis_db, name, stats.in_flight, stats.max_concurrent_tasks, completions
+                )
+            except Exception as e:
+                logger.warning(f"Failed to report query node load: {e}")
+            await asyncio.sleep(LOAD_REPORT_INTERVAL)
+    finally:
+        await load_reporting.remove_query_node_load(config.redis_db, name)
 
-        while len(tasks) < MAX_CONCURRENT_TASKS:
-            message_json = await config.redis_db.blpop(rcst.QUERY_QUEUE_KEY, timeout=1)  # type: ignore
 
-            if not message_json:
-                break
+async def _report_health(health_queue: multiprocessing.Queue, worker_id: int, stats: ConsumerStats) -> None:
+    while True:
+        health_queue.put(
+            supervisor.WorkerHealth(
+                worker_id=worker_id,
+                pid=os.getpid(),
+                in_flight=stats.in_flight,
+                max_concurrent_tasks=stats.max_concurrent_tasks,
+                jobs_finished=stats.jobs_finished_total,
+                reported_at=time.time(),
+            )
+        )
+        await asyncio.sleep(supervisor.HEALTH_REPORT_INTERVAL)
+
+
+async def _process_and_ack(
+    config: Config, queued_query: query_queue.QueuedQuery, message: rdc.QueryQueueMessage, stats: ConsumerStats
+) -> None:
+    try:
+        await process_task(config, message)
+    finally:
+        stats.record_completion(message.task)
+        await config.query_queue.ack(queued_query)
+
+
+async def listen_for_tasks(config: Config, stats: ConsumerStats | None = None):
+    tasks: set[asyncio.Task] = set()
+    slots = asyncio.Semaphore(config.max_concurrent_tasks)
+    if stats is None:
+        stats = ConsumerStats(max_concurrent_tasks=config.max_concurrent_tasks)
+
+    def _on_task_done(task: asyncio.Task) -> None:
+        tasks.discard(task)
+        slots.release()
+        stats.job_finished()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Task failed with an unhandled exception: {task.exception()}")
+
+    stats_task = asyncio.create_task(_log_stats_periodically(config, stats))
+    logger.info(f"Listening for tasks, with up to {config.max_concurrent_tasks} at once.")
+    try:
+        while True:
+            # Only pull a job off the queue once we have a slot free to process it
+            await slots.acquire()
+            try:
+                queued_query = await config.query_queue.pop(timeout=5)
+            except BaseException:
+                slots.release()
+                raise
+
+            if queued_query is None:
+                slots.release()
+                continue
             try:
-                task = asyncio.create_task(process_task(config, rdc.QueryQueueMessage(**json.loads(message_json[1]))))
-                tasks.add(task)
-            except TypeError:
-                logger.error(f"Failed to process message: {message_json}")
+                message = rdc.QueryQueueMessage(**json.loads(queued_query.message))
+            except (TypeError, json.JSONDecodeError):
+                logger.error(f"Failed to process message: {queued_query.message!r}")
+                await config.query_queue.ack(queued_query)
+                slots.release()
+                continue
+
+            stats.job_started(message.enqueued_at)
+            if message.enqueued_at is not None:
+                query_metrics.QUEUE_WAIT_SECONDS.observe(max(time.time() - message.enqueued_at, 0), message.query_type)
+            task = asyncio.create_task(_process_and_ack(config, queued_query, message, stats))
+            tasks.add(task)
+            task.add_done_callback(_on_task_done)
+    finally:
+        stats_task.cancel()
+        if tasks:
+            logger.info(f"Waiting up to {SHUTDOWN_DRAIN_TIMEOUT}s for {len(tasks)} in flight tasks to finish...")
+            await asyncio.wait(tasks, timeout=SHUTDOWN_DRAIN_TIMEOUT)
+
+
+async def main(worker_id: int | None = None, health_queue: multiprocessing.Queue | None = None) -> None:
+    config = await load_config()
+    logger.debug(f"config: {config}")
 
-        await asyncio.sleep(0.01)
+    main_task = asyncio.current_task()
+    assert main_task is not None
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
 
+    # Each worker in supervisor mode gets its own port
+    metrics_port = int(os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT)) + (worker_id or 0)
+    metrics_server = await metrics.start_metrics_server(metrics_port)
 
-async def main() -> None:
-    config = await load_config()
-    logger.debug(f"config: {config}")
+    stats = ConsumerStats(max_concurrent_tasks=config.max_concurrent_tasks)
+    background_tasks = [config.bookkeeper.run(config.psql_db, config.redis_db), _report_load(config, stats)]
+    if worker_id is not None and health_queue is not None:
+        background_tasks.append(_report_health(health_queue, worker_id, stats))
 
-    await asyncio.gather(
-        listen_for_tasks(config),
-    )
+    try:
+        await asyncio.gather(listen_for_tasks(config, stats), *background_tasks)
+    finally:
+        metrics_server.close()
+        logger.info("Flushing bookkeeping before shutting down...")
+        await config.bookkeeper.flush(config.psql_db, config.redis_db, final=True)
+
+
+def run_worker(worker_id: int, health_queue: multiprocessing.Queue) -> None:
+    # The supervisor forwards SIGTERM to us on shutdown, so ignore the ctrl-c sent to the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        asyncio.run(main(worker_id, health_queue))
+    except asyncio.CancelledError:
+        pass
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    number_of_workers = int(os.getenv("QUERY_NODE_WORKERS", 1))
+    if number_of_workers > 1:
+        supervisor.Supervisor(number_of_workers, run_worker).run()
+    else:
+        asyncio.run(main())
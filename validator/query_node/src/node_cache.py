@@ -0,0 +1,59 @@
+"""
+In-process cache of nodes (with their fernets already built) for the query node.
+
+The control node bumps a generation counter in redis whenever it rewrites the nodes table
+or stores new symmetric keys. We check that counter at most once every GENERATION_CHECK_INTERVAL
+seconds, and drop the whole cache if it has moved on - so most lookups are just a dict hit.
+"""
+
+import time
+
+from redis.asyncio import Redis
+from fiber.networking.models import NodeWithFernet as Node
+from fiber.logging_utils import get_logger
+
+from validator.db.src.database import PSQLDB
+from validator.db.src.sql.nodes import get_node
+from validator.utils.redis import redis_constants as rcst
+
+logger = get_logger(__name__)
+
+GENERATION_CHECK_INTERVAL = 1.0
+
+
+class NodeCache:
+    def __init__(self, generation_check_interval: float = GENERATION_CHECK_INTERVAL):
+        self.generation_check_interval = generation_check_interval
+        self._nodes: dict[tuple[int, int], Node] = {}
+        self._generation: bytes | None = None
+        self._last_generation_check: float = 0.0
+
+    def invalidate(self) -> None:
+        self._nodes.clear()
+
+    async def _check_generation(self, redis_db: Redis) -> None:
+        now = time.time()
+        if now - self._last_generation_check < self.generation_check_interval:
+            return
+        self._last_generation_check = now
+
+        generation = await redis_db.get(rcst.NODES_GENERATION_KEY)
+        if generation != self._generation:
+            if self._nodes:
+                logger.debug(f"Nodes generation changed from {self._generation} to {generation}; clearing node cache")
+            self.invalidate()
+            self._generation = generation
+
+    async def get_node(self, psql_db: PSQLDB, redis_db: Redis, node_id: int, netuid: int) -> Node | None:
+        await self._check_generation(redis_db)
+
+        key = (node_id, netuid)
+        node = self._nodes.get(key)
+        if node is not None:
+            return node
+
+        node = await get_node(psql_db, node_id, netuid)
+        # Don't cache failures, the control node might be mid-handshake
+        if node is not None and node.fernet is not None:
+            self._nodes[key] = node
+        return node
@@ -7,17 +7,17 @@ from validator.query_node.src.query_config import Config
 from core import task_config as tcfg
 from validator.utils.generic import generic_utils as gutils
 from validator.utils.contender import contender_utils as putils
-from validator.utils.redis import redis_constants as rcst
+from validator.utils.redis import redis_constants as rcst, redis_utils as rutils
 from fiber.logging_utils import get_logger
 from validator.utils.redis import redis_dataclasses as rdc
 from validator.query_node.src.query import nonstream, streaming
 from validator.db.src.sql.contenders import get_contenders_for_task
-from validator.db.src.sql.nodes import get_node
 from validator.utils.generic import generic_constants as gcst
 
 logger = get_logger(__name__)
 
-MAX_CONCURRENT_TASKS = 10
+CONTENDERS_TO_QUERY = 5
+CONTENDER_SELECTION_HEADROOM = 3
 
 
 async def _decrement_requests_remaining(redis_db: Redis, task: str):
@@ -32,10 +32,13 @@ async def _acknowledge_job(redis_db: Redis, job_id: str):
 
 async def _handle_stream_query(config: Config, message: rdc.QueryQueueMessage, contenders_to_query: list[Contender]) -> bool:
     success = False
-    for contender in contenders_to_query[:5]:
-        node = await get_node(config.psql_db, contender.node_id, config.netuid)
+    for contender in contenders_to_query[:CONTENDERS_TO_QUERY]:
+        if not config.circuit_breaker.allow_request(contender.id):
+            continue
+        node = await config.node_cache.get_node(config.psql_db, config.redis_db, contender.node_id, config.netuid)
         if node is None:
             logger.error(f"Node {contender.node_id} not found in database for netuid {config.netuid}")
+            config.circuit_breaker.release_probe(contender.id)
             continue
         logger.debug(f"Querying node {contender.node_id} for task {contender.task} with payload: {message.query_payload}")
         start_time = time.time()
@@ -45,6 +48,8 @@ async def _handle_stream_query(config: Config, message: rdc.QueryQueueMessage, c
 
         # TODO: Make sure we still punish if generator is None
         if generator is None:
+            # We never sent anything, so this tells us nothing about the contender
+            config.circuit_breaker.release_probe(contender.id)
             continue
 
         success = await streaming.consume_generator(
@@ -77,9 +82,12 @@ async def _handle_stream_query(config: Config, message: rdc.QueryQueueMessage, c
 async def _handle_nonstream_query(config: Config, message: rdc.QueryQueueMessage, contenders_to_query: list[Contender]) -> bool:
     success = False
     for contender in contenders_to_query:
-        node = await get_node(config.psql_db, contender.node_id, config.netuid)
+        if not config.circuit_breaker.allow_request(contender.id):
+            continue
+        node = await config.node_cache.get_node(config.psql_db, config.redis_db, contender.node_id, config.netuid)
         if node is None:
             logger.error(f"Node {contender.node_id} not found in database for netuid {config.netuid}")
+            config.circuit_breaker.release_probe(contender.id)
             continue
         success = await nonstream.query_nonstream(
             config=config,
@@ -140,12 +148,25 @@ async def process_task(config: Config, message: rdc.QueryQueueMessage):
 
     stream = task_config.is_stream
 
-    async with await config.psql_db.connection() as connection:
-        contenders_to_query = await get_contenders_for_task(connection, task)
+    # Grab a few extra, so there's still enough to fail over to after skipping contenders with open circuit breakers
+    with rutils.REDIS_CALL_SECONDS.time("contender_ranking"):
+        contenders_to_query = await putils.get_contenders_from_ranking(
+            config.redis_db, task, top_x=CONTENDERS_TO_QUERY * CONTENDER_SELECTION_HEADROOM
+        )
+    if not contenders_to_query:
+        # Rankings are rebuilt by the control node each cycle - fall back to the db until then
+        async with await config.psql_db.connection() as connection:
+            contenders_to_query = await get_contenders_for_task(
+                connection, task, top_x=CONTENDERS_TO_QUERY * CONTENDER_SELECTION_HEADROOM
+            )
 
     if contenders_to_query is None:
         raise ValueError("No contenders to query! :(")
 
+    contenders_to_query = (await config.circuit_breaker.filter_available(config.redis_db, contenders_to_query))[
+        :CONTENDERS_TO_QUERY
+    ]
+
     try:
         if stream:
             return await _handle_stream_query(config, message, contenders_to_query)
@@ -0,0 +1,81 @@
+"""
+Coalesces the streamed chunks for a job into fewer redis publishes.
+
+The first chunk is always published straight away so time to first token doesn't suffer.
+After that, chunks are buffered and published together once `window` seconds have passed
+since the first buffered chunk, or once `max_bytes` have built up - whichever comes first.
+
+The chunks are SSE events ("data: ...\\n\\n"), so concatenating them gives a valid SSE payload,
+which the entry node can pass straight through / split with load_sse_jsons as before.
+"""
+
+import asyncio
+
+from redis.asyncio import Redis
+from fiber.logging_utils import get_logger
+
+from validator.utils.generic import generic_utils
+from validator.utils.redis import redis_constants as rcst, redis_utils as rutils
+
+logger = get_logger(__name__)
+
+
+class ChunkPublisher:
+    def __init__(self, redis_db: Redis, job_id: str, window: float, max_bytes: int):
+        self.redis_db = redis_db
+        self.job_id = job_id
+        self.window = window
+        self.max_bytes = max_bytes
+        self._buffer: list[str] = []
+        self._buffered_bytes = 0
+        self._published_first = False
+        self._flush_timer: asyncio.Task | None = None
+        # Keeps publishes in order, even when the timer and a size based flush race
+        self._lock = asyncio.Lock()
+
+    async def _publish(self, content: str, status_code: int) -> None:
+        with rutils.REDIS_CALL_SECONDS.time("publish_chunk"):
+            await self.redis_db.publish(
+                f"{rcst.JOB_RESULTS}:{self.job_id}",
+                generic_utils.get_success_event(content=content, job_id=self.job_id, status_code=status_code),
+            )
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window)
+        self._flush_timer = None
+        await self.flush()
+
+    def _cancel_timer(self) -> None:
+        if self._flush_timer is not None and self._flush_timer is not asyncio.current_task():
+            self._flush_timer.cancel()
+        self._flush_timer = None
+
+    async def publish(self, content: str, status_code: int = 200) -> None:
+        if not self._published_first or self.window <= 0:
+            self._published_first = True
+            async with self._lock:
+                await self._publish(content, status_code)
+            return
+
+        self._buffer.append(content)
+        self._buffered_bytes += len(content)
+        if self._buffered_bytes >= self.max_bytes:
+            await self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_after_window())
+
+    async def flush(self) -> None:
+        self._cancel_timer()
+        async with self._lock:
+            if not self._buffer:
+                return
+            content = "".join(self._buffer)
+            self._buffer = []
+            self._buffered_bytes = 0
+            await self._publish(content, status_code=200)
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush the last chunks for job {self.job_id}: {e}")
@@ -101,6 +101,7 @@ async def query_nonstream(
     time_before_query = time.time()
     if task_config is None:
         logger.error(f"Task config not found for task: {contender.task}")
+        config.circuit_breaker.release_probe(contender.id)
         return False
 
     try:
@@ -11,12 +11,13 @@ from validator.models import Contender
 from fiber.validator import client
 from fiber.networking.models import NodeWithFernet as Node
 from core import task_config as tcfg
-from validator.utils.generic import generic_constants as gcst, generic_utils
 from validator.utils.redis import redis_constants as rcst
+from validator.query_node.src.query.chunk_publisher import ChunkPublisher
+from validator.query_node.src import query_metrics
 
 from fiber.logging_utils import get_logger
 
-from validator.utils.query.query_utils import load_sse_jsons
+from validator.utils.query.query_utils import SSERelay
 
 logger = get_logger(__name__)
 
@@ -36,28 +37,10 @@ def _get_formatted_payload(content: str, first_message: bool, add_finish_reason:
     return dumped_payload
 
 
-async def _handle_event(
-    config: Config,
-    content: str | None,
-    synthetic_query: bool,
-    job_id: str,
-    status_code: int,
-    error_message: str | None = None,
-) -> None:
+async def _handle_event(publisher: ChunkPublisher, content: str, synthetic_query: bool) -> None:
     if synthetic_query:
         return
-    if content is not None:
-        if isinstance(content, dict):
-            content = json.dumps(content)
-        await config.redis_db.publish(
-            f"{rcst.JOB_RESULTS}:{job_id}",
-            generic_utils.get_success_event(content=content, job_id=job_id, status_code=status_code),
-        )
-    else:
-        await config.redis_db.publish(
-            f"{rcst.JOB_RESULTS}:{job_id}",
-            generic_utils.get_error_event(job_id=job_id, error_message=error_message, status_code=status_code),
-        )
+    await publisher.publish(content)
 
 
 async def async_chain(first_chunk, async_gen):
@@ -105,77 +88,60 @@ async def consume_generator(
         await utils.adjust_contender_from_result(config, query_result, contender, synthetic_query, payload=payload)
         return False
 
-    text_jsons, status_code, first_message =  [], 200, True
+    query_metrics.TIME_TO_FIRST_TOKEN_SECONDS.observe(time.time() - start_time, task)
+    publisher = ChunkPublisher(
+        config.redis_db, job_id, window=config.stream_publish_window, max_bytes=config.stream_publish_max_bytes
+    )
+    relay = SSERelay()
     try:
         async for text in async_chain(first_chunk, generator):
             if isinstance(text, bytes):
                 text = text.decode()
-            if isinstance(text, str):
-                try:
-                    loaded_jsons = load_sse_jsons(text)
-                    if isinstance(loaded_jsons, dict):
-                        status_code = loaded_jsons.get(gcst.STATUS_CODE)  # noqa
-                        break
-
-                except (IndexError, json.JSONDecodeError) as e:
-                    logger.warning(f"Error {e} when trying to load text: {text}")
-                    break
-
-                for text_json in loaded_jsons:
-                    if not isinstance(text_json, dict):
-                        logger.debug(f"Invalid text_json because its not a dict?: {text_json}")
-                        first_message = True  # NOTE: Janky, but so we mark it as a fail
-                        break
-                    try:
-                        _ = text_json["choices"][0]["delta"]["content"]
-                    except KeyError:
-                        logger.debug(f"Invalid text_json because there's not delta content: {text_json}")
-                        first_message = True  # NOTE: Janky, but so we mark it as a fail
-                        break
-
-                    text_jsons.append(text_json)
-                    dumped_payload = json.dumps(text_json)
-                    first_message = False
-                    await _handle_event(
-                        config,
-                        content=f"data: {dumped_payload}\n\n",
-                        synthetic_query=synthetic_query,
-                        job_id=job_id,
-                        status_code=200,
-                    )
-
-        if len(text_jsons) > 0:
+            if not isinstance(text, str):
+                continue
+            events_to_forward = relay.feed(text)
+            if events_to_forward:
+                await _handle_event(publisher, content=events_to_forward, synthetic_query=synthetic_query)
+            if relay.done:
+                break
+        events_to_forward = relay.finish()
+        if events_to_forward:
+            await _handle_event(publisher, content=events_to_forward, synthetic_query=synthetic_query)
+
+        if len(relay.raw_jsons) > 0:
             last_payload = _get_formatted_payload("", False, add_finish_reason=True)
-            await _handle_event(
-                config, content=f"data: {last_payload}\n\n", synthetic_query=synthetic_query, job_id=job_id, status_code=200
-            )
-            await _handle_event(
-                config, content="data: [DONE]\n\n", synthetic_query=synthetic_query, job_id=job_id, status_code=200
-            )
-            logger.info(f" 👀  Queried node: {node.node_id} for task: {task}. Success: {not first_message}.")
+            await _handle_event(publisher, content=f"data: {last_payload}\n\n", synthetic_query=synthetic_query)
+            await _handle_event(publisher, content="data: [DONE]\n\n", synthetic_query=synthetic_query)
+            logger.info(f" 👀  Queried node: {node.node_id} for task: {task}. Success: {relay.valid}.")
 
         response_time = time.time() - start_time
         query_result = utility_models.QueryResult(
-            formatted_response=text_jsons if len(text_jsons) > 0 else None,
+            formatted_response=relay.formatted_response(),
             node_id=node.node_id,
             response_time=response_time,
             task=task,
-            success=not first_message,
+            success=relay.valid,
             node_hotkey=node.hotkey,
             status_code=200,
         )
-        success = not first_message
+        success = relay.valid
     except Exception as e:
         logger.error(f"Unexpected exception when querying node: {node.node_id} for task: {task}. Payload: {payload}. Error: {e}")
         query_result = construct_500_query_result(node, task)
+        response_time = None
         success = False
     finally:
+        await publisher.close()
         if query_result is not None:
-            await utils.adjust_contender_from_result(config, query_result, contender, synthetic_query, payload=payload)
+            await utils.adjust_contender_from_result(
+                config, query_result, contender, synthetic_query, payload=payload, character_count=relay.character_count
+            )
             await config.redis_db.expire(rcst.QUERY_RESULTS_KEY + ":" + job_id, 10)
 
-    character_count = sum([len(text_json["choices"][0]["delta"]["content"]) for text_json in text_jsons])
-    logger.debug(f"Success: {success}; Node: {node.node_id}; Task: {task}; response_time: {response_time}; first_message: {first_message}; character_count: {character_count}")
+    logger.debug(
+        f"Success: {success}; Node: {node.node_id}; Task: {task}; response_time: {response_time}; "
+        f"character_count: {relay.character_count}"
+    )
     logger.info(f"Success: {success}")
     return success
 
@@ -1,9 +1,13 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from fiber import Keypair
 import httpx
 from fiber.logging_utils import get_logger
 from validator.db.src.database import PSQLDB
 from redis.asyncio import Redis
+from validator.query_node.src.node_cache import NodeCache
+from validator.query_node.src.bookkeeping import Bookkeeper
+from validator.query_node.src.circuit_breaker import CircuitBreaker
+from validator.utils.redis.query_queue import QueryQueue
 
 logger = get_logger(__name__)
 
@@ -13,8 +17,16 @@ class Config:
     keypair: Keypair
     psql_db: PSQLDB
     redis_db: Redis
+    queue_redis_db: Redis
+    query_queue: QueryQueue
     ss58_address: str
     netuid: int
     httpx_client: httpx.AsyncClient = httpx.AsyncClient()
+    max_concurrent_tasks: int = 100
+    stream_publish_window: float = 0.015
+    stream_publish_max_bytes: int = 4096
     replace_with_localhost: bool = False
     replace_with_docker_localhost: bool = True
+    node_cache: NodeCache = field(default_factory=NodeCache)
+    bookkeeper: Bookkeeper = field(default_factory=Bookkeeper)
+    circuit_breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
@@ -0,0 +1,15 @@
+"""Metrics for the query node, served on METRICS_PORT - see core/metrics.py"""
+
+from core import metrics
+
+QUEUE_WAIT_SECONDS = metrics.Histogram(
+    "query_node_queue_wait_seconds", "Time between a query being queued and a query node picking it up", labelnames=("query_type",)
+)
+TIME_TO_FIRST_TOKEN_SECONDS = metrics.Histogram(
+    "query_node_time_to_first_token_seconds", "Time until a miner streams back its first chunk", labelnames=("task",)
+)
+QUERY_SECONDS = metrics.Histogram(
+    "query_node_query_seconds", "Total time taken by a miner to answer a query", labelnames=("task", "contender")
+)
+QUERIES_TOTAL = metrics.Counter("query_node_queries_total", "Queries sent to miners", labelnames=("task", "status_code"))
+IN_FLIGHT = metrics.Gauge("query_node_in_flight", "Queries currently being processed")
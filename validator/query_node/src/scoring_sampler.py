@@ -0,0 +1,151 @@
+"""
+Decides which query results get stored for scoring, without counting rows in postgres on every success.
+
+Successful results are offered to a small reservoir per (task, hotkey) - algorithm R, so each reservoir is a uniform
+sample of that hotkey's results in the window, and memory stays bounded however busy we are. Every SAMPLE_WINDOW
+seconds we work out how many more results each task may store (MAX_TASKS_IN_DB_STORE * task weight, minus what's
+already stored), pick that many from the reservoirs round robin across hotkeys, and store them in one insert.
+
+How many results are stored per task lives in a redis hash shared by all query nodes. Query nodes bump it as they store
+(only if it still exists - bumping an expired hash would recreate it with just the bumped tasks, and every other task
+would read as 0 stored); it expires every COUNTS_TTL seconds and is then rebuilt from a single GROUP BY, which also
+picks up what we've just stored and the results the control node has scored & deleted since.
+"""
+
+import random
+import time
+from dataclasses import dataclass, field
+
+from redis.asyncio import Redis
+from fiber.logging_utils import get_logger
+
+from core import task_config as tcfg
+from core.models import utility_models
+from validator.db.src import functions as db_functions
+from validator.db.src.database import PSQLDB
+from validator.db.src.sql.rewards_and_scores import select_tasks_and_number_of_results
+from validator.utils.redis import redis_constants as rcst
+
+logger = get_logger(__name__)
+
+SAMPLE_WINDOW = 5.0
+RESERVOIR_SIZE = 2
+COUNTS_TTL = 60
+
+# KEYS[1]: the counts hash, ARGV: task, stored, task, stored, ...
+_BUMP_STORED_COUNTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+
+@dataclass
+class ScoringSample:
+    result: utility_models.QueryResult
+    synthetic_query: bool
+    payload: dict
+
+
+@dataclass
+class _Reservoir:
+    samples: list[ScoringSample] = field(default_factory=list)
+    seen: int = 0
+
+
+class ScoringSampler:
+    def __init__(self, sample_window: float = SAMPLE_WINDOW, reservoir_size: int = RESERVOIR_SIZE):
+        self.sample_window = sample_window
+        self.reservoir_size = reservoir_size
+        self._reservoirs: dict[str, dict[str, _Reservoir]] = {}
+        self._window_start = time.time()
+
+    def offer(self, result: utility_models.QueryResult, synthetic_query: bool, payload: dict) -> None:
+        if result.node_hotkey is None:
+            db_functions.SCORING_SAMPLES_TOTAL.inc(result.task, "dropped")
+            return
+        reservoirs = self._reservoirs.setdefault(result.task, {})
+        reservoir = reservoirs.get(result.node_hotkey)
+        if reservoir is None:
+            reservoir = reservoirs[result.node_hotkey] = _Reservoir()
+
+        reservoir.seen += 1
+        if len(reservoir.samples) < self.reservoir_size:
+            reservoir.samples.append(ScoringSample(result=result, synthetic_query=synthetic_query, payload=payload))
+            return
+        index = random.randrange(reservoir.seen)
+        if index < self.reservoir_size:
+            reservoir.samples[index] = ScoringSample(result=result, synthetic_query=synthetic_query, payload=payload)
+
+    def _choose(self, reservoirs: dict[str, _Reservoir], quota: int) -> list[ScoringSample]:
+        """Round robin across hotkeys (in a random order), so one busy miner can't take the whole quota"""
+        queues = [reservoir.samples for reservoir in reservoirs.values() if reservoir.samples]
+        random.shuffle(queues)
+        chosen: list[ScoringSample] = []
+        while queues and len(chosen) < quota:
+            for samples in list(queues):
+                chosen.append(samples.pop())
+                if not samples:
+                    queues.remove(samples)
+                if len(chosen) == quota:
+                    break
+        return chosen
+
+    async def _get_stored_counts(self, psql_db: PSQLDB, redis_db: Redis) -> dict[str, int]:
+        raw_counts = await redis_db.hgetall(rcst.SCORING_SAMPLE_COUNTS_KEY)
+        if raw_counts:
+            return {
+                (task.decode() if isinstance(task, bytes) else task): int(count) for task, count in raw_counts.items()
+            }
+
+        async with await psql_db.connection() as connection:
+            counts = await select_tasks_and_number_of_results(connection)
+        async with redis_db.pipeline(transaction=True) as pipe:
+            pipe.delete(rcst.SCORING_SAMPLE_COUNTS_KEY)
+            # Make sure the hash exists even if nothing is stored, otherwise we'd hit postgres every window
+            pipe.hset(rcst.SCORING_SAMPLE_COUNTS_KEY, mapping={"": 0, **counts})
+            pipe.expire(rcst.SCORING_SAMPLE_COUNTS_KEY, COUNTS_TTL)
+            await pipe.execute()
+        return counts
+
+    async def flush(self, psql_db: PSQLDB, redis_db: Redis, force: bool = False) -> int:
+        """Stores the chosen samples once the window is up (or straight away if forced). Returns how many were stored"""
+        if not force and time.time() - self._window_start < self.sample_window:
+            return 0
+        reservoirs_by_task, self._reservoirs = self._reservoirs, {}
+        self._window_start = time.time()
+        if not reservoirs_by_task:
+            return 0
+
+        stored_counts = await self._get_stored_counts(psql_db, redis_db)
+
+        samples_to_store: list[ScoringSample] = []
+        for task, reservoirs in reservoirs_by_task.items():
+            offered = sum(reservoir.seen for reservoir in reservoirs.values())
+            task_config = tcfg.get_enabled_task_config(task)
+            if task_config is None:
+                db_functions.SCORING_SAMPLES_TOTAL.inc(task, "dropped", amount=offered)
+                continue
+            quota = int(db_functions.MAX_TASKS_IN_DB_STORE * task_config.weight) - stored_counts.get(task, 0)
+            chosen = self._choose(reservoirs, quota) if quota > 0 else []
+            samples_to_store.extend(chosen)
+            db_functions.SCORING_SAMPLES_TOTAL.inc(task, "dropped", amount=offered - len(chosen))
+
+        if not samples_to_store:
+            return 0
+
+        stored_per_task = await db_functions.store_results_for_scoring(
+            psql_db, [(sample.result, sample.synthetic_query, sample.payload) for sample in samples_to_store]
+        )
+        # If the hash expired since we read it, the next _get_stored_counts rebuilds it from postgres, these included
+        await redis_db.eval(
+            _BUMP_STORED_COUNTS_SCRIPT,
+            1,
+            rcst.SCORING_SAMPLE_COUNTS_KEY,
+            *[arg for task, stored in stored_per_task.items() for arg in (task, stored)],
+        )  # type: ignore
+        return sum(stored_per_task.values())
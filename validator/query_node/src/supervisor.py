@@ -0,0 +1,171 @@
+"""
+Supervisor mode for the query node - forks QUERY_NODE_WORKERS worker processes which all consume the same
+query queue, so json parsing, payload encryption and response validation can use more than one core.
+
+Each worker runs the normal query node (own event loop, redis / postgres pools and httpx client), and sends a
+heartbeat with its consumer stats back to the supervisor every HEALTH_REPORT_INTERVAL seconds.
+The supervisor logs per worker health, restarts workers which die or stop reporting (i.e. are hung), and on
+SIGTERM / SIGINT forwards SIGTERM to every worker and waits for them to drain before exiting.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from dataclasses import dataclass
+from multiprocessing.process import BaseProcess
+from typing import Callable
+
+from fiber.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+HEALTH_REPORT_INTERVAL = 10
+# A worker which hasn't reported for this long is probably wedged, and gets restarted
+HEALTH_TIMEOUT = 60
+# How long a wedged worker gets to exit on SIGTERM before it's killed
+HUNG_WORKER_TERMINATE_TIMEOUT = 5
+HEALTH_LOG_INTERVAL = 60
+RESTART_BACKOFF = 5
+# Workers get SHUTDOWN_DRAIN_TIMEOUT to drain in flight queries, plus a bit for the final flush
+SHUTDOWN_GRACE_PERIOD = 45
+
+
+@dataclass
+class WorkerHealth:
+    worker_id: int
+    pid: int
+    in_flight: int
+    max_concurrent_tasks: int
+    jobs_finished: int
+    reported_at: float
+
+
+@dataclass
+class _Worker:
+    worker_id: int
+    process: BaseProcess
+    started_at: float
+    last_health: WorkerHealth | None = None
+    exit_logged: bool = False
+
+
+class Supervisor:
+    def __init__(self, number_of_workers: int, worker_target: Callable[[int, multiprocessing.Queue], None]):
+        self.number_of_workers = number_of_workers
+        self.worker_target = worker_target
+        self._context = multiprocessing.get_context("fork")
+        self._health_queue: multiprocessing.Queue = self._context.Queue()
+        self._workers: dict[int, _Worker] = {}
+        self._shutting_down = False
+
+    def _start_worker(self, worker_id: int) -> None:
+        process = self._context.Process(
+            target=self.worker_target,
+            args=(worker_id, self._health_queue),
+            name=f"query-node-worker-{worker_id}",
+        )
+        process.start()
+        self._workers[worker_id] = _Worker(worker_id=worker_id, process=process, started_at=time.time())
+        logger.info(f"Started query node worker {worker_id} with pid {process.pid}")
+
+    def _request_shutdown(self, signum: int, _frame) -> None:
+        if self._shutting_down:
+            return
+        logger.info(f"Received signal {signum}, shutting down {len(self._workers)} query node workers...")
+        self._shutting_down = True
+        for worker in self._workers.values():
+            if worker.process.is_alive() and worker.process.pid is not None:
+                os.kill(worker.process.pid, signal.SIGTERM)
+
+    def _drain_health_reports(self, timeout: float) -> None:
+        try:
+            health: WorkerHealth = self._health_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            worker = self._workers.get(health.worker_id)
+            if worker is not None and worker.process.pid == health.pid:
+                worker.last_health = health
+            try:
+                health = self._health_queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _stop_hung_workers(self) -> None:
+        """Stops workers which haven't reported for HEALTH_TIMEOUT, so _restart_dead_workers brings them back"""
+        now = time.time()
+        for worker_id, worker in self._workers.items():
+            if not worker.process.is_alive():
+                continue
+            last_heard_from = worker.last_health.reported_at if worker.last_health is not None else worker.started_at
+            if now - last_heard_from < HEALTH_TIMEOUT:
+                continue
+            logger.error(
+                f"Query node worker {worker_id} (pid {worker.process.pid}) hasn't reported for {now - last_heard_from:.0f}s, "
+                "restarting it"
+            )
+            worker.process.terminate()
+            worker.process.join(timeout=HUNG_WORKER_TERMINATE_TIMEOUT)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+
+    def _restart_dead_workers(self) -> None:
+        for worker_id, worker in list(self._workers.items()):
+            if worker.process.is_alive():
+                continue
+            if not worker.exit_logged:
+                logger.error(
+                    f"Query node worker {worker_id} (pid {worker.process.pid}) exited with code {worker.process.exitcode}"
+                )
+                worker.exit_logged = True
+            if time.time() - worker.started_at < RESTART_BACKOFF:
+                # Don't spin if the worker dies straight away, e.g. bad config
+                continue
+            self._start_worker(worker_id)
+
+    def _log_health(self) -> None:
+        now = time.time()
+        for worker_id, worker in sorted(self._workers.items()):
+            health = worker.last_health
+            if health is None:
+                logger.info(f"Worker {worker_id} (pid {worker.process.pid}): no health report yet")
+                continue
+            status = "healthy" if now - health.reported_at < HEALTH_TIMEOUT else "NOT REPORTING"
+            logger.info(
+                f"Worker {worker_id} (pid {health.pid}): {status}; in flight: {health.in_flight}/{health.max_concurrent_tasks}; "
+                f"jobs finished: {health.jobs_finished}; last report {now - health.reported_at:.0f}s ago"
+            )
+
+    def _wait_for_workers(self) -> None:
+        deadline = time.time() + SHUTDOWN_GRACE_PERIOD
+        for worker in self._workers.values():
+            worker.process.join(timeout=max(deadline - time.time(), 0))
+        for worker in self._workers.values():
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.worker_id} (pid {worker.process.pid}) didn't shut down in time, killing it")
+                worker.process.kill()
+                worker.process.join()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._request_shutdown)
+        signal.signal(signal.SIGINT, self._request_shutdown)
+
+        for worker_id in range(self.number_of_workers):
+            self._start_worker(worker_id)
+
+        last_health_log = time.time()
+        while not self._shutting_down:
+            self._drain_health_reports(timeout=1)
+            if self._shutting_down:
+                break
+            self._stop_hung_workers()
+            self._restart_dead_workers()
+            if time.time() - last_health_log >= HEALTH_LOG_INTERVAL:
+                self._log_health()
+                last_health_log = time.time()
+
+        self._wait_for_workers()
+        logger.info("All query node workers have stopped")
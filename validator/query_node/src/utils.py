@@ -4,12 +4,8 @@ from validator.query_node.src.query_config import Config
 from validator.utils import work_and_speed_functions
 from core import task_config as tcfg
 from fiber.logging_utils import get_logger
-from validator.db.src import functions as db_functions
-from validator.db.src.sql.contenders import (
-    update_contender_429_count,
-    update_contender_500_count,
-    update_contender_capacities,
-)
+from validator.utils.contender import contender_utils as putils
+from validator.query_node.src import query_metrics
 
 logger = get_logger(__name__)
 
@@ -20,35 +16,50 @@ async def adjust_contender_from_result(
     contender: Contender,
     synthetic_query: bool,
     payload: dict,
+    character_count: int | None = None,
 ) -> utility_models.QueryResult:
     """
-    Update the db with consumed volume
-    Store the task result in the db for checking (potentially)
+    Record the consumed volume against the contender
+    Queue the task result to (potentially) be stored in the db for checking
+
+    The db writes themselves happen in the background, see bookkeeping.py
     """
+    await putils.bump_contender_ranking(config.redis_db, contender)
+
+    query_metrics.QUERIES_TOTAL.inc(query_result.task, str(query_result.status_code))
+    if query_result.response_time is not None:
+        query_metrics.QUERY_SECONDS.observe(query_result.response_time, query_result.task, str(contender.node_id))
 
     if query_result.status_code == 200 and query_result.success:
         logger.debug(f"✅ Adjusting node {contender.node_id} for task {query_result.task}")
         task_config = tcfg.get_enabled_task_config(query_result.task)
         if task_config is None:
             logger.error(f"Task {query_result.task} is not enabled")
+            config.circuit_breaker.release_probe(contender.id)
             return query_result
 
+        # Streams already counted their characters on the way through, so don't dump & re-parse the response
+        result = {} if character_count is not None else query_result.model_dump()
         capacity_consumed = work_and_speed_functions.calculate_work(
-            task_config=task_config, result=query_result.model_dump(), steps=payload.get("steps")
+            task_config=task_config, result=result, steps=payload.get("steps"), character_count=character_count
         )
         logger.debug(f"Capacity consumed: {capacity_consumed}")
 
-        await update_contender_capacities(config.psql_db, contender, capacity_consumed)
-
-        await db_functions.potentially_store_result_in_db(
-            config.psql_db, query_result, query_result.task, synthetic_query=synthetic_query, payload=payload
-        )
+        config.bookkeeper.record_success(contender.id, capacity_consumed)
+        await config.circuit_breaker.record_success(config.redis_db, contender.id)
+        config.bookkeeper.add_scoring_sample(query_result, synthetic_query=synthetic_query, payload=payload)
         logger.debug(f"Adjusted node {contender.node_id} for task {query_result.task}.")
 
     elif query_result.status_code == 429:
         logger.debug(f"❌ 💔 429 error;  Adjusting node {contender.node_id} for task {query_result.task}.")
-        await update_contender_429_count(config.psql_db, contender)
+        config.bookkeeper.record_429(contender.id)
+        config.circuit_breaker.release_probe(contender.id)
     else:
         logger.debug(f"❌ 💔 500 error; Adjusting node {contender.node_id} for task {query_result.task}.")
-        await update_contender_500_count(config.psql_db, contender)
+        config.bookkeeper.record_500(contender.id)
+        if query_result.status_code is None or query_result.status_code >= 500:
+            # Connection errors & timeouts come through as 500s too
+            await config.circuit_breaker.record_failure(config.redis_db, contender.id)
+        else:
+            config.circuit_breaker.release_probe(contender.id)
     return query_result
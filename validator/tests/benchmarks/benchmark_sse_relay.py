@@ -0,0 +1,70 @@
+"""
+Microbenchmark for the streaming hot path in the query node.
+
+Compares the old per chunk work (json.loads every event, json.dumps it again to republish,
+then walk all the dicts again to count characters) with SSERelay, which forwards the events as they are.
+
+Run with: python -m validator.tests.benchmarks.benchmark_sse_relay
+"""
+
+import json
+import timeit
+
+from validator.utils.query.query_utils import SSERelay, load_sse_jsons
+
+NUMBER_OF_CHUNKS = 500
+REPEATS = 20
+
+
+def _make_chunks() -> list[str]:
+    chunks = []
+    for i in range(NUMBER_OF_CHUNKS):
+        payload = {
+            "id": "chatcmpl-123",
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {"content": f" token{i} \"quoted\" ünïcode"}, "finish_reason": None}],
+        }
+        chunks.append(f"data: {json.dumps(payload)}\n\n")
+    chunks.append("data: [DONE]\n\n")
+    return chunks
+
+
+def old_path(chunks: list[str]) -> int:
+    text_jsons = []
+    for text in chunks:
+        loaded_jsons = load_sse_jsons(text)
+        if isinstance(loaded_jsons, dict):
+            break
+        for text_json in loaded_jsons:
+            content = text_json["choices"][0]["delta"]["content"]
+            text_jsons.append(text_json)
+            _ = f"data: {json.dumps(text_json)}\n\n"
+            _ = content
+    character_count = sum(len(text_json["choices"][0]["delta"]["content"]) for text_json in text_jsons)
+    # calculate_work used to re-parse the dumped response too
+    json.loads(json.dumps(text_jsons))
+    return character_count
+
+
+def relay_path(chunks: list[str]) -> int:
+    relay = SSERelay()
+    for text in chunks:
+        relay.feed(text)
+        if relay.done:
+            break
+    relay.finish()
+    relay.formatted_response()
+    return relay.character_count
+
+
+def main() -> None:
+    chunks = _make_chunks()
+    assert old_path(chunks) == relay_path(chunks)
+
+    old = min(timeit.repeat(lambda: old_path(chunks), number=1, repeat=REPEATS))
+    new = min(timeit.repeat(lambda: relay_path(chunks), number=1, repeat=REPEATS))
+    print(f"{NUMBER_OF_CHUNKS} chunks - old: {old * 1000:.2f}ms, relay: {new * 1000:.2f}ms ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
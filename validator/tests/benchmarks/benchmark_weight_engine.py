@@ -0,0 +1,160 @@
+"""
+Microbenchmark for the weight calculation in the control node.
+
+Compares the per hotkey calculation (dicts & lists, one contender at a time) with weight_engine, on the same
+in memory data, at 256 and 1024 nodes. This is just the compute - the per hotkey calculation also made a
+round trip to postgres per contender for its period scores, which the bulk load removes. The engine is given
+the latest PERIOD_SCORE_LOOKBACK period scores per contender, as select_latest_period_scores loads.
+The weight state is timed once it's been built - a weight run then only catches up on what was scored since.
+
+Run with: python -m validator.tests.benchmarks.benchmark_weight_engine
+"""
+
+import asyncio
+import random
+import timeit
+from datetime import datetime
+
+from validator.control_node.src.cycle import calculations, weight_engine, weight_state
+from validator.models import Contender, PeriodScore, RewardData
+
+NETUID = 19
+NUMBER_OF_TASKS = 10
+SAMPLES_PER_HOTKEY = 50
+PERIOD_SCORES_PER_CONTENDER = 72
+REPEATS = 3
+
+
+def _make_data(number_of_nodes: int) -> tuple[dict[str, list[RewardData]], list[Contender], list[PeriodScore]]:
+    rng = random.Random(0)
+    hotkeys = [f"hotkey-{i}" for i in range(number_of_nodes)]
+    tasks = [f"task-{i}" for i in range(NUMBER_OF_TASKS)]
+
+    reward_datas = {
+        task: [
+            RewardData(
+                id=f"{task}-{hotkey}-{i}",
+                task=task,
+                node_id=node_id,
+                quality_score=rng.random(),
+                validator_hotkey="validator",
+                node_hotkey=hotkey,
+                synthetic_query=True,
+                metric=rng.random(),
+            )
+            for node_id, hotkey in enumerate(hotkeys)
+            for i in range(SAMPLES_PER_HOTKEY)
+        ]
+        for task in tasks
+    }
+    contenders = [
+        Contender(
+            node_hotkey=hotkey,
+            node_id=node_id,
+            netuid=NETUID,
+            task=task,
+            raw_capacity=100,
+            capacity=rng.uniform(1, 1000),
+            capacity_to_score=10,
+        )
+        for task in tasks
+        for node_id, hotkey in enumerate(hotkeys)
+    ]
+    period_scores = [
+        PeriodScore(
+            hotkey=contender.node_hotkey,
+            task=contender.task,
+            period_score=rng.random(),
+            consumed_capacity=rng.uniform(0, 1000),
+            created_at=datetime.now(),
+        )
+        for contender in contenders
+        for _ in range(PERIOD_SCORES_PER_CONTENDER)
+    ]
+    return reward_datas, contenders, period_scores
+
+
+async def per_hotkey(tasks: list[str], contenders: list[Contender]) -> dict[str, float]:
+    total_hotkey_scores: dict[str, float] = {}
+    for task in tasks:
+        combined_quality_scores, _, _ = await calculations._process_quality_scores(None, task, NETUID)
+        effective_volumes, _, _ = await calculations._calculate_effective_volumes_for_task(
+            None, contenders, task, combined_quality_scores
+        )
+        for hotkey, score in (await calculations._normalise_effective_volumes_for_task(effective_volumes)).items():
+            total_hotkey_scores[hotkey] = total_hotkey_scores.get(hotkey, 0) + score
+    return total_hotkey_scores
+
+
+def engine(
+    reward_datas: dict[str, list[RewardData]], contenders: list[Contender], period_score_histories: dict[str, list[dict]]
+) -> list[float]:
+    task_scores = [
+        weight_engine.calculate_task_scores(
+            calculations._task_inputs(task, 1.0, reward_datas[task], contenders, period_score_histories[task])
+        )
+        for task in reward_datas
+    ]
+    return weight_engine.calculate_weights(task_scores)[1]
+
+
+def state(
+    state: weight_state.WeightState, reward_datas: dict[str, list[RewardData]], contenders: list[Contender]
+) -> list[float]:
+    node_hotkeys = list(dict.fromkeys(contender.node_hotkey for contender in contenders))
+    task_scores = [state.task_scores(task, 1.0, node_hotkeys, contenders) for task in reward_datas]
+    return weight_engine.calculate_weights(task_scores)[1]
+
+
+def _built_state(reward_datas: dict[str, list[RewardData]], period_scores: list[PeriodScore]) -> weight_state.WeightState:
+    built = weight_state.WeightState()
+    now = datetime.now()
+    for task_reward_datas in reward_datas.values():
+        for reward_data in task_reward_datas:
+            built.add_reward_data(
+                reward_data.id, reward_data.task, reward_data.node_hotkey, reward_data.quality_score, reward_data.metric, now
+            )
+    for period_score in period_scores:
+        built.add_period_score(period_score)
+    return built
+
+
+def main() -> None:
+    for number_of_nodes in (256, 1024):
+        reward_datas, contenders, period_scores = _make_data(number_of_nodes)
+        period_scores_by_hotkey: dict[tuple[str, str], list[PeriodScore]] = {}
+        for ps in period_scores:
+            period_scores_by_hotkey.setdefault((ps.task, ps.hotkey), []).append(ps)
+        # As select_latest_period_scores returns them
+        period_score_histories: dict[str, list[dict]] = {}
+        for (task, hotkey), scores in period_scores_by_hotkey.items():
+            period_score_histories.setdefault(task, []).append(
+                {
+                    "hotkey": hotkey,
+                    "period_scores": [ps.period_score for ps in scores[: weight_engine.PERIOD_SCORE_LOOKBACK]],
+                    "consumed_capacities": [ps.consumed_capacity for ps in scores[: weight_engine.PERIOD_SCORE_LOOKBACK]],
+                }
+            )
+
+        async def _get_reward_datas(psql_db, task: str, netuid: int) -> list[RewardData]:
+            return reward_datas[task]
+
+        async def _get_period_scores(psql_db, task: str, node_hotkey: str) -> list[PeriodScore]:
+            return period_scores_by_hotkey.get((task, node_hotkey), [])
+
+        calculations._get_reward_datas = _get_reward_datas
+        calculations._get_period_scores = _get_period_scores
+
+        tasks = list(reward_datas)
+        old = timeit.timeit(lambda: asyncio.run(per_hotkey(tasks, contenders)), number=REPEATS) / REPEATS
+        new = timeit.timeit(lambda: engine(reward_datas, contenders, period_score_histories), number=REPEATS) / REPEATS
+        built_state = _built_state(reward_datas, period_scores)
+        incremental = timeit.timeit(lambda: state(built_state, reward_datas, contenders), number=REPEATS) / REPEATS
+        print(
+            f"{number_of_nodes} nodes, {NUMBER_OF_TASKS} tasks: per hotkey {old * 1000:.1f}ms, engine {new * 1000:.1f}ms "
+            f"({old / new:.1f}x), weight state {incremental * 1000:.1f}ms ({old / incremental:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
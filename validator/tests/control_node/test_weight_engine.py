@@ -0,0 +1,217 @@
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from validator.control_node.src.cycle import calculations, weight_engine
+from validator.models import Contender, PeriodScore, RewardData
+
+NETUID = 19
+TASKS = {"chat-llama-3-1-8b": 0.4, "chat-llama-3-1-70b": 0.35, "proteus-text-to-image": 0.25}
+
+
+def _make_data(seed: int, number_of_hotkeys: int) -> tuple[dict[str, list[RewardData]], list[Contender], list[PeriodScore]]:
+    rng = random.Random(seed)
+    hotkeys = [f"hotkey-{i}" for i in range(number_of_hotkeys)]
+
+    reward_datas: dict[str, list[RewardData]] = {}
+    contenders: list[Contender] = []
+    period_scores: list[PeriodScore] = []
+    for task in TASKS:
+        samples = []
+        for hotkey in rng.sample(hotkeys, k=rng.randint(1, number_of_hotkeys)):
+            for _ in range(rng.randint(1, 50)):
+                samples.append(
+                    RewardData(
+                        id=f"{hotkey}-{len(samples)}",
+                        task=task,
+                        node_id=hotkeys.index(hotkey),
+                        # Lots of ties, to check they're ranked the same way
+                        quality_score=rng.choice([0.0, 1.0, rng.random()]),
+                        validator_hotkey="validator",
+                        node_hotkey=hotkey,
+                        synthetic_query=True,
+                        metric=rng.choice([None, round(rng.random(), 1), rng.random()]),
+                    )
+                )
+        # Interleave the hotkeys, but keep each hotkey's samples in order
+        rng.shuffle(samples)
+        reward_datas[task] = samples
+
+        for hotkey in rng.sample(hotkeys, k=rng.randint(1, number_of_hotkeys)):
+            contenders.append(
+                Contender(
+                    node_hotkey=hotkey,
+                    node_id=hotkeys.index(hotkey),
+                    netuid=NETUID,
+                    task=task,
+                    raw_capacity=100,
+                    capacity=rng.choice([0.0, rng.uniform(1, 1000)]) if rng.random() < 0.1 else rng.uniform(1, 1000),
+                    capacity_to_score=10,
+                )
+            )
+            # No more than we load, so the engine sees everything the reference does
+            for _ in range(rng.randint(0, weight_engine.PERIOD_SCORE_LOOKBACK)):
+                period_scores.append(
+                    PeriodScore(
+                        hotkey=hotkey,
+                        task=task,
+                        period_score=None if rng.random() < 0.1 else rng.random(),
+                        consumed_capacity=0.0 if rng.random() < 0.1 else rng.uniform(0, 1000),
+                        created_at=datetime.now(),
+                    )
+                )
+    return reward_datas, contenders, period_scores
+
+
+@pytest.fixture
+def reference_data(monkeypatch):
+    def _use(reward_datas: dict[str, list[RewardData]], period_scores: list[PeriodScore]) -> None:
+        async def _get_reward_datas(psql_db, task: str, netuid: int) -> list[RewardData]:
+            return reward_datas[task]
+
+        async def _get_period_scores(psql_db, task: str, node_hotkey: str) -> list[PeriodScore]:
+            return [ps for ps in period_scores if ps.task == task and ps.hotkey == node_hotkey]
+
+        monkeypatch.setattr(calculations, "_get_reward_datas", _get_reward_datas)
+        monkeypatch.setattr(calculations, "_get_period_scores", _get_period_scores)
+
+    return _use
+
+
+async def _reference_weights(contenders: list[Contender]) -> tuple[list[str], list[float], dict[str, dict[str, float]]]:
+    """The per hotkey calculation, as calculate_scores_for_settings_weights did it before the engine"""
+    total_hotkey_scores: dict[str, float] = {}
+    scores_per_task = {}
+    for task, task_weight in TASKS.items():
+        combined_quality_scores, _, _ = await calculations._process_quality_scores(None, task, NETUID)
+        effective_volumes, _, _ = await calculations._calculate_effective_volumes_for_task(
+            None, contenders, task, combined_quality_scores
+        )
+        normalised_scores_for_task = await calculations._normalise_effective_volumes_for_task(effective_volumes)
+        scores_per_task[task] = normalised_scores_for_task
+        for hotkey, score in normalised_scores_for_task.items():
+            total_hotkey_scores[hotkey] = total_hotkey_scores.get(hotkey, 0) + score * task_weight
+
+    total_score = sum(total_hotkey_scores.values())
+    return list(total_hotkey_scores), [score / total_score for score in total_hotkey_scores.values()], scores_per_task
+
+
+def _period_score_histories(task: str, period_scores: list[PeriodScore]) -> list[dict]:
+    """As select_latest_period_scores returns them. The reference reads each hotkey's period scores in list order"""
+    histories: dict[str, dict] = {}
+    for ps in period_scores:
+        if ps.task != task or ps.period_score is None:
+            continue
+        history = histories.setdefault(ps.hotkey, {"hotkey": ps.hotkey, "period_scores": [], "consumed_capacities": []})
+        if len(history["period_scores"]) < weight_engine.PERIOD_SCORE_LOOKBACK:
+            history["period_scores"].append(ps.period_score)
+            history["consumed_capacities"].append(ps.consumed_capacity)
+    return list(histories.values())
+
+
+def _engine_weights(
+    reward_datas: dict[str, list[RewardData]], contenders: list[Contender], period_scores: list[PeriodScore]
+) -> tuple[list[str], list[float], dict[str, weight_engine.TaskScores]]:
+    task_scores = {}
+    for task, task_weight in TASKS.items():
+        histories = _period_score_histories(task, period_scores)
+        task_scores[task] = weight_engine.calculate_task_scores(
+            calculations._task_inputs(task, task_weight, reward_datas[task], contenders, histories)
+        )
+    hotkeys, weights = weight_engine.calculate_weights(list(task_scores.values()))
+    return hotkeys, weights, task_scores
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", range(20))
+async def test_engine_matches_per_hotkey_calculation(reference_data, seed: int):
+    reward_datas, contenders, period_scores = _make_data(seed, number_of_hotkeys=random.Random(seed).randint(1, 64))
+    reference_data(reward_datas, period_scores)
+
+    expected_hotkeys, expected_weights, expected_scores_per_task = await _reference_weights(contenders)
+    hotkeys, weights, task_scores = _engine_weights(reward_datas, contenders, period_scores)
+
+    assert hotkeys == expected_hotkeys
+    np.testing.assert_array_equal(weights, expected_weights)
+    for task, expected_scores in expected_scores_per_task.items():
+        assert task_scores[task].hotkeys.tolist() == list(expected_scores)
+        np.testing.assert_array_equal(task_scores[task].normalised_net_scores, list(expected_scores.values()))
+
+
+@pytest.mark.asyncio
+async def test_engine_matches_per_hotkey_breakdown(reference_data):
+    reward_datas, contenders, period_scores = _make_data(0, number_of_hotkeys=32)
+    reference_data(reward_datas, period_scores)
+    _, _, task_scores = _engine_weights(reward_datas, contenders, period_scores)
+
+    for task in TASKS:
+        combined_quality_scores, average_quality_scores, metric_bonuses = await calculations._process_quality_scores(
+            None, task, NETUID
+        )
+        _, normalised_period_scores, period_score_multipliers = await calculations._calculate_effective_volumes_for_task(
+            None, contenders, task, combined_quality_scores
+        )
+        scores = task_scores[task]
+        hotkeys = scores.hotkeys.tolist()
+        for values, expected in [
+            (scores.average_quality_scores, average_quality_scores),
+            (scores.metric_bonuses, metric_bonuses),
+            (scores.combined_quality_scores, combined_quality_scores),
+            (scores.normalised_period_scores, normalised_period_scores),
+            (scores.period_score_multipliers, period_score_multipliers),
+        ]:
+            np.testing.assert_array_equal(values, [expected[hotkey] for hotkey in hotkeys])
+
+
+def test_lookback_is_within_precision_of_the_whole_history():
+    rng = random.Random(0)
+    for _ in range(100):
+        period_scores = [
+            PeriodScore(
+                hotkey="a",
+                task="chat-llama-3-1-8b",
+                period_score=rng.random(),
+                consumed_capacity=rng.uniform(500, 1000),
+                created_at=datetime.now(),
+            )
+            for _ in range(rng.randint(1, 200))
+        ]
+        latest = period_scores[: weight_engine.PERIOD_SCORE_LOOKBACK]
+        score_matrix, capacity_matrix = weight_engine.period_score_matrices(
+            ["a"], ["a"], [[ps.period_score for ps in latest]], [[ps.consumed_capacity for ps in latest]]
+        )
+        normalised_period_scores, _ = weight_engine._normalised_period_scores(score_matrix, capacity_matrix)
+
+        # Capacities within a factor of 2 of each other, so the older period scores are worth at most twice as much
+        expected = calculations._normalise_period_scores(period_scores)
+        assert abs(normalised_period_scores[0] - expected) <= 2 * weight_engine.PERIOD_SCORE_PRECISION
+
+
+def test_no_weights_when_there_is_nothing_to_score():
+    inputs = weight_engine.TaskInputs(
+        task="chat-llama-3-1-8b",
+        weight=1.0,
+        hotkeys=np.array(["a", "b"]),
+        sample_codes=np.array([0, 1]),
+        sample_quality_scores=np.array([0.9, 0.8]),
+        sample_metrics=np.array([1.0, 2.0]),
+        contender_codes=np.array([0, 1]),
+        contender_capacities=np.array([0.0, 0.0]),
+        period_scores=np.full((2, 0), np.nan),
+        consumed_capacities=np.zeros((2, 0)),
+    )
+    task_scores = weight_engine.calculate_task_scores(inputs)
+
+    assert len(task_scores.hotkeys) == 0
+    assert weight_engine.calculate_weights([task_scores]) == ([], [])
+
+
+def test_period_score_matrices_are_padded():
+    period_scores, consumed_capacities = weight_engine.period_score_matrices(
+        ["c", "a", "b"], ["a", "b", "x"], [[0.5, 0.7], [0.1], [0.9]], [[10.0, 40.0], [20.0], [30.0]]
+    )
+
+    np.testing.assert_array_equal(period_scores, [[np.nan, np.nan], [0.5, 0.7], [0.1, np.nan]])
+    np.testing.assert_array_equal(consumed_capacities, [[0.0, 0.0], [10.0, 40.0], [20.0, 0.0]])
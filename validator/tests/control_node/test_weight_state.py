@@ -0,0 +1,153 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from validator.control_node.src.cycle import calculations, weight_engine, weight_state
+from validator.db.src.functions import RECENT_REWARD_DATA_WINDOW
+from validator.models import Contender, PeriodScore, RewardData
+
+NETUID = 19
+TASKS = {"chat-llama-3-1-8b": 0.4, "chat-llama-3-1-70b": 0.35, "proteus-text-to-image": 0.25}
+NOW = datetime(2024, 10, 20, 12)
+
+
+def _make_data(
+    seed: int, number_of_hotkeys: int
+) -> tuple[list[str], list[tuple[RewardData, datetime]], list[Contender], list[PeriodScore]]:
+    rng = random.Random(seed)
+    hotkeys = [f"hotkey-{i}" for i in range(number_of_hotkeys)]
+
+    reward_datas = []
+    for i in range(rng.randint(0, 200 * number_of_hotkeys)):
+        hotkey = rng.choice(hotkeys)
+        reward_data = RewardData(
+            id=f"{i:032x}",
+            task=rng.choice(list(TASKS)),
+            node_id=hotkeys.index(hotkey),
+            quality_score=rng.choice([0.0, 1.0, rng.random()]),
+            validator_hotkey="validator",
+            node_hotkey=hotkey,
+            synthetic_query=True,
+            metric=rng.choice([None, round(rng.random(), 1), rng.random()]),
+        )
+        # Some of it out of the window
+        stored_at = NOW - timedelta(hours=rng.uniform(0, 80))
+        reward_datas.append((reward_data, stored_at))
+
+    contenders = []
+    period_scores = []
+    for task in TASKS:
+        for hotkey in rng.sample(hotkeys, k=rng.randint(1, number_of_hotkeys)):
+            contenders.append(
+                Contender(
+                    node_hotkey=hotkey,
+                    node_id=hotkeys.index(hotkey),
+                    netuid=NETUID,
+                    task=task,
+                    raw_capacity=100,
+                    capacity=rng.choice([0.0, rng.uniform(1, 1000)]) if rng.random() < 0.1 else rng.uniform(1, 1000),
+                    capacity_to_score=10,
+                )
+            )
+            for i in range(rng.randint(0, 2 * weight_engine.PERIOD_SCORE_LOOKBACK)):
+                period_scores.append(
+                    PeriodScore(
+                        hotkey=hotkey,
+                        task=task,
+                        period_score=None if rng.random() < 0.1 else rng.random(),
+                        consumed_capacity=0.0 if rng.random() < 0.1 else rng.uniform(0, 1000),
+                        created_at=NOW - timedelta(hours=i),
+                    )
+                )
+    return hotkeys, reward_datas, contenders, period_scores
+
+
+def _recent_reward_datas(
+    task: str, node_hotkeys: list[str], reward_datas: list[tuple[RewardData, datetime]]
+) -> list[RewardData]:
+    """As select_recent_reward_data_for_hotkeys returns them"""
+    in_window = sorted(
+        [(stored_at, reward_data) for reward_data, stored_at in reward_datas if stored_at > NOW - RECENT_REWARD_DATA_WINDOW],
+        key=lambda sample: sample[0],
+        reverse=True,
+    )
+    samples = []
+    for hotkey in node_hotkeys:
+        hotkey_samples = [reward_data for _, reward_data in in_window if reward_data.node_hotkey == hotkey]
+        task_samples = [reward_data for reward_data in hotkey_samples if reward_data.task == task]
+        samples += task_samples
+        if len(task_samples) < weight_state.REWARD_SAMPLES_PER_HOTKEY:
+            samples += hotkey_samples[: weight_state.REWARD_SAMPLES_PER_HOTKEY - len(task_samples)]
+    return samples
+
+
+def _period_score_histories(task: str, period_scores: list[PeriodScore]) -> list[dict]:
+    """As select_latest_period_scores returns them"""
+    histories: dict[str, dict] = {}
+    for ps in sorted(period_scores, key=lambda ps: ps.created_at, reverse=True):
+        if ps.task != task or ps.period_score is None:
+            continue
+        history = histories.setdefault(ps.hotkey, {"hotkey": ps.hotkey, "period_scores": [], "consumed_capacities": []})
+        if len(history["period_scores"]) < weight_engine.PERIOD_SCORE_LOOKBACK:
+            history["period_scores"].append(ps.period_score)
+            history["consumed_capacities"].append(ps.consumed_capacity)
+    return list(histories.values())
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_state_matches_engine(seed: int):
+    hotkeys, reward_datas, contenders, period_scores = _make_data(seed, number_of_hotkeys=random.Random(seed).randint(1, 32))
+    # Node order isn't the order anything was scored in
+    node_hotkeys = random.Random(seed).sample(hotkeys, k=len(hotkeys))
+
+    state = weight_state.WeightState()
+    for reward_data, stored_at in reward_datas:
+        state.add_reward_data(
+            reward_data.id, reward_data.task, reward_data.node_hotkey, reward_data.quality_score, reward_data.metric, stored_at
+        )
+    for ps in sorted(period_scores, key=lambda ps: ps.created_at):
+        state.add_period_score(ps)
+    state.expire(NOW)
+
+    state_task_scores, engine_task_scores = [], []
+    for task, task_weight in TASKS.items():
+        state_task_scores.append(state.task_scores(task, task_weight, node_hotkeys, contenders))
+        inputs = calculations._task_inputs(
+            task,
+            task_weight,
+            _recent_reward_datas(task, node_hotkeys, reward_datas),
+            contenders,
+            _period_score_histories(task, period_scores),
+        )
+        engine_task_scores.append(weight_engine.calculate_task_scores(inputs))
+
+    for scores, expected in zip(state_task_scores, engine_task_scores):
+        assert scores.hotkeys.tolist() == expected.hotkeys.tolist()
+        for field in ["average_quality_scores", "metric_bonuses", "normalised_period_scores", "normalised_net_scores"]:
+            np.testing.assert_allclose(getattr(scores, field), getattr(expected, field), rtol=1e-12, atol=1e-15)
+
+    assert calculations._max_weight_difference(state_task_scores, engine_task_scores) <= calculations.WEIGHT_STATE_TOLERANCE
+
+
+def test_reward_data_is_only_counted_once():
+    state = weight_state.WeightState()
+    for _ in range(2):
+        state.add_reward_data("a", "chat-llama-3-1-8b", "hotkey", 0.5, 1.0, NOW)
+
+    assert state._quality_and_metric_scores("hotkey", "chat-llama-3-1-8b") == (0.5**1.5, 1.0)
+
+
+def test_running_sums_survive_expiry():
+    rng = random.Random(0)
+    state = weight_state.WeightState()
+    samples = [(f"{i}", rng.random(), rng.random(), NOW - timedelta(hours=rng.uniform(0, 100))) for i in range(500)]
+    for id, quality_score, metric, created_at in samples:
+        state.add_reward_data(id, "chat-llama-3-1-8b", "hotkey", quality_score, metric, created_at)
+    state.expire(NOW)
+
+    in_window = [sample for sample in samples if sample[3] > NOW - RECENT_REWARD_DATA_WINDOW]
+    average_quality_score, metric_score = state._quality_and_metric_scores("hotkey", "chat-llama-3-1-8b")
+    assert average_quality_score == pytest.approx(sum(q**1.5 for _, q, _, _ in in_window) / len(in_window), rel=1e-12)
+    assert metric_score == calculations._get_metric_score([m for _, _, m, _ in in_window])
@@ -0,0 +1,102 @@
+"""
+Checks the calculate_period_score SQL function which update_contenders_period_scores uses agrees with
+calculate_period_score in validator/models.py.
+
+Needs a postgres to run against, see conftest.py.
+"""
+
+import random
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+from validator.db.src.sql.contenders import update_contenders_period_scores  # noqa: E402
+from validator.models import calculate_period_score  # noqa: E402
+
+SCHEMA_PREFIX = "period_score_tests"
+NETUID = 19
+
+
+def _random_inputs(rng: random.Random) -> tuple[int, float, float, int, int]:
+    total_requests_made = rng.choice([0, 1, rng.randint(0, 1000)])
+    requests_429 = rng.randint(0, total_requests_made)
+    requests_500 = rng.randint(0, total_requests_made - requests_429)
+    capacity = rng.choice([0.0, 0.5, 1.0, rng.uniform(0, 1000)])
+    consumed_capacity = rng.choice([0.0, capacity, rng.uniform(0, 2 * capacity + 1)])
+    return total_requests_made, capacity, consumed_capacity, requests_429, requests_500
+
+
+def _expected(total_requests_made: int, capacity: float, consumed_capacity: float, requests_429: int, requests_500: int):
+    return calculate_period_score(
+        float(total_requests_made), float(capacity), float(consumed_capacity), float(requests_429), float(requests_500)
+    )
+
+
+@pytest.mark.asyncio
+async def test_sql_function_matches_python(postgres_url: str, schema: str):
+    rng = random.Random(0)
+    inputs = [_random_inputs(rng) for _ in range(2000)]
+
+    connection = await asyncpg.connect(postgres_url, server_settings={"search_path": schema})
+    try:
+        rows = await connection.fetch(
+            """
+            SELECT calculate_period_score(total, capacity, consumed, r429, r500) AS period_score
+            FROM unnest($1::int[], $2::float8[], $3::float8[], $4::int[], $5::int[])
+                WITH ORDINALITY AS inputs(total, capacity, consumed, r429, r500, n)
+            ORDER BY n
+            """,
+            *[list(column) for column in zip(*inputs)],
+        )
+    finally:
+        await connection.close()
+
+    for row, args in zip(rows, inputs):
+        expected = _expected(*args)
+        if expected is None:
+            assert row["period_score"] is None, args
+        else:
+            assert row["period_score"] == pytest.approx(expected, rel=1e-12, abs=1e-15), args
+
+
+@pytest.mark.asyncio
+async def test_update_contenders_period_scores(postgres_url: str, schema: str):
+    rng = random.Random(1)
+    contenders = {f"hotkey-{i}-task": _random_inputs(rng) for i in range(500)}
+
+    connection = await asyncpg.connect(postgres_url, server_settings={"search_path": schema})
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        await connection.executemany(
+            """
+            INSERT INTO contenders (
+                contender_id, node_hotkey, node_id, netuid, task, validator_hotkey, raw_capacity, capacity,
+                capacity_to_score, consumed_capacity, total_requests_made, requests_429, requests_500
+            ) VALUES ($1, $2, $3, $4, 'task', 'validator', $5, $5, 10, $6, $7, $8, $9)
+            """,
+            [
+                (contender_id, contender_id.removesuffix("-task"), i, NETUID, capacity, consumed, total, r429, r500)
+                for i, (contender_id, (total, capacity, consumed, r429, r500)) in enumerate(contenders.items())
+            ],
+        )
+        period_scores = await update_contenders_period_scores(connection, NETUID)
+        stored = {
+            row["contender_id"]: row["period_score"]
+            for row in await connection.fetch("SELECT contender_id, period_score FROM contenders")
+        }
+    finally:
+        await transaction.rollback()
+        await connection.close()
+
+    for contender_id, args in contenders.items():
+        expected = _expected(*args)
+        if expected is None:
+            assert stored[contender_id] is None, args
+        else:
+            assert stored[contender_id] == pytest.approx(expected, rel=1e-12, abs=1e-15), args
+    # Only the contenders which got a period score are returned
+    assert {f"{ps.hotkey}-task": ps.period_score for ps in period_scores} == {
+        contender_id: score for contender_id, score in stored.items() if score is not None
+    }
@@ -0,0 +1,225 @@
+"""
+Query plan regression tests for the validator's hot SQL.
+
+Loads a realistically sized dataset (256 nodes x 10 tasks x 7 days) into a scratch schema of a local postgres,
+runs each hot query under EXPLAIN (ANALYZE, BUFFERS) and fails if it does a big sequential scan, or goes over
+its time budget.
+
+Needs a postgres to run against, see conftest.py.
+Set PLAN_TEST_BUDGET_MULTIPLIER to loosen the time budgets on a slow machine.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Iterator
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+from validator.db.src.sql import partitions  # noqa: E402
+from validator.db.src.sql.contenders import (  # noqa: E402
+    fetch_hotkey_scores_for_task,
+    get_contenders_for_task,
+    select_latest_period_scores,
+)
+from validator.db.src.sql.rewards_and_scores import (  # noqa: E402
+    claim_task_for_scoring,
+    select_recent_reward_data_for_a_task,
+    select_recent_reward_data_for_hotkeys,
+)
+
+SCHEMA_PREFIX = "plan_tests"
+BUDGET_MULTIPLIER = float(os.getenv("PLAN_TEST_BUDGET_MULTIPLIER", 1.0))
+
+NUMBER_OF_NODES = 256
+NUMBER_OF_TASKS = 10
+DAYS_OF_DATA = 7
+TASK = "task-3"
+NODE_HOTKEY = "hotkey-42"
+
+# A sequential scan reading more rows than this is a missing (or unused) index
+MAX_SEQ_SCAN_ROWS = 5_000
+
+
+DATASET_SQL = f"""
+INSERT INTO nodes (
+    hotkey, coldkey, node_id, incentive, netuid, stake, trust, vtrust, last_updated, ip, ip_type, port, protocol, network,
+    symmetric_key, symmetric_key_uuid
+)
+SELECT
+    'hotkey-' || n, 'coldkey-' || n, n, 0, 19, 0, 0, 0, 0, '127.0.0.1', 4, 8000 + n, 4, 'test',
+    'key', CASE WHEN n % 8 = 0 THEN NULL ELSE 'uuid-' || n END
+FROM generate_series(0, {NUMBER_OF_NODES - 1}) n;
+
+INSERT INTO contenders (
+    contender_id, node_hotkey, node_id, netuid, task, validator_hotkey, raw_capacity, capacity, capacity_to_score,
+    consumed_capacity, total_requests_made, period_score
+)
+SELECT
+    'hotkey-' || n || '-task-' || t, 'hotkey-' || n, n, 19, 'task-' || t, 'validator', 100,
+    CASE WHEN n % 5 = 0 THEN 0 ELSE 100 END, 10, 0, (random() * 100)::int, random()
+FROM generate_series(0, {NUMBER_OF_NODES - 1}) n, generate_series(0, {NUMBER_OF_TASKS - 1}) t;
+
+-- A cycle an hour
+INSERT INTO contenders_history (
+    contender_id, node_hotkey, node_id, netuid, task, validator_hotkey, raw_capacity, capacity, capacity_to_score,
+    consumed_capacity, total_requests_made, period_score, created_at, updated_at
+)
+SELECT
+    c.contender_id, c.node_hotkey, c.node_id, c.netuid, c.task, c.validator_hotkey, c.raw_capacity, c.capacity,
+    c.capacity_to_score, c.consumed_capacity, c.total_requests_made, random(), h, h
+FROM contenders c,
+    generate_series(LOCALTIMESTAMP - INTERVAL '{DAYS_OF_DATA} days' + INTERVAL '1 hour', LOCALTIMESTAMP, INTERVAL '1 hour') h;
+
+-- A scored result an hour, per node & task
+INSERT INTO reward_data (
+    task, node_id, quality_score, validator_hotkey, node_hotkey, synthetic_query, response_time, volume, metric, created_at
+)
+SELECT 'task-' || t, n, random(), 'validator', 'hotkey-' || n, true, random() * 5, 100, random() * 50, h
+FROM generate_series(0, {NUMBER_OF_NODES - 1}) n, generate_series(0, {NUMBER_OF_TASKS - 1}) t,
+    generate_series(LOCALTIMESTAMP - INTERVAL '{DAYS_OF_DATA} days' + INTERVAL '1 hour', LOCALTIMESTAMP, INTERVAL '1 hour') h;
+
+INSERT INTO tasks (task_name, checking_data, node_hotkey, created_at)
+SELECT 'task-' || t, '{{"payload": "' || repeat('x', 1000) || '"}}', 'hotkey-' || n, LOCALTIMESTAMP - k * INTERVAL '30 minutes'
+FROM generate_series(0, {NUMBER_OF_NODES - 1}) n, generate_series(0, {NUMBER_OF_TASKS - 1}) t, generate_series(0, 3) k;
+
+INSERT INTO task_scoring_counts (task, node_hotkey, scored_count)
+SELECT 'task-' || t, 'hotkey-' || n, (random() * 50)::int
+FROM generate_series(0, {NUMBER_OF_NODES - 1}) n, generate_series(0, {NUMBER_OF_TASKS - 1}) t;
+
+ANALYZE;
+"""
+
+
+async def setup_schema(connection: Any) -> None:
+    # On an empty database the migrations only create partitions from now on
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for table in ("reward_data", "contenders_history"):
+        for days_ago in range(DAYS_OF_DATA + 1):
+            start = today - timedelta(days=days_ago)
+            name = partitions.partition_name(table, start, "%Y%m%d")
+            await partitions.create_partition(connection, table, name, start, start + timedelta(days=1))
+    this_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for hours_ago in range(1, 3):
+        start = this_hour - timedelta(hours=hours_ago)
+        name = partitions.partition_name("tasks", start, "%Y%m%d%H")
+        await partitions.create_partition(connection, "tasks", name, start, start + timedelta(hours=1))
+
+    await connection.execute(DATASET_SQL)
+
+
+class _ExplainingConnection:
+    """Stands in for a connection: runs every query under EXPLAIN ANALYZE and keeps the plans, instead of returning rows"""
+
+    def __init__(self, connection: Any):
+        self.connection = connection
+        self.plans: list[dict] = []
+
+    async def _explain(self, query: str, *args: Any) -> None:
+        explained = await self.connection.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *args)
+        self.plans.append(json.loads(explained)[0])
+
+    async def fetch(self, query: str, *args: Any) -> list:
+        await self._explain(query, *args)
+        return []
+
+    async def fetchrow(self, query: str, *args: Any) -> None:
+        await self._explain(query, *args)
+        return None
+
+
+async def _explain(postgres_url: str, schema: str, run_query: Callable[[Any], Awaitable[Any]]) -> list[dict]:
+    connection = await asyncpg.connect(postgres_url, server_settings={"search_path": schema})
+    try:
+        # EXPLAIN ANALYZE really runs the query - don't let a claim delete anything
+        transaction = connection.transaction()
+        await transaction.start()
+        try:
+            explaining_connection = _ExplainingConnection(connection)
+            await run_query(explaining_connection)
+            return explaining_connection.plans
+        finally:
+            await transaction.rollback()
+    finally:
+        await connection.close()
+
+
+def _walk(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _big_seq_scans(plan: dict) -> list[str]:
+    big_scans = []
+    for node in _walk(plan["Plan"]):
+        if node["Node Type"] != "Seq Scan":
+            continue
+        rows_read = (node["Actual Rows"] + node.get("Rows Removed by Filter", 0)) * node["Actual Loops"]
+        if rows_read > MAX_SEQ_SCAN_ROWS:
+            big_scans.append(f"{node['Relation Name']} ({rows_read} rows)")
+    return big_scans
+
+
+def _scanned_relations(plan: dict) -> set[str]:
+    return {node["Relation Name"] for node in _walk(plan["Plan"]) if "Relation Name" in node}
+
+
+HOT_QUERIES: dict[str, tuple[Callable[[Any], Awaitable[Any]], float]] = {
+    # name: (query, time budget in ms)
+    "get_contenders_for_task": (lambda connection: get_contenders_for_task(connection, TASK, 5), 25),
+    "select_recent_reward_data_for_a_task": (
+        lambda connection: select_recent_reward_data_for_a_task(connection, TASK, datetime.now() - timedelta(hours=72)),
+        150,
+    ),
+    "select_recent_reward_data_for_a_task_and_hotkey": (
+        lambda connection: select_recent_reward_data_for_a_task(
+            connection, TASK, datetime.now() - timedelta(hours=72), NODE_HOTKEY
+        ),
+        20,
+    ),
+    "select_recent_reward_data_for_hotkeys": (
+        lambda connection: select_recent_reward_data_for_hotkeys(
+            connection, TASK, datetime.now() - timedelta(hours=72), [f"hotkey-{n}" for n in range(NUMBER_OF_NODES)], 50
+        ),
+        250,
+    ),
+    "fetch_hotkey_scores_for_task": (lambda connection: fetch_hotkey_scores_for_task(connection, TASK, NODE_HOTKEY), 20),
+    "select_latest_period_scores": (
+        lambda connection: select_latest_period_scores(
+            connection, [TASK] * NUMBER_OF_NODES, [f"hotkey-{n}" for n in range(NUMBER_OF_NODES)], 20
+        ),
+        150,
+    ),
+    "claim_task_for_scoring": (lambda connection: claim_task_for_scoring(connection, TASK), 30),
+}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query_name", list(HOT_QUERIES))
+async def test_hot_query_plan(postgres_url: str, schema: str, query_name: str):
+    run_query, budget_ms = HOT_QUERIES[query_name]
+
+    plans = await _explain(postgres_url, schema, run_query)
+
+    assert plans, f"{query_name} didn't run any queries"
+    for plan in plans:
+        assert not _big_seq_scans(plan), f"{query_name} does sequential scans on {_big_seq_scans(plan)}"
+        assert plan["Execution Time"] <= budget_ms * BUDGET_MULTIPLIER, (
+            f"{query_name} took {plan['Execution Time']:.1f}ms, over its budget of {budget_ms * BUDGET_MULTIPLIER:.0f}ms"
+        )
+
+
+@pytest.mark.asyncio
+async def test_recent_reward_data_only_reads_recent_partitions(postgres_url: str, schema: str):
+    plans = await _explain(
+        postgres_url,
+        schema,
+        lambda connection: select_recent_reward_data_for_a_task(connection, TASK, datetime.now() - timedelta(hours=72)),
+    )
+
+    reward_data_partitions = {relation for relation in _scanned_relations(plans[0]) if relation.startswith("reward_data_p")}
+    # 72 hours can span at most 4 daily partitions
+    assert 0 < len(reward_data_partitions) <= 4, reward_data_partitions
@@ -0,0 +1,123 @@
+"""
+Checks symmetric keys from handshakes survive a metagraph refresh, unless they've expired or the node has moved.
+
+Needs a postgres to run against, see conftest.py.
+"""
+
+from datetime import timedelta
+from typing import Any
+
+import pytest
+from cryptography.fernet import Fernet
+
+asyncpg = pytest.importorskip("asyncpg")
+
+from validator.db.src.sql.nodes import (  # noqa: E402
+    get_node,
+    get_unexpired_symmetric_keys,
+    migrate_nodes_to_history,
+    restore_symmetric_keys,
+)
+
+SCHEMA_PREFIX = "symmetric_key_tests"
+NETUID = 19
+
+INSERT_NODE_SQL = """
+INSERT INTO nodes (
+    hotkey, coldkey, node_id, incentive, netuid, stake, trust, vtrust, last_updated, ip, ip_type, port, protocol, network,
+    symmetric_key, symmetric_key_uuid, symmetric_key_expires_at
+)
+VALUES ($1, 'coldkey', $2, 0, $3, 0, 0, 0, 0, $4, 4, $5, 4, 'test', $6, $7, (NOW() AT TIME ZONE 'UTC') + $8::interval)
+"""
+
+
+class ConnectionDB:
+    """The bits of PSQLDB that get_node uses, on a single connection (so it sees the test's transaction)"""
+
+    def __init__(self, connection: Any):
+        self.connection = connection
+
+    async def fetchone(self, query: str, *args: Any) -> dict[str, Any] | None:
+        row = await self.connection.fetchrow(query, *args)
+        return dict(row) if row else None
+
+    async def fetchall(self, query: str, *args: Any) -> list[dict[str, Any]]:
+        return [dict(row) for row in await self.connection.fetch(query, *args)]
+
+
+@pytest.mark.asyncio
+async def test_symmetric_keys_survive_a_node_refresh(postgres_url: str, schema: str):
+    connection = await asyncpg.connect(postgres_url, server_settings={"search_path": schema})
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        # hotkey: (ip, port, key, ttl) before the refresh
+        before = {
+            "unchanged": ("1.1.1.1", 8000, "key-unchanged", timedelta(hours=1)),
+            "moved": ("2.2.2.2", 8000, "key-moved", timedelta(hours=1)),
+            "new_port": ("3.3.3.3", 8000, "key-new-port", timedelta(hours=1)),
+            "expired": ("4.4.4.4", 8000, "key-expired", timedelta(hours=-1)),
+            "deregistered": ("5.5.5.5", 8000, "key-deregistered", timedelta(hours=1)),
+        }
+        await connection.executemany(
+            INSERT_NODE_SQL,
+            [
+                (hotkey, node_id, NETUID, ip, port, key, f"uuid-{hotkey}", ttl)
+                for node_id, (hotkey, (ip, port, key, ttl)) in enumerate(before.items())
+            ],
+        )
+
+        # As refresh_nodes.store_nodes does it
+        symmetric_keys = await get_unexpired_symmetric_keys(connection, NETUID)
+        await migrate_nodes_to_history(connection)
+        after = {
+            "unchanged": ("1.1.1.1", 8000),
+            "moved": ("9.9.9.9", 8000),
+            "new_port": ("3.3.3.3", 8001),
+            "expired": ("4.4.4.4", 8000),
+            "new": ("6.6.6.6", 8000),
+        }
+        await connection.executemany(
+            INSERT_NODE_SQL,
+            [
+                (hotkey, node_id, NETUID, ip, port, None, None, timedelta(0))
+                for node_id, (hotkey, (ip, port)) in enumerate(after.items())
+            ],
+        )
+        await restore_symmetric_keys(connection, symmetric_keys)
+
+        keys = {
+            row["hotkey"]: row["symmetric_key"]
+            for row in await connection.fetch("SELECT hotkey, symmetric_key FROM nodes WHERE netuid = $1", NETUID)
+        }
+        unexpired = {row["hotkey"] for row in await get_unexpired_symmetric_keys(connection, NETUID)}
+    finally:
+        await transaction.rollback()
+        await connection.close()
+
+    assert keys == {"unchanged": "key-unchanged", "moved": None, "new_port": None, "expired": None, "new": None}
+    assert unexpired == {"unchanged"}
+
+
+@pytest.mark.asyncio
+async def test_get_node_ignores_an_expired_symmetric_key(postgres_url: str, schema: str):
+    connection = await asyncpg.connect(postgres_url, server_settings={"search_path": schema})
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        await connection.executemany(
+            INSERT_NODE_SQL,
+            [
+                ("fresh", 0, NETUID, "1.1.1.1", 8000, Fernet.generate_key().decode(), "uuid-fresh", timedelta(hours=1)),
+                ("expired", 1, NETUID, "2.2.2.2", 8000, Fernet.generate_key().decode(), "uuid-expired", timedelta(hours=-1)),
+            ],
+        )
+        fresh = await get_node(ConnectionDB(connection), 0, NETUID)  # type: ignore
+        expired = await get_node(ConnectionDB(connection), 1, NETUID)  # type: ignore
+    finally:
+        await transaction.rollback()
+        await connection.close()
+
+    assert fresh is not None and fresh.fernet is not None
+    assert fresh.symmetric_key_uuid == "uuid-fresh"
+    assert expired is None
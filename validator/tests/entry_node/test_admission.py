@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException  # noqa: E402
+
+from validator.entry_node.src.core import admission  # noqa: E402
+from validator.utils.query import load_reporting  # noqa: E402
+from validator.utils.redis import query_queue  # noqa: E402
+
+TASK = "chat-llama-3-1-8b"
+
+
+class FakeStreamRedis:
+    """Just enough of a redis for StreamQueryQueue.organic_depth: a stream of `length` entries, `pending` of them delivered"""
+
+    def __init__(self, length: int, pending: int):
+        self.length = length
+        self.pending = pending
+
+    async def xlen(self, name: str) -> int:
+        return self.length
+
+    async def xpending(self, name: str, groupname: str) -> dict:
+        return {"pending": self.pending, "min": None, "max": None, "consumers": []}
+
+
+@pytest.fixture
+def stream_backend(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("QUERY_QUEUE_BACKEND", query_queue.STREAM_BACKEND)
+
+
+def _set_load(monkeypatch: pytest.MonkeyPatch, in_flight: int, slots: int, throughput: float) -> None:
+    async def get_query_node_load(redis_db) -> load_reporting.QueryNodeLoad:
+        return load_reporting.QueryNodeLoad(
+            in_flight=in_flight, slots=slots, query_nodes=2, throughput_by_task={TASK: throughput}
+        )
+
+    monkeypatch.setattr(admission.load_reporting, "get_query_node_load", get_query_node_load)
+
+
+@pytest.mark.asyncio
+async def test_in_flight_jobs_are_not_counted_as_queued(monkeypatch: pytest.MonkeyPatch, stream_backend: None):
+    # 60 of 100 slots busy and nothing waiting - the 60 jobs being processed are still in the stream until acked
+    _set_load(monkeypatch, in_flight=60, slots=100, throughput=50.0)
+    redis_db = FakeStreamRedis(length=60, pending=60)
+    controller = admission.AdmissionController(cache_seconds=60)
+
+    for _ in range(40):
+        await controller.admit(redis_db, TASK)  # type: ignore
+
+    assert controller._organic_depth == 0
+    assert controller.estimated_queue_wait() == pytest.approx(1 / 50.0)
+
+
+@pytest.mark.asyncio
+async def test_sheds_when_the_queue_is_backed_up(monkeypatch: pytest.MonkeyPatch, stream_backend: None):
+    _set_load(monkeypatch, in_flight=100, slots=100, throughput=50.0)
+    redis_db = FakeStreamRedis(length=300, pending=100)
+    controller = admission.AdmissionController(cache_seconds=60)
+
+    with pytest.raises(HTTPException) as e:
+        await controller.admit(redis_db, TASK)  # type: ignore
+
+    assert e.value.status_code == 429
+    assert controller._organic_depth == 200
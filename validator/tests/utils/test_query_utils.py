@@ -0,0 +1,55 @@
+import json
+
+from validator.utils.query.query_utils import SSERelay, extract_delta_content
+
+
+def _event(content: str | None) -> str:
+    return f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n"
+
+
+def test_extract_delta_content():
+    assert extract_delta_content(json.dumps({"choices": [{"delta": {"content": 'a "b" \\n ü'}}]})) == 'a "b" \\n ü'
+    assert extract_delta_content(json.dumps({"choices": [{"delta": {"content": None}}]})) == ""
+    assert extract_delta_content(json.dumps({"choices": [{"delta": {"role": "assistant"}}]})) is None
+    assert extract_delta_content('{"error": "oops"}') is None
+
+
+def test_relay_forwards_events_verbatim_and_counts_characters():
+    relay = SSERelay()
+    stream = _event("Hello") + _event(" world") + "data: [DONE]\n\n"
+
+    forwarded = relay.feed(stream)
+
+    assert forwarded == _event("Hello") + _event(" world")
+    assert relay.done
+    assert relay.valid
+    assert relay.character_count == len("Hello world")
+    assert json.loads(relay.formatted_response()) == [
+        {"choices": [{"delta": {"content": "Hello"}}]},
+        {"choices": [{"delta": {"content": " world"}}]},
+    ]
+
+
+def test_relay_buffers_events_split_across_chunks():
+    relay = SSERelay()
+    event = _event("split")
+
+    assert relay.feed(event[:10]) == ""
+    assert relay.feed(event[10:]) == event
+    assert relay.character_count == len("split")
+
+
+def test_relay_marks_invalid_events():
+    relay = SSERelay()
+
+    assert relay.feed('data: {"error": "oops"}\n\n') == ""
+    assert not relay.valid
+    assert relay.formatted_response() is None
+
+
+def test_relay_finish_handles_unterminated_last_event():
+    relay = SSERelay()
+    event = _event("end")
+
+    assert relay.feed(event.rstrip("\n")) == ""
+    assert relay.finish() == event
@@ -1,9 +1,10 @@
 from dataclasses import asdict
 import json
+import time
 from validator.db.src.sql.contenders import fetch_all_contenders, fetch_contender
 from validator.db.src.database import PSQLDB
 from validator.models import Contender
-from validator.utils.redis import redis_constants as rcst, redis_utils as rutils, redis_dataclasses as rdc
+from validator.utils.redis import redis_constants as rcst, redis_utils as rutils, redis_dataclasses as rdc, query_queue
 from redis.asyncio import Redis
 from fiber.logging_utils import get_logger
 import uuid
@@ -11,10 +12,23 @@ from validator.utils.generic import generic_constants as gcst
 
 logger = get_logger(__name__)
 
+# ZRANGE + HMGET in a single round trip
+_TOP_CONTENDERS_SCRIPT = """
+local contender_ids = redis.call('ZRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #contender_ids == 0 then
+    return {}
+end
+return redis.call('HMGET', KEYS[2], unpack(contender_ids))
+"""
+
 
 def construct_synthetic_query_message(task: str) -> str:
     return json.dumps(
-        asdict(rdc.QueryQueueMessage(query_payload={}, query_type=gcst.SYNTHETIC, task=task, job_id=uuid.uuid4().hex))
+        asdict(
+            rdc.QueryQueueMessage(
+                query_payload={}, query_type=gcst.SYNTHETIC, task=task, job_id=uuid.uuid4().hex, enqueued_at=time.time()
+            )
+        )
     )
 
 
@@ -31,7 +45,7 @@ async def load_contenders(psql_db: PSQLDB) -> list[Contender]:
 
 async def add_synthetic_query_to_queue(redis_db: Redis, task: str, max_length: int) -> None:
     message = construct_synthetic_query_message(task)
-    await rutils.add_str_to_redis_list(redis_db, rcst.QUERY_QUEUE_KEY, message, max_length)
+    await query_queue.get_query_queue(redis_db).push_synthetic(message, max_len=max_length)
 
 
 async def load_query_queue(redis_db: Redis) -> list[str]:
@@ -44,3 +58,52 @@ async def load_synthetic_scheduling_queue(redis_db: Redis) -> list[str]:
 
 async def get_synthetic_payload(redis_db: Redis, task: str) -> dict:
     return await rutils.json_load_from_redis(redis_db, rcst.SYNTHETIC_DATA_KEY + ":" + task, default={})
+
+
+def _contender_ranking_key(task: str) -> str:
+    return f"{rcst.CONTENDER_RANKING_KEY}:{task}"
+
+
+def _contender_info_key(task: str) -> str:
+    return f"{rcst.CONTENDER_INFO_KEY}:{task}"
+
+
+async def store_contender_rankings(redis_db: Redis, contenders: list[Contender], tasks: list[str]) -> None:
+    """
+    Rebuilds the per task sorted sets of contenders which can be queried, scored by total_requests_made.
+    Shared by all query nodes, so selecting contenders is one redis call rather than a join in postgres.
+    Pass the contenders from fetch_contenders_to_rank, which only returns those whose node we have a symmetric key for.
+    """
+    contenders_by_task: dict[str, list[Contender]] = {task: [] for task in tasks}
+    for contender in contenders:
+        if contender.capacity > 0:
+            contenders_by_task.setdefault(contender.task, []).append(contender)
+
+    async with redis_db.pipeline(transaction=True) as pipe:
+        for task, task_contenders in contenders_by_task.items():
+            pipe.delete(_contender_ranking_key(task), _contender_info_key(task))
+            if not task_contenders:
+                continue
+            pipe.zadd(
+                _contender_ranking_key(task),
+                {contender.id: contender.total_requests_made for contender in task_contenders},
+            )
+            pipe.hset(
+                _contender_info_key(task),
+                mapping={contender.id: contender.model_dump_json() for contender in task_contenders},
+            )
+        await pipe.execute()
+
+    logger.info(f"Stored contender rankings for {len(contenders_by_task)} tasks")
+
+
+async def get_contenders_from_ranking(redis_db: Redis, task: str, top_x: int = 5) -> list[Contender]:
+    raw_contenders = await redis_db.eval(
+        _TOP_CONTENDERS_SCRIPT, 2, _contender_ranking_key(task), _contender_info_key(task), top_x
+    )  # type: ignore
+    return [Contender.model_validate_json(raw_contender) for raw_contender in raw_contenders if raw_contender is not None]
+
+
+async def bump_contender_ranking(redis_db: Redis, contender: Contender) -> None:
+    # XX so we never resurrect a contender which was dropped by a rebuild
+    await redis_db.zadd(_contender_ranking_key(contender.task), {contender.id: 1}, xx=True, incr=True)
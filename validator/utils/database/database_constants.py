@@ -11,6 +11,7 @@ CONTENDERS_WEIGHTS_STATS_TABLE = "contenders_weights_stats"
 NODES_WEIGHTS_TABLE = "nodes_weights"
 
 TABLE_TASKS = "tasks"
+TABLE_TASK_SCORING_COUNTS = "task_scoring_counts"
 TABLE_REWARD_DATA = "reward_data"
 TABLE_UID_RECORDS = "uid_records"
 
@@ -52,6 +53,7 @@ PROTOCOL = "protocol"
 NETWORK = "network"
 SYMMETRIC_KEY = "symmetric_key"
 SYMMETRIC_KEY_UUID = "symmetric_key_uuid"
+SYMMETRIC_KEY_EXPIRES_AT = "symmetric_key_expires_at"
 OUR_VALIDATOR = "our_validator"
 CREATED_AT = "created_at"
 
@@ -127,6 +129,9 @@ COLUMN_MINER_HOTKEY = "node_hotkey"
 COLUMN_TASK_NAME = "task_name"
 COLUMN_CHECKING_DATA = "checking_data"
 
+# `task_scoring_counts` table column names
+COLUMN_SCORED_COUNT = "scored_count"
+
 # `reward_data` table column names
 COLUMN_TASK = "task"
 COLUMN_NODE_ID = "node_id"
@@ -0,0 +1,97 @@
+"""
+How busy the query nodes are, shared through redis so the entry node can do admission control.
+
+Query nodes write:
+- their in flight count & number of slots into the QUERY_NODE_LOAD hash (one field per query node process)
+- how many jobs they finished per task into a hash per THROUGHPUT_BUCKET_SECONDS bucket
+
+The entry node reads both back with `get_query_node_load`.
+"""
+
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass, field
+
+from redis.asyncio import Redis
+
+from validator.utils.redis import redis_constants as rcst
+
+THROUGHPUT_BUCKET_SECONDS = 5
+THROUGHPUT_WINDOW_BUCKETS = 6
+# Reports older than this are from query nodes which have gone away
+LOAD_REPORT_MAX_AGE = 10
+
+
+@dataclass
+class QueryNodeLoad:
+    in_flight: int = 0
+    slots: int = 0
+    query_nodes: int = 0
+    # Jobs finished per second, over the last THROUGHPUT_WINDOW_BUCKETS complete buckets
+    throughput_by_task: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def free_slots(self) -> int:
+        return max(self.slots - self.in_flight, 0)
+
+    @property
+    def throughput(self) -> float:
+        return sum(self.throughput_by_task.values())
+
+
+def reporter_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _throughput_key(bucket: int) -> str:
+    return f"{rcst.TASK_THROUGHPUT_KEY}:{bucket}"
+
+
+async def publish_query_node_load(
+    redis_db: Redis, name: str, in_flight: int, slots: int, completions_by_task: dict[str, int]
+) -> None:
+    now = time.time()
+    bucket = int(now // THROUGHPUT_BUCKET_SECONDS)
+    async with redis_db.pipeline(transaction=False) as pipe:
+        pipe.hset(rcst.QUERY_NODE_LOAD_KEY, name, json.dumps({"in_flight": in_flight, "slots": slots, "reported_at": now}))
+        pipe.expire(rcst.QUERY_NODE_LOAD_KEY, LOAD_REPORT_MAX_AGE * 6)
+        if completions_by_task:
+            for task, completions in completions_by_task.items():
+                pipe.hincrby(_throughput_key(bucket), task, completions)
+            pipe.expire(_throughput_key(bucket), THROUGHPUT_BUCKET_SECONDS * (THROUGHPUT_WINDOW_BUCKETS + 2))
+        await pipe.execute()
+
+
+async def remove_query_node_load(redis_db: Redis, name: str) -> None:
+    await redis_db.hdel(rcst.QUERY_NODE_LOAD_KEY, name)
+
+
+async def get_query_node_load(redis_db: Redis) -> QueryNodeLoad:
+    now = time.time()
+    current_bucket = int(now // THROUGHPUT_BUCKET_SECONDS)
+    # Skip the current bucket, it's only partly filled
+    buckets = range(current_bucket - THROUGHPUT_WINDOW_BUCKETS, current_bucket)
+
+    async with redis_db.pipeline(transaction=False) as pipe:
+        pipe.hgetall(rcst.QUERY_NODE_LOAD_KEY)
+        for bucket in buckets:
+            pipe.hgetall(_throughput_key(bucket))
+        raw_loads, *raw_buckets = await pipe.execute()
+
+    load = QueryNodeLoad()
+    for raw_load in raw_loads.values():
+        report = json.loads(raw_load)
+        if now - report["reported_at"] > LOAD_REPORT_MAX_AGE:
+            continue
+        load.in_flight += report["in_flight"]
+        load.slots += report["slots"]
+        load.query_nodes += 1
+
+    window_seconds = THROUGHPUT_BUCKET_SECONDS * THROUGHPUT_WINDOW_BUCKETS
+    for raw_bucket in raw_buckets:
+        for raw_task, completions in raw_bucket.items():
+            task = raw_task.decode() if isinstance(raw_task, bytes) else raw_task
+            load.throughput_by_task[task] = load.throughput_by_task.get(task, 0.0) + int(completions) / window_seconds
+    return load
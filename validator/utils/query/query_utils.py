@@ -1,8 +1,11 @@
 
 import json
+from dataclasses import dataclass, field
+from json.decoder import scanstring  # type: ignore
 from typing import Any
 
-
+SSE_EVENT_SEPARATOR = "\n\n"
+SSE_DONE = "[DONE]"
 
 
 def load_sse_jsons(chunk: str) -> list[dict[str, Any]] | dict[str, str]:
@@ -21,4 +24,86 @@ def load_sse_jsons(chunk: str) -> list[dict[str, Any]] | dict[str, str]:
     except json.JSONDecodeError:
         ...
 
-    return []
\ No newline at end of file
+    return []
+
+
+def extract_delta_content(sse_data: str) -> str | None:
+    """
+    Pulls choices[0].delta.content out of an SSE json payload without building the whole dict.
+    Returns None if there is no (string) content, a null content counts as empty.
+    """
+    delta_index = sse_data.find('"delta"')
+    if delta_index == -1:
+        return None
+    content_index = sse_data.find('"content"', delta_index)
+    if content_index == -1:
+        return None
+    colon_index = sse_data.find(":", content_index + 9)
+    if colon_index == -1:
+        return None
+    value_index = colon_index + 1
+    while value_index < len(sse_data) and sse_data[value_index] in " \t\r\n":
+        value_index += 1
+    if sse_data.startswith("null", value_index):
+        return ""
+    if value_index >= len(sse_data) or sse_data[value_index] != '"':
+        return None
+    try:
+        content, _ = scanstring(sse_data, value_index + 1)
+    except ValueError:
+        return None
+    return content
+
+
+@dataclass
+class SSERelay:
+    """
+    Relays a miner's SSE stream verbatim, doing just enough work to validate each event,
+    count the characters of content, and keep the raw jsons around in case we score the result.
+    Events split across chunks are buffered until they're complete.
+    """
+
+    character_count: int = 0
+    raw_jsons: list[str] = field(default_factory=list)
+    # Whether the last event we saw was valid
+    valid: bool = False
+    done: bool = False
+    _pending: str = ""
+
+    def feed(self, chunk: str) -> str:
+        """Returns the complete, valid events from the chunk, ready to forward as they are"""
+        if self.done:
+            return ""
+        self._pending += chunk
+        *events, self._pending = self._pending.split(SSE_EVENT_SEPARATOR)
+
+        events_to_forward = []
+        for event in events:
+            if event == "":
+                continue
+            prefix, _, data = event.partition(":")
+            data = data.strip()
+            if data == SSE_DONE:
+                self.done = True
+                break
+            content = extract_delta_content(data) if prefix == "data" and data.startswith("{") else None
+            if content is None:
+                self.valid = False
+                break
+            self.valid = True
+            self.character_count += len(content)
+            self.raw_jsons.append(data)
+            events_to_forward.append(event + SSE_EVENT_SEPARATOR)
+        return "".join(events_to_forward)
+
+    def finish(self) -> str:
+        """Handles a last event which didn't end with a separator"""
+        if not self._pending.strip():
+            return ""
+        return self.feed(SSE_EVENT_SEPARATOR)
+
+    def formatted_response(self) -> str | None:
+        """The raw jsons as one json array - only decoded if the result actually gets stored for scoring"""
+        if not self.raw_jsons:
+            return None
+        return "[" + ",".join(self.raw_jsons) + "]"
@@ -0,0 +1,338 @@
+"""
+The query queue between the entry / control nodes and the query nodes.
+
+Two backends, picked with QUERY_QUEUE_BACKEND:
+- "list" (default): a plain redis list. Simple, but a job popped by a query node which then
+  crashes is gone, and there's no way to see what's in flight.
+- "stream": a redis stream with a consumer group. Jobs are acked explicitly once processed,
+  jobs left pending by a dead query node are reclaimed with XAUTOCLAIM after a deadline,
+  and we can report per consumer lag - so query nodes can be scaled horizontally safely. Consumers left
+  behind by query nodes which have gone away are removed from the group once nothing is pending for them.
+  Needs Redis 6.2 or later (XAUTOCLAIM); the group lag in get_lag_stats is only reported by Redis 7 or later.
+
+Either way, organic and synthetic queries go into separate lanes (keys). Query nodes always drain
+the organic lane first, apart from a share of pops (QUERY_QUEUE_SYNTHETIC_SHARE) reserved for
+synthetics so scoring keeps progressing under organic load. The synthetic lane is capped - both backends
+keep the newest synthetics - and can be cleared without touching organic jobs.
+"""
+
+import os
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from fiber.logging_utils import get_logger
+
+from validator.utils.generic import generic_constants as gcst
+from validator.utils.redis import redis_constants as rcst, redis_utils as rutils
+
+logger = get_logger(__name__)
+
+LIST_BACKEND = "list"
+STREAM_BACKEND = "stream"
+
+QUERY_STREAM_GROUP = "query_nodes"
+STREAM_FIELD = b"message"
+# Approximate cap so an idle validator's stream doesn't grow forever
+STREAM_MAX_LEN = 10_000
+DEFAULT_CLAIM_IDLE_SECONDS = 120
+CLAIM_CHECK_INTERVAL = 5
+# Live consumers read every few seconds, so one idle for this long belongs to a query node which has gone away
+DEAD_CONSUMER_IDLE_SECONDS = 60 * 30
+CONSUMER_CLEANUP_INTERVAL = 60 * 5
+DEFAULT_SYNTHETIC_SHARE = 0.1
+
+LIST_KEYS = {gcst.ORGANIC: rcst.QUERY_QUEUE_KEY, gcst.SYNTHETIC: rcst.SYNTHETIC_QUERY_QUEUE_KEY}
+STREAM_KEYS = {gcst.ORGANIC: rcst.QUERY_STREAM_KEY, gcst.SYNTHETIC: rcst.SYNTHETIC_QUERY_STREAM_KEY}
+
+
+@dataclass
+class QueuedQuery:
+    message: bytes | str
+    # Only set for backends which need an explicit ack
+    delivery_id: bytes | str | None = None
+    redelivered: bool = False
+    lane: str = gcst.ORGANIC
+
+
+class _SyntheticShare:
+    """
+    Credit based scheduling: every job popped earns `share` credit, and a whole credit buys a synthetic ahead of organics.
+    Pops which come back empty earn nothing, so an idle spell doesn't turn into a burst of synthetics afterwards.
+    """
+
+    def __init__(self, share: float):
+        self.share = min(max(share, 0.0), 1.0)
+        self._credit = 0.0
+
+    def synthetic_due(self) -> bool:
+        # Summing shares of e.g. 0.1 falls just short of 1
+        return self._credit >= 1.0 - 1e-9
+
+    def took(self, lane: str) -> None:
+        self._credit += self.share
+        if lane == gcst.SYNTHETIC:
+            self._credit -= 1.0
+        self._credit = min(max(self._credit, 0.0), 1.0)
+
+
+class ListQueryQueue:
+    def __init__(self, redis_db: Redis, synthetic_share: float = DEFAULT_SYNTHETIC_SHARE):
+        self.redis_db = redis_db
+        self._synthetic_share = _SyntheticShare(synthetic_share)
+
+    async def push_organic(self, message: str) -> None:
+        with rutils.REDIS_CALL_SECONDS.time("push_organic"):
+            await self.redis_db.lpush(LIST_KEYS[gcst.ORGANIC], message)  # type: ignore
+
+    async def push_synthetic(self, message: str, max_len: int | None = None) -> None:
+        async with self.redis_db.pipeline(transaction=True) as pipe:
+            pipe.rpush(LIST_KEYS[gcst.SYNTHETIC], message)
+            if max_len is not None:
+                # We pop from the head, so this keeps the newest - as MAXLEN does for the stream backend
+                pipe.ltrim(LIST_KEYS[gcst.SYNTHETIC], -max_len, -1)
+            await pipe.execute()
+
+    async def pop(self, timeout: float) -> QueuedQuery | None:
+        if self._synthetic_share.synthetic_due():
+            message = await self.redis_db.lpop(LIST_KEYS[gcst.SYNTHETIC])  # type: ignore
+            if message is not None:
+                self._synthetic_share.took(gcst.SYNTHETIC)
+                return QueuedQuery(message=message, lane=gcst.SYNTHETIC)
+
+        # BLPOP checks the keys in order, so organic work always comes first
+        result = await self.redis_db.blpop([LIST_KEYS[gcst.ORGANIC], LIST_KEYS[gcst.SYNTHETIC]], timeout=timeout)  # type: ignore
+        if not result:
+            return None
+        key, message = result
+        lane = gcst.SYNTHETIC if _decode(key) == LIST_KEYS[gcst.SYNTHETIC] else gcst.ORGANIC
+        self._synthetic_share.took(lane)
+        return QueuedQuery(message=message, lane=lane)
+
+    async def ack(self, queued_query: QueuedQuery) -> None:
+        # Popping from a list is the ack
+        return None
+
+    async def clear_synthetic_queries(self) -> int:
+        async with self.redis_db.pipeline(transaction=True) as pipe:
+            pipe.llen(LIST_KEYS[gcst.SYNTHETIC])
+            pipe.delete(LIST_KEYS[gcst.SYNTHETIC])
+            cleared, _ = await pipe.execute()
+        return cleared
+
+    async def organic_depth(self) -> int:
+        return await self.redis_db.llen(LIST_KEYS[gcst.ORGANIC])  # type: ignore
+
+    async def get_lag_stats(self) -> dict[str, Any]:
+        async with self.redis_db.pipeline(transaction=False) as pipe:
+            for key in LIST_KEYS.values():
+                pipe.llen(key)
+            depths = await pipe.execute()
+        return {f"{lane}_depth": depth for lane, depth in zip(LIST_KEYS, depths)}
+
+
+class StreamQueryQueue:
+    def __init__(
+        self,
+        redis_db: Redis,
+        consumer_name: str | None = None,
+        claim_idle_seconds: float = DEFAULT_CLAIM_IDLE_SECONDS,
+        synthetic_share: float = DEFAULT_SYNTHETIC_SHARE,
+    ):
+        self.redis_db = redis_db
+        self.consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle_ms = int(claim_idle_seconds * 1000)
+        self._synthetic_share = _SyntheticShare(synthetic_share)
+        self._group_created = False
+        self._last_claim_check = 0.0
+        self._last_consumer_cleanup = 0.0
+        # A blocking read across both lanes can deliver one entry from each; the spare one is served next
+        self._delivered: deque[QueuedQuery] = deque()
+
+    async def _ensure_group(self) -> None:
+        if self._group_created:
+            return
+        for stream_key in STREAM_KEYS.values():
+            try:
+                await self.redis_db.xgroup_create(stream_key, QUERY_STREAM_GROUP, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._group_created = True
+
+    async def push_organic(self, message: str) -> None:
+        with rutils.REDIS_CALL_SECONDS.time("push_organic"):
+            await self.redis_db.xadd(
+                STREAM_KEYS[gcst.ORGANIC], {STREAM_FIELD: message}, maxlen=STREAM_MAX_LEN, approximate=True
+            )
+
+    async def push_synthetic(self, message: str, max_len: int | None = None) -> None:
+        await self.redis_db.xadd(
+            STREAM_KEYS[gcst.SYNTHETIC],
+            {STREAM_FIELD: message},
+            maxlen=max_len if max_len is not None else STREAM_MAX_LEN,
+            approximate=max_len is None,
+        )
+
+    async def _claim_stuck_query(self) -> QueuedQuery | None:
+        now = time.time()
+        if now - self._last_claim_check < CLAIM_CHECK_INTERVAL:
+            return None
+        self._last_claim_check = now
+
+        for lane, stream_key in STREAM_KEYS.items():
+            # Redis 7 adds a third element, the ids of pending entries which no longer exist - those it drops itself
+            claimed = (
+                await self.redis_db.xautoclaim(
+                    stream_key, QUERY_STREAM_GROUP, self.consumer_name, min_idle_time=self.claim_idle_ms, count=1
+                )
+            )[1]
+            for delivery_id, fields in claimed:
+                if not fields:
+                    # Before Redis 7 a pending entry which was trimmed comes back empty, and stays pending unless acked
+                    await self.redis_db.xack(stream_key, QUERY_STREAM_GROUP, delivery_id)
+                    continue
+                queued_query = QueuedQuery(message=fields[STREAM_FIELD], delivery_id=delivery_id, redelivered=True, lane=lane)
+                if lane == gcst.ORGANIC:
+                    # The entry node will have given up on this long ago - serving it now would just burn miner capacity
+                    logger.warning(f"Dropping reclaimed organic query {delivery_id}")
+                    await self.ack(queued_query)
+                    continue
+                logger.warning(f"Reclaimed query {delivery_id} which was stuck with another query node")
+                return queued_query
+        return None
+
+    async def _remove_dead_consumers(self) -> None:
+        """Deletes consumers which have been idle for DEAD_CONSUMER_IDLE_SECONDS and have nothing pending"""
+        now = time.time()
+        if now - self._last_consumer_cleanup < CONSUMER_CLEANUP_INTERVAL:
+            return
+        self._last_consumer_cleanup = now
+
+        for stream_key in STREAM_KEYS.values():
+            for consumer in await self.redis_db.xinfo_consumers(stream_key, QUERY_STREAM_GROUP):
+                name = _decode(consumer["name"])
+                # Deleting a consumer drops its pending entries - leave those to be reclaimed first
+                if name == self.consumer_name or consumer["pending"] or consumer["idle"] < DEAD_CONSUMER_IDLE_SECONDS * 1000:
+                    continue
+                await self.redis_db.xgroup_delconsumer(stream_key, QUERY_STREAM_GROUP, name)
+                logger.info(f"Removed consumer {name}, idle for {consumer['idle'] / 1000:.0f}s, from {_decode(stream_key)}")
+
+    async def _read(self, lanes: list[str], block: int | None = None) -> None:
+        result = await self.redis_db.xreadgroup(
+            QUERY_STREAM_GROUP,
+            self.consumer_name,
+            {STREAM_KEYS[lane]: ">" for lane in lanes},
+            count=1,
+            block=block,
+        )
+        lanes_by_key = {STREAM_KEYS[lane]: lane for lane in lanes}
+        # Keep organic entries at the front
+        for stream_key, entries in sorted(result or [], key=lambda r: lanes_by_key[_decode(r[0])] != gcst.ORGANIC):
+            for delivery_id, fields in entries:
+                self._delivered.append(
+                    QueuedQuery(message=fields[STREAM_FIELD], delivery_id=delivery_id, lane=lanes_by_key[_decode(stream_key)])
+                )
+
+    def _take_delivered(self) -> QueuedQuery | None:
+        if not self._delivered:
+            return None
+        queued_query = self._delivered.popleft()
+        self._synthetic_share.took(queued_query.lane)
+        return queued_query
+
+    async def pop(self, timeout: float) -> QueuedQuery | None:
+        if self._delivered:
+            return self._take_delivered()
+
+        await self._ensure_group()
+
+        claimed = await self._claim_stuck_query()
+        if claimed is not None:
+            return claimed
+        await self._remove_dead_consumers()
+
+        if self._synthetic_share.synthetic_due():
+            await self._read([gcst.SYNTHETIC])
+        if not self._delivered:
+            await self._read([gcst.ORGANIC])
+        if not self._delivered:
+            await self._read([gcst.ORGANIC, gcst.SYNTHETIC], block=int(timeout * 1000))
+        return self._take_delivered()
+
+    async def ack(self, queued_query: QueuedQuery) -> None:
+        if queued_query.delivery_id is None:
+            return
+        stream_key = STREAM_KEYS[queued_query.lane]
+        async with self.redis_db.pipeline(transaction=False) as pipe:
+            pipe.xack(stream_key, QUERY_STREAM_GROUP, queued_query.delivery_id)
+            pipe.xdel(stream_key, queued_query.delivery_id)
+            await pipe.execute()
+
+    async def clear_synthetic_queries(self) -> int:
+        # Anything already delivered stays pending and gets acked as normal - XACK of a trimmed entry is fine
+        return await self.redis_db.xtrim(STREAM_KEYS[gcst.SYNTHETIC], maxlen=0, approximate=False)
+
+    async def organic_depth(self) -> int:
+        """
+        Organic entries no query node has picked up yet. Entries are only deleted on ack, so the length of the stream
+        includes the ones being processed (or held in a query node's _delivered) - those are the group's pending entries.
+        """
+        stream_key = STREAM_KEYS[gcst.ORGANIC]
+        length = await self.redis_db.xlen(stream_key)
+        try:
+            pending = (await self.redis_db.xpending(stream_key, QUERY_STREAM_GROUP))["pending"]
+        except ResponseError as e:
+            if "NOGROUP" not in str(e):
+                raise
+            # No query node has read from the stream yet
+            pending = 0
+        # Pending entries can have been trimmed off the stream by MAXLEN
+        return max(length - pending, 0)
+
+    async def get_lag_stats(self) -> dict[str, Any]:
+        await self._ensure_group()
+        stats: dict[str, Any] = {}
+        for lane, stream_key in STREAM_KEYS.items():
+            groups = await self.redis_db.xinfo_groups(stream_key)
+            group = next((g for g in groups if _decode(g["name"]) == QUERY_STREAM_GROUP), None)
+            if group is None:
+                continue
+            consumers = await self.redis_db.xinfo_consumers(stream_key, QUERY_STREAM_GROUP)
+            stats[lane] = {
+                "lag": group.get("lag"),
+                "pending": group.get("pending"),
+                "consumers": {
+                    _decode(consumer["name"]): {"pending": consumer["pending"], "idle_ms": consumer["idle"]}
+                    for consumer in consumers
+                },
+            }
+        return stats
+
+
+QueryQueue = ListQueryQueue | StreamQueryQueue
+
+
+def _decode(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def get_query_queue_backend() -> str:
+    backend = os.getenv("QUERY_QUEUE_BACKEND", LIST_BACKEND).lower()
+    if backend not in (LIST_BACKEND, STREAM_BACKEND):
+        raise ValueError(f"QUERY_QUEUE_BACKEND must be one of {LIST_BACKEND}, {STREAM_BACKEND} - got {backend}")
+    return backend
+
+
+def get_query_queue(redis_db: Redis, consumer_name: str | None = None) -> QueryQueue:
+    synthetic_share = float(os.getenv("QUERY_QUEUE_SYNTHETIC_SHARE", DEFAULT_SYNTHETIC_SHARE))
+    if get_query_queue_backend() == STREAM_BACKEND:
+        claim_idle_seconds = float(os.getenv("QUERY_QUEUE_CLAIM_IDLE_SECONDS", DEFAULT_CLAIM_IDLE_SECONDS))
+        return StreamQueryQueue(
+            redis_db, consumer_name=consumer_name, claim_idle_seconds=claim_idle_seconds, synthetic_share=synthetic_share
+        )
+    return ListQueryQueue(redis_db, synthetic_share=synthetic_share)
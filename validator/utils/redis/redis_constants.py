@@ -4,12 +4,23 @@ SYNTHETIC_DATA_VERSIONS_KEY = "SYNTHETIC_DATA_VERSIONS"
 SYNTHETIC_SCHEDULING_QUEUE_KEY = "SYNTHETIC_SCHEDULING_QUEUE"
 PUBLIC_KEYPAIR_INFO_KEY = "PUBLIC_KEYPAIR_INFO"
 QUERY_QUEUE_KEY = "QUERY_QUEUE"
+QUERY_STREAM_KEY = "QUERY_STREAM"
+SYNTHETIC_QUERY_QUEUE_KEY = "SYNTHETIC_QUERY_QUEUE"
+SYNTHETIC_QUERY_STREAM_KEY = "SYNTHETIC_QUERY_STREAM"
 QUERY_RESULTS_KEY = "QUERY_RESULTS"
 HOTKEY_INFO_KEY = "HOTKEY_INFO"
 CAPACITIES_KEY = "CAPACITIES"
 CONTENDER_IDS_KEY = "CONTENDER_IDS"
 PARITICIPANT_IDS_TO_STOP_KEY = "PARITICIPANT_IDS_TO_STOP"
 WEIGHTS_TO_SET_QUEUE_KEY = "WEIGHTS_TO_SET_QUEUE"
+NODES_GENERATION_KEY = "NODES_GENERATION"
+CONTENDER_RANKING_KEY = "CONTENDER_RANKING"
+CONTENDER_INFO_KEY = "CONTENDER_INFO"
+CIRCUIT_BREAKER_OPEN_KEY = "CIRCUIT_BREAKER_OPEN"
+QUERY_NODE_LOAD_KEY = "QUERY_NODE_LOAD"
+TASK_THROUGHPUT_KEY = "TASK_THROUGHPUT"
+SCORING_SAMPLE_COUNTS_KEY = "SCORING_SAMPLE_COUNTS"
+WEIGHT_STATE_EVENTS_KEY = "WEIGHT_STATE_EVENTS"
 
 
 # Signing service stuff
@@ -8,6 +8,7 @@ class QueryQueueMessage:
     query_payload: dict
     task: str
     job_id: str
+    enqueued_at: float | None = None
 
 
 @dataclass
@@ -5,8 +5,12 @@ from enum import Enum
 import copy
 from fiber.logging_utils import get_logger
 
+from core import metrics
+
 logger = get_logger(__name__)
 
+REDIS_CALL_SECONDS = metrics.Histogram("redis_call_seconds", "Time taken by redis calls on the hot path", labelnames=("operation",))
+
 
 def _remove_enums(map: dict[Any, Any]) -> dict[Any, Any]:
     map_copy = copy.copy(map)
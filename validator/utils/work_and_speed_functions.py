@@ -29,8 +29,13 @@ def calculate_work(
     task_config: cmodels.FullTaskConfig,
     result: dict,
     steps: int | None = None,
+    character_count: int | None = None,
 ) -> float:
-    """Gets volume for the task that was executed"""
+    """
+    Gets volume for the task that was executed
+
+    For text, pass character_count if it's already known to skip parsing the response.
+    """
     config = task_config
 
     raw_formatted_response = result.get("formatted_response", {})
@@ -39,15 +44,16 @@ def calculate_work(
         assert steps is not None
         return _calculate_work_image(steps)
     elif config.task_type == cmodels.TaskType.TEXT:
-        formatted_response = (
-            json.loads(raw_formatted_response) if isinstance(raw_formatted_response, str) else raw_formatted_response
-        )
-        character_count = 0
-        for text_json in formatted_response:
-            try:
-                character_count += len(text_json["choices"][0]["delta"]["content"])
-            except KeyError:
-                logger.error(f"KeyError: {text_json}")
+        if character_count is None:
+            formatted_response = (
+                json.loads(raw_formatted_response) if isinstance(raw_formatted_response, str) else raw_formatted_response
+            )
+            character_count = 0
+            for text_json in formatted_response:
+                try:
+                    character_count += len(text_json["choices"][0]["delta"]["content"])
+                except KeyError:
+                    logger.error(f"KeyError: {text_json}")
 
         logger.info(f"Number of characters: {character_count}")
 